@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Run the bulk operations of ldm-stop-start.py, ldm-daily-usage.py and
+# ldm-delete.py against the asyncio stub server, blocking and with --async,
+# report the wall-clock time of each and check both give the same result.
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from ldm_async_stub_server import AsyncStubServer
+from ldm_stub_server import encode_array, synthetic_migrations
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)
+STOP_START = os.path.join(ROOT, 'stop-start', 'ldm-stop-start.py')
+DAILY_USAGE = os.path.join(ROOT, 'daily-usage', 'ldm-daily-usage.py')
+DELETE = os.path.join(ROOT, 'delete', 'ldm-delete.py')
+
+
+def write_file(suffix, lines):
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, 'w') as f:
+        f.writelines(lines)
+    return path
+
+
+def write_config(endpoint):
+    return write_file('.config', [json.dumps({'api_endpoint': endpoint, 'username': '', 'password': ''})])
+
+
+def write_verification_report(paths):
+    return write_file('.jsonl', [json.dumps({'scanResult': 'MISSING_ON_SOURCE', 'targetPath': '/data/%d/file' % i}) + '\n'
+                                 for i in range(paths)])
+
+
+def run(command, concurrency, use_async):
+    if use_async:
+        # Before any sub-command.
+        command = command[:1] + ['--async', '--concurrency', str(concurrency)] + command[1:]
+    start = time.time()
+    output = subprocess.check_output([sys.executable] + command).decode('utf-8')
+    # ldm-delete logs with timestamps, and with --async in completion order.
+    output = sorted(re.sub(r'^\S+ \S+ ', '', line) for line in output.splitlines())
+    return time.time() - start, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the blocking and asyncio bulk operations.')
+    parser.add_argument('--migrations', type=int, default=300)
+    parser.add_argument('--samples', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds to delay each response.')
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    server = AsyncStubServer(args.migrations, args.samples, latency=args.latency).start()
+    config = write_config(server.endpoint())
+    report = write_verification_report(args.migrations)
+    operations = [
+        ('start', 'STOPPED', [STOP_START, '--config', config, 'start']),
+        ('stop --pattern', 'LIVE', [STOP_START, '--config', config, '--pattern', 'migration', 'stop']),
+        ('daily-usage', 'LIVE', [DAILY_USAGE, '--config', config]),
+        ('delete', 'LIVE', [DELETE, '--config', config, '-f', report, '--filesystem_name', 'target']),
+    ]
+    try:
+        print('%-16s %10s %10s %12s %10s' % ('operation', 'blocking', 'async', 'connections', 'speedup'))
+        for name, state, command in operations:
+            server.bodies['/migrations'] = encode_array(synthetic_migrations(args.migrations, state))
+            blocking, expected = run(command, args.concurrency, False)
+            server.connections = 0
+            concurrent, output = run(command, args.concurrency, True)
+            if output != expected:
+                print('%s output differs with --async' % name)
+                return 1
+            print('%-16s %9.2fs %9.2fs %12d %9.1fx' % (name, blocking, concurrent, server.connections,
+                                                       blocking / concurrent))
+    finally:
+        os.remove(config)
+        os.remove(report)
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Run ldm-daily-usage.py against the stub server at increasing --concurrency
+# and report the wall-clock time of each run.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from ldm_stub_server import StubServer
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)
+DAILY_USAGE = os.path.join(ROOT, 'daily-usage', 'ldm-daily-usage.py')
+
+
+def write_config(endpoint):
+    fd, path = tempfile.mkstemp(suffix='.config')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'api_endpoint': endpoint, 'username': '', 'password': ''}, f)
+    return path
+
+
+def run(config, concurrency):
+    start = time.time()
+    output = subprocess.check_output(
+        [sys.executable, DAILY_USAGE, '--config', config, '--concurrency', str(concurrency)])
+    return time.time() - start, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ldm-daily-usage.py stats fetch concurrency.')
+    parser.add_argument('--migrations', type=int, default=300)
+    parser.add_argument('--samples', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds to delay each response.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    server = StubServer(args.migrations, args.samples, latency=args.latency).start()
+    config = write_config(server.endpoint())
+    try:
+        print('%-12s %10s %12s %10s' % ('concurrency', 'seconds', 'connections', 'speedup'))
+        baseline = None
+        expected = None
+        for concurrency in args.concurrency:
+            server.connections = 0
+            elapsed, output = run(config, concurrency)
+            # Row order must not depend on concurrency.
+            if expected is None:
+                expected = output
+            elif output != expected:
+                print('Output differs at concurrency %d' % concurrency)
+                return 1
+            baseline = baseline or elapsed
+            print('%-12d %10.2f %12d %9.1fx' % (concurrency, elapsed, server.connections, baseline / elapsed))
+    finally:
+        os.remove(config)
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
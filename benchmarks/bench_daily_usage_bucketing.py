@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Compare the single pass daily bucketing of ldm-daily-usage.py against
+# rescanning the stats for every day, and check both give the same totals.
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+from ldm_stub_server import synthetic_stats
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)
+
+
+def load_script(path, name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def rescan_stats_for_day(daily_usage, day, migration_stats):
+    # The per day scan ldm-daily-usage.py used before, kept as the reference.
+    day_end = day + daily_usage.DAY - 1
+    for migration_stat in migration_stats:
+        timestamp = daily_usage.migration_stats_get_timestamp(migration_stat)
+        if timestamp > day_end:
+            continue
+        if timestamp < day_end and timestamp >= day:
+            return daily_usage.migration_stats_get_bytes(migration_stat)
+        if timestamp < day:
+            return daily_usage.migration_stats_get_bytes(migration_stat)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ldm-daily-usage.py daily bucketing.')
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--samples', type=int, default=100000)
+    args = parser.parse_args()
+
+    daily_usage = load_script(os.path.join('daily-usage', 'ldm-daily-usage.py'), 'ldm_daily_usage')
+    days = daily_usage.generate_days_epochs(args)
+    migration_stats = synthetic_stats(args.samples, args.days + 2)
+
+    start = time.time()
+    rescan = dict((day, rescan_stats_for_day(daily_usage, day, migration_stats)) for day in days)
+    rescan_elapsed = time.time() - start
+
+    start = time.time()
+    single_pass = daily_usage.process_stats(days, migration_stats, args)
+    single_pass_elapsed = time.time() - start
+
+    if rescan != single_pass:
+        print('Daily totals differ')
+        return 1
+
+    print('%d days x %d samples' % (args.days, args.samples))
+    print('%-12s %10.3fs' % ('rescan', rescan_elapsed))
+    print('%-12s %10.3fs' % ('single pass', single_pass_elapsed))
+    print('%-12s %10.1fx' % ('speedup', rescan_elapsed / single_pass_elapsed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
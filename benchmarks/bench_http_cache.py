@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Read the responses the scripts read on every run, repeatedly as cron
+# would, without the response cache, with it revalidating every response and
+# with a ttl, and report the time and bytes sent by the server for each.
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from ldm_stub_server import StubServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import http_cache
+import json_stream
+import ldm_client
+
+PATHS = ('/migrations', '/stats/migrationSummary', '/stats/throughputSummary', '/diagnostics/summary', '/license')
+
+
+def run(server, runs, cache):
+    client = ldm_client.LdmClient(server.endpoint(), cache=cache)
+    server.bytes_sent = 0
+    start = time.time()
+    for _ in range(runs):
+        resp = client.request('GET', '/migrations', stream=True)
+        for migration in json_stream.iter_items(resp):
+            pass
+        for path in PATHS[1:]:
+            client.request('GET', path).read()
+    return time.time() - start, server.bytes_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the on-disk response cache.')
+    parser.add_argument('--migrations', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds to delay each response.')
+    parser.add_argument('--bandwidth', type=float, default=50, help='MB per second responses are sent at.')
+    args = parser.parse_args()
+
+    server = StubServer(args.migrations, latency=args.latency, bandwidth=args.bandwidth * 1000000).start()
+    directory = tempfile.mkdtemp()
+    try:
+        print('%d runs, /migrations %.1f MiB' % (args.runs, len(server.bodies['/migrations']) / 1048576.0))
+        print('%-16s %10s %14s  %s' % ('cache', 'seconds', 'MiB sent', 'hits'))
+        for name, cache in (('none', None),
+                            ('revalidate', http_cache.HttpCache(os.path.join(directory, 'revalidate'))),
+                            ('ttl 60s', http_cache.HttpCache(os.path.join(directory, 'ttl'), ttl=60))):
+            elapsed, sent = run(server, args.runs, cache)
+            print('%-16s %10.2f %14.1f  %s' % (name, elapsed, sent / 1048576.0, cache.summary() if cache else ''))
+    finally:
+        shutil.rmtree(directory)
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Compare the peak memory and time of decoding a large /migrations response
+# with json.loads(resp.read()) against common/json_stream.py.
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from http.client import HTTPConnection
+from urllib.parse import urlparse
+
+from ldm_stub_server import StubServer, synthetic_migrations
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import json_stream
+
+
+def load_all(resp):
+    return len(json.loads(resp.read()))
+
+
+def stream(resp):
+    count = 0
+    for migration in json_stream.iter_items(resp):
+        count += 1
+    return count
+
+
+def measure(endpoint, decode):
+    conn = HTTPConnection(urlparse(endpoint).netloc)
+    tracemalloc.start()
+    start = time.time()
+    conn.request('GET', '/migrations')
+    count = decode(conn.getresponse())
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.close()
+    return count, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark decoding a large /migrations response.')
+    parser.add_argument('--megabytes', type=int, default=100, help='Approximate size of the response.')
+    args = parser.parse_args()
+
+    item_size = len(json.dumps(next(synthetic_migrations(1)))) + 1
+    migrations = args.megabytes * 1024 * 1024 // item_size
+    server = StubServer(migrations, samples=1).start()
+    try:
+        size = len(server.bodies['/migrations'])
+        print('/migrations: %d migrations, %.1f MiB' % (migrations, size / 1048576.0))
+        print('%-24s %10s %10s %14s' % ('decoder', 'items', 'seconds', 'peak MiB'))
+        for name, decode in (('json.loads(resp.read())', load_all), ('json_stream', stream)):
+            count, elapsed, peak = measure(server.endpoint(), decode)
+            print('%-24s %10d %10.2f %14.1f' % (name, count, elapsed, peak / 1048576.0))
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
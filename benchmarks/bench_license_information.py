@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Run license-information.py against a host map of stub LiveData Migrators,
+# one of which never responds, one host at a time and concurrently, report the
+# wall-clock time of each and check both give the same rows in config order.
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from ldm_stub_server import StubServer
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)
+LICENSE_INFORMATION = os.path.join(ROOT, 'license-information', 'license-information.py')
+
+
+def write_config(endpoints):
+    fd, path = tempfile.mkstemp(suffix='.config')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(dict(('host%02d' % i, {'api_endpoint': endpoint, 'username': '', 'password': ''})
+                       for i, endpoint in enumerate(endpoints)), f)
+    return path
+
+
+def run(config, concurrency, timeout):
+    start = time.time()
+    output = subprocess.check_output([sys.executable, LICENSE_INFORMATION, '--config', config,
+                                      '--concurrency', str(concurrency), '--timeout', str(timeout)],
+                                     stderr=subprocess.DEVNULL).decode('utf-8')
+    # Without the Collection Time column.
+    return time.time() - start, [line.rsplit(',', 1)[0] for line in output.splitlines()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark license-information.py over many hosts.')
+    parser.add_argument('--hosts', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.1, help='Seconds to delay each response.')
+    parser.add_argument('--timeout', type=float, default=2, help='Seconds to wait on a host.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    servers = [StubServer(latency=args.latency).start() for _ in range(args.hosts - 1)]
+    # Accepts connections but never responds.
+    unresponsive = socket.socket()
+    unresponsive.bind(('127.0.0.1', 0))
+    unresponsive.listen(16)
+    endpoints = [server.endpoint() for server in servers]
+    endpoints.insert(len(endpoints) // 2, 'http://127.0.0.1:%d' % unresponsive.getsockname()[1])
+    config = write_config(endpoints)
+    try:
+        print('%d hosts, one unresponsive, %.3fs latency, %.1fs timeout' % (args.hosts, args.latency, args.timeout))
+        expected = None
+        for name, concurrency in (('one at a time', 1), ('concurrent', args.concurrency)):
+            elapsed, rows = run(config, concurrency, args.timeout)
+            if expected is None:
+                expected, sequential = rows, elapsed
+            elif rows != expected:
+                print('%s rows differ' % name)
+                return 1
+            print('%-16s %10.3fs %9.1fx' % (name, elapsed, sequential / elapsed))
+    finally:
+        os.remove(config)
+        unresponsive.close()
+        for server in servers:
+            server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Send a run of e-mails to the local SMTP stand-in as the scripts did, a new
+# session for each e-mail, and with common/ldm_mailer.py, one session for the
+# run, then again with transient failures injected, and report the time,
+# sessions and deliveries of each.
+
+import argparse
+import os
+import smtplib
+import sys
+import time
+from email.mime.text import MIMEText
+
+from smtp_stub_server import SmtpStubServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import ldm_mailer
+
+
+def send_per_session(config, emails):
+    # The EmailInformer.send_message the scripts used before, kept as the reference.
+    for i in range(emails):
+        server = smtplib.SMTP(config['smtp_host'], config['smtp_port'])
+        server.ehlo()
+        server.login(config['smtp_username'], config['smtp_password'])
+        for to_addr in config['email_addresses']:
+            msg = MIMEText('Notification %d' % i)
+            msg['From'] = config['sender_address']
+            msg['To'] = to_addr
+            msg['Subject'] = 'Notification %d' % i
+            server.sendmail(config['sender_address'], to_addr, msg.as_string())
+        server.quit()
+
+
+def send_mailer(config, emails):
+    mailer = ldm_mailer.Mailer(config, backoff=config['smtp_backoff'])
+    for i in range(emails):
+        mailer.send('Notification %d' % i, 'Notification %d' % i)
+    mailer.close()
+    return mailer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark e-mail delivery with one SMTP session per run.')
+    parser.add_argument('--emails', type=int, default=50)
+    parser.add_argument('--recipients', type=int, default=2)
+    parser.add_argument('--session-latency', type=float, default=0.1,
+                        help='Seconds to open a session, standing in for the TLS handshake and login.')
+    parser.add_argument('--refuse', type=int, default=3, help='Messages refused with 451 in the last run.')
+    args = parser.parse_args()
+
+    server = SmtpStubServer(session_latency=args.session_latency).start()
+    config = {'smtp_host': '127.0.0.1', 'smtp_port': server.port(), 'smtp_username': 'user',
+              'smtp_password': 'password', 'sender_address': 'ldm@localhost', 'smtp_backoff': 0.05,
+              'email_addresses': ['ops%d@localhost' % i for i in range(args.recipients)]}
+    expected = args.emails * args.recipients
+    try:
+        print('%d e-mails to %d recipients, %.3fs a session' % (args.emails, args.recipients, args.session_latency))
+        print('%-22s %10s %9s %9s %9s' % ('', 'seconds', 'sessions', 'messages', 'speedup'))
+        runs = [('session per e-mail', 0, lambda: send_per_session(config, args.emails)),
+                ('ldm_mailer', 0, lambda: send_mailer(config, args.emails)),
+                ('ldm_mailer, %d 451s' % args.refuse, args.refuse, lambda: send_mailer(config, args.emails))]
+        baseline = None
+        for name, refuse, send in runs:
+            server.sessions = server.messages = 0
+            server.refuse = refuse
+            start = time.time()
+            mailer = send()
+            elapsed = time.time() - start
+            baseline = baseline or elapsed
+            if server.messages != expected:
+                print('%s delivered %d of %d messages' % (name, server.messages, expected))
+                return 1
+            print('%-22s %9.3fs %9d %9d %8.1fx' % (name, elapsed, server.sessions, server.messages, baseline / elapsed))
+            if mailer is not None:
+                print('    %s' % mailer.delivery_summary())
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Check a host map of stub LiveData Migrators with ldm-monitor.py, one
+# instance at a time and concurrently, report the time of each and check
+# both give the same warnings.
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from bench_daily_usage_bucketing import load_script
+from ldm_stub_server import StubServer
+
+
+def instances_config(servers, directory, concurrency):
+    # Thresholds every stub breaches, so each instance warns and its summary
+    # text is fetched too.
+    return {
+        'swp_file': os.path.join(directory, 'monitor.swp'),
+        'concurrency': concurrency,
+        'actionStoreCurrent': 1, 'actionStoreLargestMigration': 1, 'pendingRegionCurrent': 1,
+        'pendingRegionMaxMigration': 1, 'retryCountDeltaLimit': 1,
+        'instances': dict(('ldm-%02d' % i, {'api_endpoint': server.endpoint(), 'username': '', 'password': ''})
+                          for i, server in enumerate(servers)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ldm-monitor.py checking a host map of instances.')
+    parser.add_argument('--instances', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.1, help='Seconds to delay each response.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    monitor = load_script(os.path.join('monitor', 'ldm-monitor.py'), 'ldm_monitor')
+    servers = [StubServer(latency=args.latency).start() for _ in range(args.instances)]
+    directory = tempfile.mkdtemp()
+    try:
+        print('%d instances, %.3fs latency' % (args.instances, args.latency))
+        expected = None
+        for name, concurrency in (('one at a time', 1), ('concurrent', args.concurrency)):
+            config = instances_config(servers, directory, concurrency)
+            state = monitor.MonitorState(config)
+            start = time.time()
+            results = monitor.check_instances(config, state)
+            elapsed = time.time() - start
+            state.close()
+            if expected is None:
+                expected, sequential = results, elapsed
+            elif results != expected:
+                print('%s warnings differ' % name)
+                return 1
+            print('%-16s %10.3fs %9.1fx' % (name, elapsed, sequential / elapsed))
+    finally:
+        shutil.rmtree(directory)
+        for server in servers:
+            server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Compare the core and tmp log file checks of ldm-monitor.py, a single scan
+# reusing the listings of unchanged directories, against an os.walk of the
+# tree for each check, and check both give the same warnings.
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from bench_daily_usage_bucketing import load_script
+
+
+def walk_for_files(path, match):
+    # The per check os.walk ldm-monitor.py used before, kept as the reference.
+    found = []
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            if match(file):
+                found.append(os.path.join(root, file))
+    return found
+
+
+def walk_warnings(path):
+    tmp_log_file = re.compile(r'\.log[0-9]+\.tmp$')
+    warnings = []
+    hprof_files = walk_for_files(path, lambda name: name.endswith('.hprof'))
+    if hprof_files:
+        warnings.append("Hprof files found under [" + path + "]: " + ','.join(hprof_files))
+    tmp_log_files = walk_for_files(path, lambda name: tmp_log_file.search(name) is not None)
+    if tmp_log_files:
+        warnings.append("tmp log files found under [" + path + "]: " + ','.join(tmp_log_files))
+    return warnings
+
+
+def make_tree(root, directories, files):
+    # Rotated logs spread over directories, with a few core and tmp log files.
+    for d in range(directories):
+        path = os.path.join(root, 'service-%d' % (d % 20), 'logs-%d' % d)
+        os.makedirs(path)
+        for f in range(files):
+            open(os.path.join(path, 'service.log.%d.gz' % f), 'w').close()
+        if d % 100 == 0:
+            open(os.path.join(path, 'java_pid%d.hprof' % d), 'w').close()
+            open(os.path.join(path, 'service.log%d.tmp' % d), 'w').close()
+    # Old enough for the listings to be reused.
+    old = time.time() - 60
+    for path, _, _ in os.walk(root):
+        os.utime(path, (old, old))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ldm-monitor.py core and tmp log file scan.')
+    parser.add_argument('--directories', type=int, default=2000)
+    parser.add_argument('--files', type=int, default=100, help='Files per directory.')
+    args = parser.parse_args()
+
+    monitor = load_script(os.path.join('monitor', 'ldm-monitor.py'), 'ldm_monitor')
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root, args.directories, args.files)
+        config = {'check_for_core_files': [root], 'check_for_log_tmp_files': [root]}
+        cache_file = os.path.join(root, 'scan.cache')
+
+        start = time.time()
+        expected = walk_warnings(root)
+        walk_elapsed = time.time() - start
+
+        print('%d directories x %d files' % (args.directories, args.files))
+        print('%-20s %10.3fs' % ('os.walk per check', walk_elapsed))
+        for name in ('scan, cold', 'scan, cached'):
+            scanner = monitor.FileScanner(cache_file)
+            start = time.time()
+            warnings = monitor.check_files(config, scanner)
+            elapsed = time.time() - start
+            scanner.save()
+            if warnings != expected:
+                print('%s warnings differ' % name)
+                return 1
+            print('%-20s %10.3fs %9.1fx' % (name, elapsed, walk_elapsed / elapsed))
+    finally:
+        shutil.rmtree(root)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
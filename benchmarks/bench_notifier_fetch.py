@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Compare the notifier's fetch of the Notifications after the last one sent,
+# decoding the list as it arrives and only materialising the new ones, against
+# decoding the whole list into Notifications, sorting and filtering it, for a
+# list oldest first, newest first and shuffled, and check both find the same
+# ones, also without the ids sent, as with a swp file of an earlier version.
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+from bench_daily_usage_bucketing import load_script
+from ldm_stub_server import StubServer, encode_array, synthetic_notifications
+
+
+def fetch_all(notifier, config, since):
+    # The fetch ldm-notifier.py made before, kept as the reference.
+    resp = notifier.ldm_client.client_for_config(config).request('GET', '/notifications')
+    items = json.loads(resp.read())
+    notifications = [notifier.Notification(**row) for row in sorted(items, key=lambda x: x['timeStamp'])]
+    return [n for n in notifications if int(n.timeStamp) > int(since)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ldm-notifier.py fetch of new Notifications.')
+    parser.add_argument('--notifications', type=int, default=200000)
+    parser.add_argument('--new', type=int, default=10, help='Notifications after the last one sent.')
+    args = parser.parse_args()
+
+    notifier = load_script(os.path.join('notifier', 'ldm-notifier.py'), 'ldm_notifier')
+    items = list(synthetic_notifications(args.notifications))
+    # The last one sent.
+    since = items[-args.new - 1]['timeStamp']
+    seen = frozenset([items[-args.new - 1]['id']])
+    server = StubServer().start()
+    config = {'api_endpoint': server.endpoint()}
+    logging.basicConfig(level=logging.DEBUG, format='    %(message)s')
+    logging.getLogger().handlers[0].addFilter(lambda record: record.getMessage().startswith('Decoded'))
+    try:
+        print('%d notifications, %d new' % (args.notifications, args.new))
+        shuffled = list(items)
+        random.Random(1).shuffle(shuffled)
+        for order, body in (('oldest first', items), ('newest first', items[::-1]), ('shuffled', shuffled)):
+            server.bodies['/notifications'] = encode_array(body)
+            start = time.time()
+            expected = fetch_all(notifier, config, since)
+            full = time.time() - start
+            start = time.time()
+            (notifications, _) = notifier.list_notifications(config, None, since, seen)
+            incremental = time.time() - start
+            if [n.id for n in notifications] != [n.id for n in expected]:
+                print('%s notifications differ' % order)
+                return 1
+            print('%-14s full %8.3fs  incremental %8.3fs %7.1fx' % (order, full, incremental, full / incremental))
+        # A swp file of an earlier version has no ids sent, only the timestamp
+        # of the last, everything at since was sent.
+        (notifications, _) = notifier.list_notifications(config, None, since, None)
+        if [n.id for n in notifications] != [n.id for n in expected]:
+            print('Notifications differ without the ids sent')
+            return 1
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Run ldm-notifier.py notify over a flood of near identical Notifications,
+# without and with suppression, and report the time taken, the e-mails sent
+# and their size of each. Then check that a flood which ends, with no later
+# Notification, and a kind that is forgotten are still reported.
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_daily_usage_bucketing import load_script
+from ldm_stub_server import StubServer, encode_array
+from smtp_stub_server import SmtpStubServer
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)
+NOTIFIER = os.path.join(ROOT, 'notifier', 'ldm-notifier.py')
+
+KINDS = [
+    ('MissingEventsNotification', 'WARN', 'Missing events for /data/%d/part-%d'),
+    ('MigrationStalledNotification', 'ERROR', 'Migration migration-%d stalled at /repl%d'),
+    ('MigrationLiveNotification', 'INFO', 'Migration migration-%d is now live at /repl%d'),
+]
+
+
+def flood(count, start):
+    # count Notifications after start, cycling through the kinds.
+    for i in range(count):
+        (kind, level, message) = KINDS[i % len(KINDS)]
+        yield {'id': 'flood-%d' % i, 'type': kind, 'level': level, 'message': message % (i, i),
+               'timeStamp': start + i + 1, 'dateCreated': '2024-01-01T00:00:00Z',
+               'dateUpdated': '2024-01-01T00:00:00Z', 'resolved': False}
+
+
+def run(directory, config, bulk):
+    config_file = os.path.join(directory, 'notifier.config')
+    with open(config_file, 'w') as f:
+        json.dump(config, f)
+    command = [sys.executable, NOTIFIER, '--config', config_file] + (['--bulk'] if bulk else []) + ['notify']
+    start = time.time()
+    subprocess.check_call(command, stdout=subprocess.DEVNULL)
+    return time.time() - start
+
+
+def reset(directory, server):
+    for path in os.listdir(directory):
+        os.remove(os.path.join(directory, path))
+    # The first run records the latest Notification, the flood follows it.
+    server.bodies['/notifications/last'] = json.dumps(dict(next(flood(1, 999)), id='start')).encode('utf-8')
+
+
+def check_flood_ends(directory, server, smtp, base, count):
+    # A flood summarised, then counted for the window, then nothing: the
+    # count must be sent once the window has ended.
+    window = 2
+    config = dict(base, suppression={'window': window})
+    reset(directory, server)
+    run(directory, config, False)
+    notifications = [n for n in flood(count, 1000)]
+    server.bodies['/notifications'] = encode_array(notifications[:count // 2])
+    run(directory, config, False)
+    summarised = time.time()
+    server.bodies['/notifications'] = encode_array(notifications)
+    smtp.messages = 0
+    run(directory, config, False)
+    if smtp.messages:
+        print('%d e-mails sent during the suppression window' % smtp.messages)
+        return False
+    time.sleep(max(0, summarised + window - time.time()))
+    run(directory, config, False)
+    if smtp.messages != len(KINDS):
+        print('%d trailing summaries sent after the flood ended, expected %d' % (smtp.messages, len(KINDS)))
+        return False
+    run(directory, config, False)
+    if smtp.messages != len(KINDS):
+        print('Trailing summaries sent again')
+        return False
+    return True
+
+
+def check_forgotten(directory, count):
+    # With room for one kind, the counts suppressed of the kind forgotten
+    # must be sent as its trailing summary.
+    notifier = load_script(os.path.join('notifier', 'ldm-notifier.py'), 'ldm_notifier')
+    suppressor = notifier.Suppressor({'max_kinds': 1}, os.path.join(directory, 'forgotten.suppression'))
+    notifications = [notifier.Notification(**n) for n in flood(count, 1000)]
+    (first, second) = (notifications[0::len(KINDS)], notifications[1::len(KINDS)])
+    suppressor.group(first[:2], now=0)
+    suppressor.group(first[2:], now=1)
+    groups = suppressor.group(second[:2], now=2)
+    trailing = [group for group in groups if group.is_trailing()]
+    suppressor.save()
+    suppressor.state.close()
+    return len(trailing) == 1 and trailing[0].suppressed == len(first) - 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ldm-notifier.py over a flood of Notifications.')
+    parser.add_argument('--notifications', type=int, default=3000)
+    parser.add_argument('--session-latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = StubServer().start()
+    smtp = SmtpStubServer(session_latency=args.session_latency).start()
+    directory = tempfile.mkdtemp()
+    base = {'api_endpoint': server.endpoint(), 'filter_on_type': [], 'filter_on_level': [],
+            'swp_file': os.path.join(directory, 'notifier.swp'), 'sender_address': 'ldm@localhost',
+            'email_addresses': ['ops@localhost'], 'smtp_host': '127.0.0.1', 'smtp_port': smtp.port()}
+    try:
+        print('%d notifications of %d kinds' % (args.notifications, len(KINDS)))
+        print('%-24s %10s %9s %12s' % ('', 'seconds', 'e-mails', 'bytes'))
+        for name, bulk, suppression in (('individual', False, False), ('bulk', True, False),
+                                        ('suppressed', False, True), ('suppressed, bulk', True, True)):
+            config = dict(base)
+            if suppression:
+                config['suppression'] = {}
+            reset(directory, server)
+            run(directory, config, bulk)
+            server.bodies['/notifications'] = encode_array(flood(args.notifications, 1000))
+            smtp.messages = smtp.bytes_received = 0
+            elapsed = run(directory, config, bulk)
+            print('%-24s %9.3fs %9d %12d' % (name, elapsed, smtp.messages, smtp.bytes_received))
+        if not check_flood_ends(directory, server, smtp, base, args.notifications):
+            return 1
+        if not check_forgotten(directory, args.notifications):
+            print('No trailing summary sent for a forgotten kind')
+            return 1
+        print('trailing summaries sent after a flood ended and for a forgotten kind')
+    finally:
+        shutil.rmtree(directory)
+        server.shutdown()
+        smtp.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Run ldm-schedular.py against a simulated LiveData Migrator, in which a
+# started migration runs for a random time before going LIVE, from cron every
+# five minutes and as a daemon, on a compressed clock, and report the slots
+# used and the migrations completed by each.
+
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import zlib
+
+from ldm_stub_server import StubHandler, StubServer, encode_array, synthetic_migrations
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)
+SCHEDULAR = os.path.join(ROOT, 'schedular', 'ldm-schedular.py')
+
+
+class MigratorHandler(StubHandler):
+    def respond(self):
+        with self.server.lock:
+            self.server.requests += 1
+        path = self.path.split('?')[0]
+        if path == '/migrations':
+            self.send_body(self.server.migrations_body())
+        elif path.startswith('/migrations/') and path.endswith('/start'):
+            self.server.start_migration(path.split('/')[2])
+            self.send_body(b'{}')
+        else:
+            self.send_body(json.dumps({'message': 'Not found'}).encode('utf-8'), 404)
+
+
+class SimulatedMigrator(StubServer):
+    # Migrations are created queued, each runs for its duration once started.
+    def __init__(self, durations):
+        StubServer.__init__(self)
+        self.RequestHandlerClass = MigratorHandler
+        self.migrations = list(synthetic_migrations(len(durations), 'NONSCHEDULED'))
+        self.durations = dict((m['internalId'], duration) for m, duration in zip(self.migrations, durations))
+        # internalId -> wall-clock time started.
+        self.started = {}
+
+    def etag(self, body):
+        return '"%08x"' % zlib.crc32(body)
+
+    def migrations_body(self):
+        now = time.time()
+        with self.lock:
+            for migration in self.migrations:
+                started = self.started.get(migration['internalId'])
+                if started is not None:
+                    done = now >= started + self.durations[migration['internalId']]
+                    migration['state'] = 'LIVE' if done else 'RUNNING'
+            return encode_array(self.migrations)
+
+    def start_migration(self, internal_id):
+        with self.lock:
+            self.started.setdefault(internal_id, time.time())
+
+    def slot_seconds(self, start, end):
+        # Seconds migrations ran between start and end, and the number completed.
+        busy = 0.0
+        completed = 0
+        with self.lock:
+            for internal_id, started in self.started.items():
+                finished = started + self.durations[internal_id]
+                busy += max(0.0, min(finished, end) - max(started, start))
+                completed += finished <= end
+        return busy, completed
+
+
+def run_cron(server, howmany, window, period):
+    deadline = time.time() + window
+    next_run = time.time()
+    while next_run < deadline:
+        subprocess.check_call([sys.executable, SCHEDULAR, '--howmany', str(howmany), '--endpoint', server.endpoint()],
+                              stdout=subprocess.DEVNULL)
+        next_run += period
+        time.sleep(max(0, next_run - time.time()))
+
+
+def run_daemon(server, howmany, window, interval):
+    process = subprocess.Popen([sys.executable, SCHEDULAR, '--howmany', str(howmany), '--endpoint', server.endpoint(),
+                                '--daemon', '--interval', str(interval)], stdout=subprocess.DEVNULL)
+    time.sleep(window)
+    process.send_signal(signal.SIGTERM)
+    process.communicate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ldm-schedular.py from cron against --daemon.')
+    parser.add_argument('--migrations', type=int, default=100)
+    parser.add_argument('--howmany', type=int, default=4)
+    parser.add_argument('--hours', type=float, default=4, help='Simulated hours to run each for.')
+    parser.add_argument('--minute', type=float, default=0.1, help='Wall-clock seconds per simulated minute.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Migrations run for 5 to 60 minutes.
+    durations = [rng.uniform(5, 60) * args.minute for _ in range(args.migrations)]
+    window = args.hours * 60 * args.minute
+    print('%d migrations, %d slots, %.0f simulated hours' % (args.migrations, args.howmany, args.hours))
+    print('%-24s %12s %10s %9s %12s' % ('', 'utilisation', 'completed', 'requests', 'bytes sent'))
+    modes = [
+        ('cron every 5 minutes', lambda server: run_cron(server, args.howmany, window, 5 * args.minute)),
+        ('daemon every 30 seconds', lambda server: run_daemon(server, args.howmany, window, 0.5 * args.minute)),
+    ]
+    for name, run in modes:
+        server = SimulatedMigrator(durations).start()
+        try:
+            start = time.time()
+            run(server)
+            busy, completed = server.slot_seconds(start, start + window)
+            print('%-24s %11.1f%% %10d %9d %12d' % (name, 100.0 * busy / (args.howmany * window), completed,
+                                                    server.requests, server.bytes_sent))
+        finally:
+            server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Replay a set of migrations, the sizes recorded in a saved
+# /stats/migrationSummary response or synthetic ones, through each of
+# ldm-schedular.py's policies and report the makespan, the mean completion
+# times and the use made of the link. Running migrations share the link
+# equally, each up to a per migration rate, and the policy is asked which
+# migrations to start every period, as the script run from cron would be.
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from bench_daily_usage_bucketing import load_script
+
+MB = 1000000
+GB = 1000 * MB
+
+
+def recorded_sizes(path):
+    # The totalBytes of each migration in a saved /stats/migrationSummary.
+    with open(path) as f:
+        summary = json.load(f)
+    sizes = []
+    for value in summary.values():
+        if isinstance(value, dict):
+            for row in value.get('migrations') or []:
+                size = (row.get('progress') or {}).get('totalBytes')
+                if size:
+                    sizes.append((row.get('path'), size))
+    return sizes
+
+
+def synthetic_sizes(count, rng):
+    # Mostly small migrations with a few very large ones.
+    sizes = []
+    for i in range(count):
+        if i % 5 == 0:
+            size = rng.uniform(2000, 10000) * GB
+        else:
+            size = rng.uniform(1, 100) * GB
+        sizes.append(('/repl%d' % i, int(size)))
+    return sizes
+
+
+def replay(schedular, policy, sizes, args):
+    # Returns (makespan, completion time of each migration) in seconds.
+    migrations = [schedular.Migration('migration-%d' % i, 'internal-%d' % i, path, schedular.QUEUED_STATE, i)
+                  for i, (path, _) in enumerate(sizes)]
+    remaining = dict(('internal-%d' % i, size) for i, (_, size) in enumerate(sizes))
+    priorities = schedular.PriorityIndex([])
+    link = args.link * MB
+    cap = args.migration_rate * MB
+    completed = {}
+    running = []
+    throughput = None
+    now = 0.0
+    next_run = 0.0
+    while len(completed) < len(migrations):
+        if now >= next_run:
+            next_run += args.period
+            stats = schedular.SchedulingStats(dict(remaining), throughput)
+            queued = [mig for mig in migrations if mig.state == schedular.QUEUED_STATE]
+            queued.sort(key=lambda mig: policy.sort_key(mig, priorities, stats))
+            for mig in queued[:policy.slots(len(running), stats)]:
+                mig.state = 'RUNNING'
+                running.append(mig)
+        # Run to the next completion or the next run, whichever is first.
+        rate = min(cap, link / len(running)) if running else 0.0
+        step = next_run - now
+        if running:
+            step = min(step, min(remaining[mig.internalId] for mig in running) / rate)
+        now += step
+        for mig in running:
+            remaining[mig.internalId] -= rate * step
+        throughput = rate * len(running)
+        for mig in [mig for mig in running if remaining[mig.internalId] <= 1]:
+            mig.state = 'LIVE'
+            remaining[mig.internalId] = 0
+            completed[mig.internalId] = now
+            running.remove(mig)
+    return now, [completed['internal-%d' % i] for i in range(len(sizes))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the ldm-schedular.py policies on recorded or synthetic migrations.')
+    parser.add_argument('--summary', help='A saved /stats/migrationSummary response to take the migration sizes from.')
+    parser.add_argument('--migrations', type=int, default=200, help='Synthetic migrations without --summary.')
+    parser.add_argument('--howmany', type=int, default=8)
+    parser.add_argument('--link', type=float, default=1000, help='Link bandwidth in MB/s.')
+    parser.add_argument('--migration-rate', type=float, default=50, help='Most MB/s a single migration moves.')
+    parser.add_argument('--target-bandwidth', type=float, default=950, help='MB/s for the bandwidth policy.')
+    parser.add_argument('--max-running', type=int, default=32)
+    parser.add_argument('--period', type=float, default=300, help='Seconds between runs of the scheduler.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    schedular = load_script(os.path.join('schedular', 'ldm-schedular.py'), 'ldm_schedular')
+    sizes = recorded_sizes(args.summary) if args.summary else synthetic_sizes(args.migrations, random.Random(args.seed))
+    ordered = sorted(range(len(sizes)), key=lambda i: sizes[i][1])
+    small = ordered[:len(ordered) // 2]
+    total = sum(size for _, size in sizes)
+
+    print('%d migrations, %.1f TB, %d slots, link %d MB/s, %d MB/s per migration' % (
+        len(sizes), total / 1e12, args.howmany, args.link, args.migration_rate))
+    print('%-10s %10s %12s %12s %10s %8s' % ('policy', 'makespan', 'mean done', 'small done', 'link used', 'elapsed'))
+    for name in ('count', 'shortest', 'bandwidth'):
+        policy = schedular.POLICIES[name](args)
+        start = time.time()
+        makespan, completions = replay(schedular, policy, sizes, args)
+        elapsed = time.time() - start
+        print('%-10s %9.1fh %11.1fh %11.1fh %9.0f%% %7.2fs' % (
+            name, makespan / 3600, sum(completions) / len(completions) / 3600,
+            sum(completions[i] for i in small) / len(small) / 3600, 100.0 * total / (args.link * MB * makespan),
+            elapsed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Look up the priority of each migration in a synthetic queue, with a quarter
+# of the paths listed in the priority list, half below a listed path and a
+# quarter unlisted, by a scan of the list as ldm-schedular.py did before and
+# with its PriorityIndex, and report the time taken by each.
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from bench_daily_usage_bucketing import load_script
+
+
+def scan_priority(path, priorities, fallback):
+    # The lookup ldm-schedular.py used before, kept as the reference.
+    try:
+        return priorities.index(path)
+    except ValueError:
+        return fallback
+
+
+def synthetic_queue(listed, queued, rng):
+    paths = []
+    for i in range(queued):
+        kind = i % 4
+        if kind == 0:
+            paths.append('/data/d%d' % rng.randrange(listed))
+        elif kind == 3:
+            paths.append('/unlisted/d%d' % i)
+        else:
+            paths.append('/data/d%d/part%d/day%d' % (rng.randrange(listed), i, kind))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ldm-schedular.py priority lookup.')
+    parser.add_argument('--listed', type=int, default=5000, help='Paths in the priority list.')
+    parser.add_argument('--queued', type=int, default=20000, help='Queued migrations.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    schedular = load_script(os.path.join('schedular', 'ldm-schedular.py'), 'ldm_schedular')
+    rng = random.Random(args.seed)
+    priorities = ['/data/d%d' % i for i in range(args.listed)]
+    rng.shuffle(priorities)
+    queue = synthetic_queue(args.listed, args.queued, rng)
+
+    start = time.time()
+    scanned = [scan_priority(path, priorities, len(priorities) + 1) for path in queue]
+    scan_elapsed = time.time() - start
+
+    start = time.time()
+    index = schedular.PriorityIndex(priorities)
+    compile_elapsed = time.time() - start
+    start = time.time()
+    indexed = [index.priority(path) for path in queue]
+    index_elapsed = time.time() - start
+
+    inherited = 0
+    for path, before, after in zip(queue, scanned, indexed):
+        if before == after:
+            continue
+        ancestor = '/'.join(path.split('/')[:3])
+        if before != index.fallback or after != priorities.index(ancestor):
+            print('%s: priority %d, expected %d' % (path, after, before))
+            return 1
+        inherited += 1
+
+    print('%d listed paths, %d queued migrations, %d inherit a listed ancestor\'s priority' % (
+        args.listed, args.queued, inherited))
+    print('%-24s %8.3fs' % ('list scan', scan_elapsed))
+    print('%-24s %8.3fs %.0fx (compiled in %.3fs)' % ('index', index_elapsed, scan_elapsed / index_elapsed,
+                                                      compile_elapsed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
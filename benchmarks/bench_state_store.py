@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Record a run of sent Notifications in ldm-notifier.py's NotifiedStore, as
+# notify does with one put per Notification, against rewriting a pickle on
+# every put as it did before, and report the time taken by each. Then check a
+# run cut short by a crash, with its last log record torn, is recovered up to
+# the last whole record, and a pickled swp file is converted.
+
+import argparse
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+
+from bench_daily_usage_bucketing import load_script
+
+
+def pickle_puts(path, updates):
+    # The NotifiedStore puts before, each rewriting the pickle in place.
+    seen = frozenset()
+    for i in range(updates):
+        with open(path, "wb") as fp:
+            pickle.dump((1000 + i, 'etag-%d' % i, 'true', seen | frozenset(['notification-%d' % i])), fp)
+
+
+def store_puts(notifier, path, updates, close=True):
+    store = notifier.NotifiedStore(path)
+    for i in range(updates):
+        store.put(1000 + i, 'etag-%d' % i, 'notification-%d' % i)
+    if close:
+        store.close()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the notifier state store.')
+    parser.add_argument('--updates', type=int, default=10000)
+    args = parser.parse_args()
+
+    notifier = load_script(os.path.join('notifier', 'ldm-notifier.py'), 'ldm_notifier')
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'swp_file')
+        start = time.time()
+        pickle_puts(path, args.updates)
+        rewrite = time.time() - start
+        os.remove(path)
+
+        start = time.time()
+        store_puts(notifier, path, args.updates)
+        logged = time.time() - start
+
+        last = args.updates - 1
+        store = notifier.NotifiedStore(path)
+        if store.get() != (1000 + last, 'etag-%d' % last, 'true') or store.seen != frozenset(['notification-%d' % last]):
+            print('State after close differs: %r' % (store.get(),))
+            return 1
+        store.close()
+
+        # A crash: the store is not closed and the last append is torn, with
+        # at least two records in the log since it was last compacted.
+        os.remove(path)
+        crashed = args.updates
+        while crashed % notifier.state_store.DEFAULT_COMPACT_EVERY < 2:
+            crashed += 1
+        store_puts(notifier, path, crashed, close=False)
+        with open(path + '.wal', 'r+b') as f:
+            f.truncate(os.path.getsize(path + '.wal') - 5)
+        recovered = crashed - 2
+        store = notifier.NotifiedStore(path)
+        if store.get() != (1000 + recovered, 'etag-%d' % recovered, 'true'):
+            print('State after a crash differs: %r' % (store.get(),))
+            return 1
+        # An update after the recovery, then a second crash before the store
+        # is closed: the update must not be lost behind the torn line.
+        store.put(2000, 'etag-after', 'notification-after')
+        store = notifier.NotifiedStore(path)
+        if store.get() != (2000, 'etag-after', 'true'):
+            print('Update after a crash lost: %r' % (store.get(),))
+            return 1
+        store.close()
+
+        os.remove(path)
+        pickle_puts(path, 1)
+        store = notifier.NotifiedStore(path)
+        converted = store.get() == (1000, 'etag-0', 'true') and store.seen == frozenset(['notification-0'])
+        store.close()
+        with open(path, 'rb') as f:
+            if not converted or not f.readline().startswith(b'{"format": "ldm-state"'):
+                print('Pickled swp file not converted')
+                return 1
+
+        print('%d updates' % args.updates)
+        print('%-24s %8.3fs' % ('pickle rewrite per put', rewrite))
+        print('%-24s %8.3fs %.1fx' % ('log append per put', logged, rewrite / logged))
+        print('crash after %d updates recovered to update %d, pickled swp file converted' % (crashed, recovered + 1))
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
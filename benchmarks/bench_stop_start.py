@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Start and stop, by pattern, every migration of the stub server with
+# ldm-stop-start.py one request at a time and with each --concurrency, report
+# the wall-clock time of each and check the output is the same, in the same
+# order.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from ldm_stub_server import StubServer, encode_array, synthetic_migrations
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir)
+STOP_START = os.path.join(ROOT, 'stop-start', 'ldm-stop-start.py')
+
+
+def run(config, concurrency, command):
+    start = time.time()
+    output = subprocess.check_output([sys.executable, STOP_START, '--config', config, '--concurrency',
+                                      str(concurrency)] + command)
+    return time.time() - start, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ldm-stop-start.py bulk operations.')
+    parser.add_argument('--migrations', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.005, help='Seconds to delay each response.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 16])
+    args = parser.parse_args()
+
+    server = StubServer(args.migrations, latency=args.latency).start()
+    fd, config = tempfile.mkstemp(suffix='.config')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'api_endpoint': server.endpoint(), 'username': '', 'password': ''}, f)
+    operations = [
+        ('start', 'STOPPED', ['start']),
+        ('stop --pattern', 'LIVE', ['--pattern', r'migration-\d*[02468]$', 'stop']),
+    ]
+    try:
+        print('%d migrations, %.3fs latency' % (args.migrations, args.latency))
+        print('%-16s %12s' % ('operation', 'concurrency') + ''.join('%10d' % c for c in [1] + args.concurrency))
+        for name, state, command in operations:
+            server.bodies['/migrations'] = encode_array(synthetic_migrations(args.migrations, state))
+            sequential, expected = run(config, 1, command)
+            timings = ['%9.2fs' % sequential]
+            for concurrency in args.concurrency:
+                elapsed, output = run(config, concurrency, command)
+                if output != expected:
+                    print('%s output differs with --concurrency %d' % (name, concurrency))
+                    return 1
+                timings.append('%9.2fs' % elapsed)
+            print('%-16s %12s' % (name, '') + ''.join(timings))
+    finally:
+        os.remove(config)
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
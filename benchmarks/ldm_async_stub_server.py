@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# asyncio version of ldm_stub_server.py. The injected latency is an
+# asyncio.sleep rather than a blocked thread, so many slow requests can be in
+# flight at once, as with a real LiveData Migrator.
+
+import argparse
+import asyncio
+import sys
+import threading
+
+from ldm_stub_server import encode_array, route, synthetic_bodies, synthetic_stats
+
+REASONS = {200: 'OK', 404: 'Not Found'}
+
+
+class AsyncStubServer(object):
+    def __init__(self, migrations=10, samples=100, days=60, latency=0.0, port=0, notifications=10):
+        self.latency = latency
+        self.port = port
+        # Responses are encoded once up front.
+        self.bodies = synthetic_bodies(migrations, notifications)
+        self.stats = encode_array(synthetic_stats(samples, days))
+        self.connections = 0
+        self.requests = 0
+        self.loop = None
+        self.server = None
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                verb, path, _ = request_line.decode('latin-1').split(' ', 2)
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                status, body = route(self.bodies, self.stats, path)
+                writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+                              % (status, REASONS.get(status, ''), len(body))).encode('latin-1') + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', self.port, backlog=1024)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    def endpoint(self):
+        return 'http://127.0.0.1:%d' % self.port
+
+    def start(self):
+        # Serve from an event loop on a background thread.
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.serve())
+            started.set()
+            self.loop.run_forever()
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        started.wait()
+        return self
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local asyncio stub of the LiveData Migrator REST API.')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--migrations', type=int, default=10, help='Number of migrations to serve.')
+    parser.add_argument('--samples', type=int, default=100, help='Number of stats samples per migration.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to delay each response.')
+    args = parser.parse_args()
+
+    async def run():
+        server = await AsyncStubServer(args.migrations, args.samples, latency=args.latency, port=args.port).serve()
+        print('Serving on %s' % server.endpoint())
+        await server.server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Local stand-in for the LiveData Migrator REST API used by the benchmarks.
+# It serves synthetic migrations and stats with an injected per-request
+# latency, supports HTTP/1.1 keep-alive and ETags, answering an unchanged
+# If-None-Match with a 304, and counts connections, requests and bytes sent.
+
+import argparse
+import gzip
+import json
+import sys
+import threading
+import time
+import zlib
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def synthetic_migrations(count, state='LIVE'):
+    for i in range(count):
+        yield {
+            'migrationId': 'migration-%d' % i,
+            'internalId': 'internal-%d' % i,
+            'path': '/repl%d' % i,
+            'state': state,
+            'migrationStartTime': i,
+            'target': 'target-filesystem',
+            'sourceFileSystem': 'source-filesystem',
+            'actionPolicy': 'com.wandisco.livemigrator2.migration.OverwriteActionPolicy',
+            'scannerSummary': {'progressSummary': {'bytesScanned': i * 1024, 'filesScanned': i}},
+            'clientActivitySummary': {'byteCount': 0, 'fileCount': 0},
+        }
+
+
+def synthetic_progress(i):
+    return {
+        'totalBytes': 1024, 'excludedBytes': 0, 'migratedPercentage': 50, 'totalMigratedBytes': 512,
+        'duration': {'inSeconds': i, 'asText': ''}, 'etaEstimate': {'inSeconds': i, 'asText': ''},
+        'migrationTotalTransferredProgressBinaryValue': '0.5', 'migrationTotalTransferredReadableBinaryUnits': '0.5',
+        'totalMigratedBytesBinaryUnitValue': 'KiB', 'migrationTotalBinaryUnitValue': 'KiB',
+        'migrationExcludedReadableBinaryValue': '0', 'migrationExcludedBinaryUnitValue': 'B',
+    }
+
+
+def synthetic_migration_summary(count):
+    migrations = [{'id': 'migration-%d' % i, 'path': '/repl%d' % i, 'internalId': 'internal-%d' % i,
+                   'progress': synthetic_progress(i)} for i in range(count)]
+    return {'overallCount': count, 'live': {'migrations': migrations}}
+
+
+def synthetic_throughput_summary():
+    bucket = {'totalBytes': 10 * 1024 * 1024, 'totalFiles': 100, 'peakBytes': 0, 'peakFiles': 0}
+    return {'last10Secs': bucket, 'last60Secs': bucket, 'last300Secs': bucket}
+
+
+def synthetic_diagnostic_summary():
+    return {
+        'actionStoreCurrent': 10, 'actionStoreLargestMigration': 5, 'actionStoreLargestMigrationId': 'migration-0',
+        'pendingRegionCurrent': 10, 'pendingRegionMaxMigration': 5, 'pendingRegionMaxMigrationPath': '/repl0',
+        'retryCount': 0,
+    }
+
+
+def synthetic_license():
+    return {
+        'expiryDate': '2030-01-01T00:00:00',
+        'components': [{'licenseType': 'volume', 'migratedDataLimit': 5497558138880,
+                        'migratedDataSize': 1375554650, 'migratedDataRemaining': 5496182584230}],
+    }
+
+
+def synthetic_notifications(count):
+    now = int(time.time() * 1000)
+    for i in range(count):
+        yield {
+            'id': 'notification-%d' % i, 'type': 'MigrationLiveNotification', 'level': 'INFO',
+            'message': 'Migration migration-%d is now live at /repl%d' % (i, i),
+            'timeStamp': now - (count - i) * 1000, 'dateCreated': '2024-01-01T00:00:00Z',
+            'dateUpdated': '2024-01-01T00:00:00Z', 'resolved': False,
+        }
+
+
+def encode_array(items):
+    # Encode item by item, the items are never all held at once.
+    return b'[' + b','.join(json.dumps(item).encode('utf-8') for item in items) + b']'
+
+
+def synthetic_stats(samples, days):
+    # Newest first, the total migrated grows by a fixed amount per sample.
+    now = int(time.time() * 1000)
+    step = max(1, (days * DAY_MS) // max(1, samples))
+    stats = []
+    for i in range(samples):
+        stats.append({
+            'timeStamp': now - i * step,
+            'migrationStats': {'successfulBytesMigrated': (samples - i) * 1024},
+        })
+    return stats
+
+
+def synthetic_bodies(migrations, notifications):
+    # The encoded response of each fixed path.
+    bodies = {
+        '/migrations': encode_array(synthetic_migrations(migrations)),
+        '/stats/migrationSummary': json.dumps(synthetic_migration_summary(min(migrations, 1000))).encode('utf-8'),
+        '/stats/throughputSummary': json.dumps(synthetic_throughput_summary()).encode('utf-8'),
+        '/diagnostics/summary': json.dumps(synthetic_diagnostic_summary()).encode('utf-8'),
+        '/diagnostics/summary.txt': b'Diagnostics Summary',
+        '/info/nodeID': b'00000000-0000-0000-0000-000000000000',
+        '/license': json.dumps(synthetic_license()).encode('utf-8'),
+        '/notifications': encode_array(synthetic_notifications(notifications)),
+    }
+    bodies['/notifications/last'] = json.dumps(list(synthetic_notifications(notifications))[-1]).encode('utf-8')
+    return bodies
+
+
+def route(bodies, stats, request_path):
+    # Returns the (status, body) served for a request path.
+    path = unquote(request_path.split('?')[0])
+    if path in bodies:
+        return 200, bodies[path]
+    if path.startswith('/stats/'):
+        return 200, stats
+    if path.startswith('/migrations/') and path.endswith(('/start', '/stop')):
+        return 200, b'{}'
+    if path.startswith('/fs/targets/') and path.endswith('/deleteByPath'):
+        return 200, b'{}'
+    return 404, json.dumps({'message': 'Not found'}).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def send_body(self, body, status=200):
+        if status == 200:
+            etag = self.server.etag(body)
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+        self.send_response(status)
+        if status == 200:
+            self.send_header('ETag', etag)
+        if self.server.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.server.bandwidth:
+            time.sleep(len(body) / self.server.bandwidth)
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            # The client stopped reading part way through the body.
+            self.close_connection = True
+            return
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+
+    def respond(self):
+        with self.server.lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status, body = route(self.server.bodies, self.server.stats, self.path)
+        self.send_body(body, status)
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            self.rfile.read(length)
+        self.respond()
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, migrations=10, samples=100, days=60, latency=0.0, port=0, gzip=False, notifications=10,
+                 bandwidth=0):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', port), StubHandler)
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.gzip = gzip
+        # Bytes per second a response body is sent at, 0 for no limit.
+        self.bandwidth = bandwidth
+        # Responses are encoded once up front.
+        self.bodies = synthetic_bodies(migrations, notifications)
+        self.stats = encode_array(synthetic_stats(samples, days))
+        self.etags = {}
+        self.connections = 0
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def etag(self, body):
+        # Bodies are fixed once encoded, so each is hashed once.
+        key = (id(body), len(body))
+        with self.lock:
+            if key not in self.etags:
+                self.etags[key] = '"%08x"' % zlib.crc32(body)
+            return self.etags[key]
+
+    def endpoint(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stub of the LiveData Migrator REST API.')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--migrations', type=int, default=10, help='Number of migrations to serve.')
+    parser.add_argument('--samples', type=int, default=100, help='Number of stats samples per migration.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to delay each response.')
+    parser.add_argument('--gzip', action='store_true', help='Gzip responses if the client accepts it.')
+    parser.add_argument('--bandwidth', type=float, default=0, help='MB per second responses are sent at, 0 for no limit.')
+    args = parser.parse_args()
+
+    server = StubServer(args.migrations, args.samples, latency=args.latency, port=args.port, gzip=args.gzip,
+                        bandwidth=args.bandwidth * 1000000)
+    print('Serving on %s' % server.endpoint())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
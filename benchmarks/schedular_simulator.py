@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Discrete-event simulation of ldm-schedular.py run from cron. A local fake
+# of the LiveData Migrator REST API serves /migrations and the stats of a
+# simulated set of migrations, and the script's own scheduler() is called
+# against it every period of simulated time. Between runs the clock jumps to
+# the next run or the next migration to complete, whichever is first, with
+# the running migrations moving data at the rate of the throughput model.
+# Reports the makespan, the slot utilisation and the completion times of
+# each priority, so a change to the scheduler or its policies can be tested
+# without a LiveData Migrator.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+
+from bench_daily_usage_bucketing import load_script
+from ldm_stub_server import StubHandler, StubServer, encode_array
+
+MB = 1000000
+GB = 1000 * MB
+# Bytes left below which a migration is complete, for rounding.
+EPSILON = 1
+
+
+class ThroughputModel(object):
+    # The running migrations share link bytes per second equally, each moving
+    # at most per_migration bytes per second.
+    def __init__(self, link, per_migration):
+        self.link = link
+        self.per_migration = per_migration
+
+    def rate(self, running):
+        # Bytes per second each of running migrations moves.
+        return min(self.per_migration, self.link / running) if running else 0.0
+
+
+class SimulatedMigration(object):
+    def __init__(self, index, path, size):
+        self.internal_id = 'internal-%d' % index
+        self.row = {'migrationId': 'migration-%d' % index, 'internalId': self.internal_id, 'path': path,
+                    'state': 'NONSCHEDULED', 'migrationStartTime': index}
+        self.size = size
+        self.remaining = float(size)
+        self.started = None
+        self.completed = None
+
+
+class FakeMigratorHandler(StubHandler):
+    def respond(self):
+        simulation = self.server.simulation
+        with self.server.lock:
+            self.server.requests += 1
+        path = self.path.split('?')[0]
+        if path == '/migrations':
+            self.send_body(simulation.migrations_body())
+        elif path == '/stats/migrationSummary':
+            self.send_body(simulation.summary_body())
+        elif path == '/stats/throughputSummary':
+            self.send_body(simulation.throughput_body())
+        elif path.startswith('/migrations/') and path.endswith('/start'):
+            simulation.start(path.split('/')[2])
+            self.send_body(b'{}')
+        else:
+            self.send_body(json.dumps({'message': 'Not found'}).encode('utf-8'), 404)
+
+
+class FakeMigrator(StubServer):
+    def __init__(self, simulation):
+        StubServer.__init__(self)
+        self.RequestHandlerClass = FakeMigratorHandler
+        self.simulation = simulation
+
+    def etag(self, body):
+        return '"%08x"' % zlib.crc32(body)
+
+
+class Simulation(object):
+    # The simulated migrations and clock, served by a FakeMigrator.
+    def __init__(self, migrations, model):
+        self.migrations = [SimulatedMigration(i, path, size) for i, (path, size) in enumerate(migrations)]
+        self.by_id = dict((migration.internal_id, migration) for migration in self.migrations)
+        self.model = model
+        self.lock = threading.Lock()
+        self.now = 0.0
+        # Slot seconds used, counted up to the scheduler's howmany.
+        self.busy = 0.0
+
+    def running(self):
+        return [migration for migration in self.migrations if migration.row['state'] == 'RUNNING']
+
+    def migrations_body(self):
+        with self.lock:
+            return encode_array(migration.row for migration in self.migrations)
+
+    def summary_body(self):
+        categories = {'NONSCHEDULED': 'ready', 'RUNNING': 'running', 'LIVE': 'live'}
+        summary = dict((category, {'migrations': []}) for category in categories.values())
+        with self.lock:
+            for migration in self.migrations:
+                summary[categories[migration.row['state']]]['migrations'].append({
+                    'id': migration.row['migrationId'], 'path': migration.row['path'],
+                    'internalId': migration.internal_id,
+                    'progress': {'totalBytes': migration.size,
+                                 'totalMigratedBytes': int(migration.size - migration.remaining)}})
+            summary['overallCount'] = len(self.migrations)
+        return json.dumps(summary).encode('utf-8')
+
+    def throughput_body(self):
+        with self.lock:
+            running = len(self.running())
+            per_second = self.model.rate(running) * running
+        buckets = dict((name, {'totalBytes': int(per_second * seconds), 'totalFiles': 0, 'peakBytes': 0,
+                               'peakFiles': 0})
+                       for name, seconds in (('last10Secs', 10), ('last60Secs', 60), ('last300Secs', 300)))
+        return json.dumps(buckets).encode('utf-8')
+
+    def start(self, internal_id):
+        with self.lock:
+            migration = self.by_id[internal_id]
+            if migration.row['state'] == 'NONSCHEDULED':
+                migration.row['state'] = 'RUNNING'
+                migration.started = self.now
+
+    def advance(self, until, howmany):
+        # Move the clock to until, or to the first completion before it.
+        # Returns True once every migration is complete.
+        with self.lock:
+            running = self.running()
+            rate = self.model.rate(len(running))
+            step = until - self.now
+            if running:
+                step = min(step, min(migration.remaining for migration in running) / rate)
+            self.now += step
+            self.busy += min(len(running), howmany) * step
+            for migration in running:
+                migration.remaining -= rate * step
+                if migration.remaining <= EPSILON:
+                    migration.remaining = 0.0
+                    migration.row['state'] = 'LIVE'
+                    migration.completed = self.now
+            return all(migration.completed is not None for migration in self.migrations)
+
+
+def simulate(schedular, policy, priorities, migrations, model, period, max_time):
+    # Run scheduler() every period seconds of simulated time until every
+    # migration is complete. Returns the Simulation and the scheduler runs.
+    simulation = Simulation(migrations, model)
+    server = FakeMigrator(simulation).start()
+    schedular.CLIENT = schedular.ldm_client.get_client(server.endpoint())
+    runs = 0
+    try:
+        done = False
+        while not done and simulation.now < max_time:
+            # The scheduler prints a report of each run.
+            with contextlib.redirect_stdout(io.StringIO()):
+                schedular.scheduler(policy, priorities)
+            runs += 1
+            next_run = simulation.now + period
+            while not done and simulation.now < next_run:
+                done = simulation.advance(next_run, policy.howmany)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return simulation, runs
+
+
+def synthetic_migrations(count, rng):
+    # A fifth of the migrations several TB, the rest under 100 GB, under three
+    # top level directories listed in priority order.
+    migrations = []
+    for i in range(count):
+        size = rng.uniform(2000, 10000) * GB if i % 5 == 0 else rng.uniform(1, 100) * GB
+        migrations.append(('/%s/repl%d' % (('high', 'medium', 'low')[i % 3], i), int(size)))
+    return migrations, ['/high', '/medium', '/low']
+
+
+def load_migrations(path):
+    # A JSON list of {"path": ..., "size": bytes}.
+    with open(path) as f:
+        return [(row['path'], int(row['size'])) for row in json.load(f)]
+
+
+def report(simulation, priorities, howmany, runs):
+    makespan = simulation.now
+    completed = [migration for migration in simulation.migrations if migration.completed is not None]
+    print('  makespan %.1fh, slot utilisation %.1f%%, %d/%d complete, %d scheduler runs' % (
+        makespan / 3600, 100.0 * simulation.busy / (howmany * makespan) if makespan else 0.0,
+        len(completed), len(simulation.migrations), runs))
+    by_priority = {}
+    for migration in completed:
+        by_priority.setdefault(priorities.priority(migration.row['path']), []).append(migration.completed)
+    for priority in sorted(by_priority):
+        times = by_priority[priority]
+        label = priorities.paths[priority] if priority < len(priorities.paths) else 'unlisted'
+        print('  %-12s %5d migrations, mean done %7.1fh, last done %7.1fh' % (
+            label, len(times), sum(times) / len(times) / 3600, max(times) / 3600))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate ldm-schedular.py run from cron against a fake LiveData Migrator.')
+    parser.add_argument('--migrations', help='JSON list of {"path": ..., "size": bytes} to simulate, else synthetic.')
+    parser.add_argument('--count', type=int, default=200, help='Synthetic migrations without --migrations.')
+    parser.add_argument('--priority-list', help='Priority list file, as for ldm-schedular.py.')
+    parser.add_argument('--policy', nargs='+', default=['count'], help='Policies to simulate, default count.')
+    parser.add_argument('--howmany', type=int, default=8)
+    parser.add_argument('--target-bandwidth', type=float, default=950, help='MB/s for the bandwidth policy.')
+    parser.add_argument('--max-running', type=int, default=32)
+    parser.add_argument('--link', type=float, default=1000, help='Link bandwidth in MB/s.')
+    parser.add_argument('--migration-rate', type=float, default=50, help='Most MB/s a single migration moves.')
+    parser.add_argument('--period', type=float, default=300, help='Seconds between runs of the scheduler.')
+    parser.add_argument('--max-hours', type=float, default=24 * 365, help='Simulated hours to stop after.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    schedular = load_script(os.path.join('schedular', 'ldm-schedular.py'), 'ldm_schedular')
+    if args.migrations:
+        migrations, paths = load_migrations(args.migrations), []
+    else:
+        migrations, paths = synthetic_migrations(args.count, random.Random(args.seed))
+    if args.priority_list:
+        with open(args.priority_list) as f:
+            paths = [line.rstrip() for line in f]
+    priorities = schedular.PriorityIndex(paths)
+    model = ThroughputModel(args.link * MB, args.migration_rate * MB)
+
+    print('%d migrations, %.1f TB, %d slots, link %d MB/s, %d MB/s per migration, run every %ds' % (
+        len(migrations), sum(size for _, size in migrations) / 1e12, args.howmany, args.link, args.migration_rate,
+        args.period))
+    for name in args.policy:
+        if name not in schedular.POLICIES:
+            parser.error('unknown policy %s, choose from %s' % (name, ', '.join(sorted(schedular.POLICIES))))
+        policy = schedular.POLICIES[name](args)
+        start = time.time()
+        simulation, runs = simulate(schedular, policy, priorities, migrations, model, args.period,
+                                    args.max_hours * 3600)
+        print('%s (simulated in %.1fs)' % (name, time.time() - start))
+        report(simulation, priorities, args.howmany, runs)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
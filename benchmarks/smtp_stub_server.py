@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Local stand-in for an SMTP server, for benchmarking the scripts' e-mail.
+# Enough of SMTP for smtplib is spoken, with AUTH PLAIN accepting any login.
+# The cost of a new session, its TLS handshake and login, is injected as a
+# delay before the greeting, and a number of messages can be refused with a
+# transient 451 reply.
+
+import argparse
+import socketserver
+import sys
+import threading
+import time
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.sessions += 1
+        if server.session_latency:
+            time.sleep(server.session_latency)
+        self.reply('220 localhost SMTP stub')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250-localhost')
+                self.reply('250 AUTH PLAIN')
+            elif verb == 'AUTH':
+                self.reply('235 Authentication successful')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b'.\r\n', b'.\n', b''):
+                        break
+                    size += len(data)
+                with server.lock:
+                    refuse = server.refuse > 0
+                    if refuse:
+                        server.refuse -= 1
+                    else:
+                        server.messages += 1
+                        server.bytes_received += size
+                if refuse:
+                    self.reply('451 Try again later')
+                else:
+                    self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SmtpStubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, session_latency=0.0, refuse=0):
+        socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', port), SmtpHandler)
+        self.lock = threading.Lock()
+        # Seconds before the greeting of each session.
+        self.session_latency = session_latency
+        # Messages still to refuse with 451.
+        self.refuse = refuse
+        self.sessions = 0
+        self.messages = 0
+        self.bytes_received = 0
+
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for an SMTP server.')
+    parser.add_argument('--port', type=int, default=1025)
+    parser.add_argument('--session-latency', type=float, default=0.0, help='Seconds to delay the greeting of each session.')
+    args = parser.parse_args()
+
+    server = SmtpStubServer(args.port, args.session_latency)
+    print('Serving on localhost:%d' % server.port())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# On-disk cache of LiveData Migrator REST responses, shared by the scripts.
+#
+# A cached response is revalidated with If-None-Match/If-Modified-Since, so
+# an unchanged response costs a 304 rather than the full body. Within ttl
+# seconds of being stored or revalidated a response is used without asking
+# LiveData Migrator at all. The bodies are files in the cache directory, the
+# index is a SQLite database, and the least recently used responses are
+# evicted once the bodies exceed max_bytes. Several scripts, or runs of a
+# script, can share a cache directory.
+
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Only these paths are cached, they are read on every run of the scripts.
+CACHEABLE_PATHS = (
+    '/migrations',
+    '/stats/migrationSummary',
+    '/stats/throughputSummary',
+    '/diagnostics/summary',
+    '/license',
+)
+# Default seconds a stored response is used without revalidation.
+DEFAULT_TTL = 0
+# Default limit on the size of the cached bodies.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+INDEX_FILE = 'index.sqlite'
+# Bytes copied at a time when storing a body.
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class CachedResponse(object):
+    # A response served from the cache, it has the same interface as the
+    # client's Response.
+    def __init__(self, body, headers):
+        self.status = 200
+        self.reason = 'OK'
+        self.body = body
+        self.headers = headers
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self, amt=None):
+        data = self.body.read() if amt is None else self.body.read(amt)
+        if amt is None or not data:
+            self.body.close()
+        return data
+
+    def close(self):
+        self.body.close()
+
+
+class HttpCache(object):
+    def __init__(self, directory, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(directory, INDEX_FILE), timeout=30,
+                                          check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_type TEXT, "
+            "stored REAL NOT NULL, used REAL NOT NULL, size INTEGER NOT NULL)")
+        self.connection.commit()
+        # Responses served without a request, after a 304 and fetched in full.
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def cacheable(self, path):
+        return path in CACHEABLE_PATHS
+
+    def key(self, endpoint, username, path):
+        # Responses are kept apart per instance and user.
+        return hashlib.sha1(('%s\n%s\n%s' % (endpoint, username or '', path)).encode('utf-8')).hexdigest()
+
+    def body_file(self, key):
+        return os.path.join(self.directory, key + '.body')
+
+    def lookup(self, key):
+        # Returns (etag, last_modified, content_type, stored) or None.
+        with self.lock:
+            return self.connection.execute(
+                "SELECT etag, last_modified, content_type, stored FROM entries WHERE key = ?", (key,)).fetchone()
+
+    def fresh(self, entry):
+        return self.ttl > 0 and time.time() - entry[3] < self.ttl
+
+    def validators(self, entry):
+        headers = {}
+        if entry is not None:
+            if entry[0]:
+                headers['If-None-Match'] = entry[0]
+            if entry[1]:
+                headers['If-Modified-Since'] = entry[1]
+        return headers
+
+    def storable(self, response):
+        if 'no-store' in (response.getheader('Cache-Control', '') or ''):
+            return False
+        return self.ttl > 0 or bool(response.getheader('ETag') or response.getheader('Last-Modified'))
+
+    def response(self, key, entry, revalidated=False):
+        # Returns a CachedResponse for the entry, or None if its body has
+        # been evicted.
+        try:
+            body = open(self.body_file(key), 'rb')
+        except (IOError, OSError):
+            return None
+        now = time.time()
+        with self.lock:
+            if revalidated:
+                self.revalidated += 1
+                self.connection.execute("UPDATE entries SET stored = ?, used = ? WHERE key = ?", (now, now, key))
+            else:
+                self.hits += 1
+                self.connection.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+        return CachedResponse(body, {'content-type': entry[2] or 'application/json'})
+
+    def store(self, key, response):
+        # Reads the body of response into the cache and returns it as a
+        # CachedResponse. The body is written to a temporary file and renamed
+        # into place, so a concurrent reader never sees part of a body.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(response, f, COPY_CHUNK_SIZE)
+                size = f.tell()
+            os.rename(tmp, self.body_file(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        # Opened before eviction, which may remove a body larger than max_bytes.
+        body = open(self.body_file(key), 'rb')
+        content_type = response.getheader('Content-Type')
+        now = time.time()
+        with self.lock:
+            self.misses += 1
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, etag, last_modified, content_type, stored, used, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, response.getheader('ETag'), response.getheader('Last-Modified'), content_type, now, now, size))
+            self.connection.commit()
+        self.evict()
+        return CachedResponse(body, {'content-type': content_type or 'application/json'})
+
+    def miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def evict(self):
+        # Remove the least recently used bodies beyond max_bytes.
+        with self.lock:
+            rows = self.connection.execute("SELECT key, size FROM entries ORDER BY used DESC").fetchall()
+            total = 0
+            evicted = []
+            for key, size in rows:
+                if total + size > self.max_bytes:
+                    evicted.append(key)
+                else:
+                    total += size
+            if not evicted:
+                return
+            self.connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+            self.connection.commit()
+        for key in evicted:
+            logging.debug("Evicting cached response %s", key)
+            try:
+                os.remove(self.body_file(key))
+            except OSError:
+                pass
+
+    def summary(self):
+        with self.lock:
+            total = self.hits + self.revalidated + self.misses
+            if not total:
+                return "0 requests"
+            return "%d hits, %d revalidated, %d misses, hit ratio %.0f%%" % (
+                self.hits, self.revalidated, self.misses, 100.0 * (self.hits + self.revalidated) / total)
+
+    def close(self):
+        self.connection.close()
+
+
+# Caches are shared by all clients using the same directory.
+caches = {}
+caches_lock = threading.Lock()
+
+
+def get_cache(directory, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+    directory = os.path.abspath(directory)
+    with caches_lock:
+        cache = caches.get(directory)
+        if cache is None:
+            cache = HttpCache(directory, ttl, max_bytes)
+            caches[directory] = cache
+        return cache
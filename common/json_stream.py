@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Incremental decoding of JSON from a file like object, such as an HTTP
+# response. Only the structure leading to the wanted values is walked by
+# hand, each value is decoded by json.JSONDecoder.raw_decode from a buffer
+# holding little more than the value, so a response is never held in full.
+
+import codecs
+import json
+
+# Bytes read from the stream at a time.
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = ' \t\r\n'
+NUMBER_START = '-0123456789'
+NUMBER_CHARS = '0123456789+-.eE'
+
+
+class JsonStream(object):
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        # Returns False once the stream is exhausted. The read size grows with
+        # the value being decoded, so a large value is not re-parsed once per
+        # chunk.
+        if self.eof:
+            return False
+        data = self.stream.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not data:
+            self.eof = True
+            text = self.utf8.decode(b'', True)
+        else:
+            text = self.utf8.decode(data)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError("Expecting one of %r at position %d, found %r" % (chars, self.pos, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        # Decode the next complete value.
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                # The value is cut off by the end of the buffer.
+                if self._fill():
+                    continue
+                raise
+            if (self.buffer[self.pos] in NUMBER_START and not self.eof and
+                    not self.buffer[end:].strip(NUMBER_CHARS) and self._fill()):
+                # A number at the end of the buffer may continue in the next chunk.
+                continue
+            self.pos = end
+            return value
+
+    def array(self):
+        # Yield each element of the array at the current position.
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self._expect(',]') == ']':
+                return
+
+    def keys(self):
+        # Yield each key of the object at the current position, the caller
+        # must consume the member's value before asking for the next key.
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(':')
+            yield key
+            if self._expect(',}') == '}':
+                return
+
+    def members(self):
+        for key in self.keys():
+            yield key, self.value()
+
+    def items(self, *path):
+        # Yield the elements of the array found by following the object keys
+        # in path, other members are skipped.
+        if not path:
+            for item in self.array():
+                yield item
+            return
+        for key in self.keys():
+            if key == path[0]:
+                for item in self.items(*path[1:]):
+                    yield item
+            else:
+                self.value()
+
+
+def iter_items(stream, *path):
+    return JsonStream(stream).items(*path)
+
+
+def iter_members(stream):
+    return JsonStream(stream).members()
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# asyncio LiveData Migrator REST client, python3 only.
+#
+# HTTP/1.1 is spoken directly over asyncio streams so nothing beyond the
+# standard library is needed. A semaphore bounds the requests in flight and
+# connections are kept alive and reused. The scripts use request_all, which
+# runs a batch of requests on its own event loop and hands each response to
+# a plain function, so the scripts themselves stay free of async syntax.
+
+import asyncio
+import json
+import logging
+import ssl
+import time
+import zlib
+
+from urllib.parse import urlparse
+
+from ldm_client import IDEMPOTENT_VERBS, build_auth_header
+
+# Default number of requests in flight at once.
+DEFAULT_CONCURRENCY = 16
+
+
+class AsyncResponse(object):
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self):
+        return self.body
+
+
+class ConnectionClosed(ConnectionError):
+    pass
+
+
+class AsyncLdmClient(object):
+    def __init__(self, endpoint, username=None, password=None, concurrency=DEFAULT_CONCURRENCY, timeout=None):
+        url = urlparse(endpoint)
+        self.host = url.hostname
+        self.netloc = url.netloc
+        self.ssl = ssl.create_default_context() if url.scheme == 'https' else None
+        self.port = url.port or (443 if self.ssl else 80)
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.idle = []
+        self.opened = 0
+        self.headers = {'Host': self.netloc, 'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'}
+        if username:
+            self.headers['Authorization'] = build_auth_header(username, password)
+        # (verb, path, status, seconds) for each request.
+        self.timings = []
+
+    async def _connect(self):
+        logging.debug("Opening %s connection to %s", 'https' if self.ssl else 'http', self.netloc)
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+
+    async def _send(self, writer, verb, path, body, headers):
+        request_headers = dict(self.headers)
+        if headers:
+            request_headers.update(headers)
+        if body is not None:
+            if not isinstance(body, bytes):
+                body = body.encode('utf-8')
+            request_headers['Content-Length'] = str(len(body))
+        head = '%s %s HTTP/1.1\r\n' % (verb, path)
+        head += ''.join('%s: %s\r\n' % (name, value) for name, value in request_headers.items())
+        writer.write((head + '\r\n').encode('latin-1') + (body or b''))
+        await writer.drain()
+
+    async def _receive(self, reader, verb):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionClosed()
+        version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if verb == 'HEAD' or status in ('204', '304'):
+            data = b''
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Trailers, if any, end with a blank line.
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                data += await reader.readexactly(size)
+                await reader.readexactly(2)
+        elif 'content-length' in response_headers:
+            data = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await reader.read()
+            response_headers['connection'] = 'close'
+
+        if response_headers.get('content-encoding', '').lower() == 'gzip':
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+        keep_alive = version == 'HTTP/1.1' and response_headers.get('connection', '').lower() != 'close'
+        return AsyncResponse(int(status), reason, response_headers, data), keep_alive
+
+    async def _request(self, verb, path, body, headers):
+        reused = bool(self.idle)
+        reader, writer = self.idle.pop() if reused else await self._connect()
+        sent = False
+        try:
+            await self._send(writer, verb, path, body, headers)
+            sent = True
+            response, keep_alive = await self._receive(reader, verb)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            # A request that is not idempotent, such as a POST to start a
+            # Migration, may have been acted on once it was sent.
+            if not reused or (sent and verb not in IDEMPOTENT_VERBS):
+                raise
+            # The server may have closed the kept-alive connection, retry once
+            # on a new connection.
+            reader, writer = await self._connect()
+            try:
+                await self._send(writer, verb, path, body, headers)
+                response, keep_alive = await self._receive(reader, verb)
+            except BaseException:
+                writer.close()
+                raise
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        return response
+
+    async def request(self, verb, path, body=None, headers=None):
+        async with self.semaphore:
+            start = time.time()
+            response = await asyncio.wait_for(self._request(verb, path, body, headers), self.timeout)
+            elapsed = time.time() - start
+        self.timings.append((verb, path, response.status, elapsed))
+        logging.debug("%s %s %d %.3fs", verb, path, response.status, elapsed)
+        return response
+
+    async def get_json(self, path):
+        response = await self.request('GET', path)
+        if response.status != 200:
+            raise ValueError(response.status, response.reason)
+        return json.loads(response.body)
+
+    async def close(self):
+        idle, self.idle = self.idle, []
+        for _, writer in idle:
+            writer.close()
+
+    def timing_summary(self):
+        timings = [timing[3] for timing in self.timings]
+        if not timings:
+            return "0 requests"
+        return "%d requests, %d connections, total %.3fs, mean %.3fs, max %.3fs" % (
+            len(timings), self.opened, sum(timings), sum(timings) / len(timings), max(timings))
+
+
+async def _request_all(client, requests, on_response):
+    async def one(index, request):
+        response = await client.request(*request)
+        return on_response(index, response) if on_response else response
+
+    try:
+        return await asyncio.gather(*[one(index, request) for index, request in enumerate(requests)])
+    finally:
+        await client.close()
+
+
+def request_all(config, requests, on_response=None, concurrency=DEFAULT_CONCURRENCY):
+    # Issue requests, tuples of (verb, path[, body[, headers]]), with at most
+    # concurrency in flight. Returns on_response(index, response) for each
+    # request, or the response if there is no on_response, in request order.
+    # on_response runs on the event loop as each response arrives, so only its
+    # result is kept rather than every response body.
+    async def run():
+        client = AsyncLdmClient(config['api_endpoint'], config.get('username'), config.get('password'),
+                                concurrency, config.get('timeout'))
+        results = await _request_all(client, requests, on_response)
+        logging.debug("HTTP: %s", client.timing_summary())
+        return results
+
+    return asyncio.run(run())
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# LiveData Migrator REST client shared by the scripts.
+#
+# Connections are pooled per endpoint and kept alive between requests, so a
+# run makes one TLS handshake per concurrent request rather than one per
+# request. The Authorization header is built once per client, gzip encoded
+# responses are decoded and each request is timed. Responses to the paths
+# read on every run can be kept in an on-disk cache, see http_cache.py.
+
+import atexit
+import base64
+import logging
+import socket
+import sys
+import threading
+import time
+import zlib
+from io import BytesIO
+
+if (2, 6) <= sys.version_info < (3, 0):
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+    from urlparse import urlparse
+else:
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib.parse import urlparse
+
+import http_cache
+
+# Idle connections kept per endpoint.
+POOL_SIZE = 32
+# Compressed bytes read at a time when decoding a gzip response.
+GZIP_CHUNK_SIZE = 64 * 1024
+# Requests that can be sent again on a new connection if a kept-alive one
+# fails after the request was sent. Others, such as a POST to start a
+# Migration, may already have been acted on.
+IDEMPOTENT_VERBS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+
+
+def build_auth_header(username, password):
+    credentials = ('%s:%s' % (username, password))
+    encoded_credentials = base64.b64encode(credentials.encode('ascii'))
+    return 'Basic %s' % encoded_credentials.decode("ascii")
+
+
+class ConnectionPool(object):
+    def __init__(self, endpoint, timeout=None, size=POOL_SIZE):
+        url = urlparse(endpoint)
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.timeout = timeout
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def new_connection(self):
+        logging.debug("Opening %s connection to %s", self.scheme, self.netloc)
+        with self.lock:
+            self.opened += 1
+        if self.scheme == 'https':
+            return HTTPSConnection(self.netloc, timeout=self.timeout)
+        return HTTPConnection(self.netloc, timeout=self.timeout)
+
+    def get(self):
+        # Returns (connection, reused).
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self.new_connection(), False
+
+    def put(self, conn):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+# Pools are shared by all clients of an endpoint with the same timeout.
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(endpoint, timeout=None):
+    key = (endpoint, timeout)
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(endpoint, timeout)
+            pools[key] = pool
+        return pool
+
+
+def close_pools():
+    with pools_lock:
+        for pool in pools.values():
+            pool.close()
+        pools.clear()
+
+
+class GzipReader(object):
+    # Decompresses a gzip encoded response as it is read.
+    def __init__(self, raw):
+        self.raw = raw
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.buffer = b''
+        self.eof = False
+
+    def read(self, amt=None):
+        if amt is None:
+            data = self.buffer
+            if not self.eof:
+                data += self.decompressor.decompress(self.raw.read()) + self.decompressor.flush()
+            self.buffer = b''
+            self.eof = True
+            return data
+        while len(self.buffer) < amt and not self.eof:
+            chunk = self.raw.read(GZIP_CHUNK_SIZE)
+            if chunk:
+                self.buffer += self.decompressor.decompress(chunk)
+            else:
+                self.buffer += self.decompressor.flush()
+                self.eof = True
+        data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+        return data
+
+
+class Response(object):
+    # Wraps an HTTPResponse, the connection goes back to the pool once the
+    # body has been read.
+    def __init__(self, response, conn, pool, stream):
+        self.response = response
+        self.status = response.status
+        self.reason = response.reason
+        self.conn = conn
+        self.pool = pool
+        body = response
+        if (response.getheader('Content-Encoding', '') or '').lower() == 'gzip':
+            body = GzipReader(response)
+        self.body = body
+        if not stream:
+            self.buffer()
+
+    def getheader(self, name, default=None):
+        return self.response.getheader(name, default)
+
+    def read(self, amt=None):
+        if amt is None:
+            data = self.body.read()
+        else:
+            data = self.body.read(amt)
+        # The connection can be reused as soon as the response is read off
+        # it, a gzip body may still have decompressed data buffered.
+        if amt is None or not data or self.response.isclosed():
+            self.release()
+        return data
+
+    def buffer(self):
+        # Read the body in full and release the connection.
+        self.body = BytesIO(self.body.read())
+        self.release()
+
+    def release(self):
+        if self.conn is None:
+            return
+        conn, self.conn = self.conn, None
+        # Any remainder, such as the end of a gzip stream, must be consumed
+        # before the connection can be reused.
+        try:
+            self.response.read()
+        except (HTTPException, socket.error):
+            conn.close()
+            return
+        if self.response.getheader('Connection', '').lower() == 'close' or self.response.will_close:
+            conn.close()
+            return
+        self.pool.put(conn)
+
+    def close(self):
+        # Abandon the rest of the body. The connection is closed rather than
+        # read to the end of the body.
+        if self.conn is None:
+            return
+        conn, self.conn = self.conn, None
+        conn.close()
+
+
+class LdmClient(object):
+    def __init__(self, endpoint, username=None, password=None, timeout=None, cache=None):
+        self.endpoint = endpoint
+        self.username = username
+        self.pool = get_pool(endpoint, timeout)
+        self.cache = cache
+        self.headers = {'Accept-Encoding': 'gzip'}
+        if username:
+            self.headers['Authorization'] = build_auth_header(username, password)
+        self.lock = threading.Lock()
+        # Running totals of the requests made, the daemons make requests for
+        # as long as they run.
+        self.requests = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def request(self, verb, path, body=None, headers=None, stream=False):
+        # With stream the body is read from the response as it arrives,
+        # otherwise it is read in full before returning.
+        if self.cache is not None and verb == 'GET' and not headers and self.cache.cacheable(path):
+            return self.cached_request(path, stream)
+        return self.send(verb, path, body, headers, stream)
+
+    def cached_request(self, path, stream):
+        cache = self.cache
+        key = cache.key(self.endpoint, self.username, path)
+        entry = cache.lookup(key)
+        if entry is not None and cache.fresh(entry):
+            response = cache.response(key, entry)
+            if response is not None:
+                logging.debug("GET %s served from cache", path)
+                return response
+
+        response = self.send('GET', path, None, cache.validators(entry), True)
+        if response.status == 304 and entry is not None:
+            response.read()
+            cached = cache.response(key, entry, revalidated=True)
+            if cached is not None:
+                return cached
+            # The body was evicted since the lookup, fetch it again.
+            response = self.send('GET', path, None, None, True)
+        if response.status == 200 and cache.storable(response):
+            return cache.store(key, response)
+        cache.miss()
+        if not stream:
+            response.buffer()
+        return response
+
+    def send(self, verb, path, body, headers, stream):
+        request_headers = dict(self.headers)
+        if headers:
+            request_headers.update(headers)
+
+        start = time.time()
+        conn, reused = self.pool.get()
+        sent = False
+        try:
+            conn.request(verb, path, body, request_headers)
+            sent = True
+            response = conn.getresponse()
+        except (HTTPException, socket.error):
+            conn.close()
+            if not reused or (sent and verb not in IDEMPOTENT_VERBS):
+                raise
+            # The server may have closed the kept-alive connection, retry once
+            # on a new connection.
+            conn = self.pool.new_connection()
+            try:
+                conn.request(verb, path, body, request_headers)
+                response = conn.getresponse()
+            except (HTTPException, socket.error):
+                conn.close()
+                raise
+        elapsed = time.time() - start
+
+        with self.lock:
+            self.requests += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+        logging.debug("%s %s %d %.3fs", verb, path, response.status, elapsed)
+        return Response(response, conn, self.pool, stream)
+
+    def timing_summary(self):
+        with self.lock:
+            (requests, total_seconds, max_seconds) = (self.requests, self.total_seconds, self.max_seconds)
+        if not requests:
+            return "0 requests"
+        summary = "%d requests, %d connections, total %.3fs, mean %.3fs, max %.3fs" % (
+            requests, self.pool.opened, total_seconds, total_seconds / requests, max_seconds)
+        if self.cache is not None:
+            summary += ", cache %s" % self.cache.summary()
+        return summary
+
+
+# Clients are shared by everything in a run using the same endpoint and credentials.
+clients = {}
+clients_lock = threading.Lock()
+
+
+def get_client(endpoint, username=None, password=None, timeout=None, cache=None):
+    key = (endpoint, username, password, cache)
+    with clients_lock:
+        client = clients.get(key)
+        if client is None:
+            client = LdmClient(endpoint, username, password, timeout, cache)
+            clients[key] = client
+        return client
+
+
+def cache_for_config(config):
+    # The response cache is used if the config has a "cache_directory",
+    # "cache_ttl" and "cache_max_mb" are optional.
+    if not config.get('cache_directory'):
+        return None
+    return http_cache.get_cache(config['cache_directory'],
+                                config.get('cache_ttl', http_cache.DEFAULT_TTL),
+                                config.get('cache_max_mb', http_cache.DEFAULT_MAX_BYTES // (1024 * 1024)) * 1024 * 1024)
+
+
+def client_for_config(config):
+    # Config of format: {"api_endpoint" : "http://localhost:18080", "username" : "foo", "password" : "bar"}
+    return get_client(config['api_endpoint'], config.get('username'), config.get('password'),
+                      config.get('timeout'), cache_for_config(config))
+
+
+def log_timing_summaries():
+    # With --debug the scripts log the requests made by each client on exit.
+    with clients_lock:
+        for client in clients.values():
+            logging.debug("HTTP %s: %s", client.endpoint, client.timing_summary())
+
+
+atexit.register(log_timing_summaries)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# SMTP mailer shared by the scripts that send e-mail.
+#
+# A run opens one SMTP session, with one TLS handshake and login, on its first
+# message and sends every later message to every recipient through it; the
+# session is closed on exit. A message that fails with a transient error, a
+# 4xx reply or a dropped connection, is retried after an exponential backoff,
+# on a new session if the connection was lost. Each delivery is timed.
+
+import atexit
+import logging
+import smtplib
+import socket
+import threading
+import time
+from email.mime.text import MIMEText
+
+# Default attempts at a message after the first.
+DEFAULT_RETRIES = 3
+# Default seconds before the first retry, doubled for each retry after.
+DEFAULT_BACKOFF = 1.0
+# Default seconds to wait on the SMTP server.
+DEFAULT_TIMEOUT = 60
+
+
+class Mailer(object):
+    def __init__(self, config, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+        self.config = config
+        self.retries = retries
+        self.backoff = backoff
+        self.server = None
+        self.lock = threading.Lock()
+        self.sessions = 0
+        self.retried = 0
+        # Running totals of the messages delivered, the daemons send for as
+        # long as they run.
+        self.delivered = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _connect(self):
+        config = self.config
+        if config.get('smtp_ssl', False):
+            server = smtplib.SMTP_SSL(config['smtp_host'], config['smtp_port'],
+                                      timeout=config.get('smtp_timeout', DEFAULT_TIMEOUT))
+        else:
+            server = smtplib.SMTP(config['smtp_host'], config['smtp_port'],
+                                  timeout=config.get('smtp_timeout', DEFAULT_TIMEOUT))
+
+        if config.get('debug'):
+            server.set_debuglevel(1)
+
+        server.ehlo()
+
+        if config.get('smtp_starttls', False):
+            if server.has_extn('STARTTLS'):
+                server.starttls()
+                server.ehlo()
+            else:
+                logging.error("Start_TLS not supported:")
+                raise Exception("Start_TLS requested but not supported by server %r" % server)
+
+        if config.get('smtp_username', ''):
+            if server.has_extn('AUTH'):
+                logging.debug("authenticating to mailserver, user: %s, pass: XXXXXX ", config['smtp_username'])
+                server.login(config['smtp_username'], config['smtp_password'])
+            else:
+                logging.error("AUTH not supported:")
+
+        self.sessions += 1
+        return server
+
+    def _drop(self):
+        server, self.server = self.server, None
+        if server is not None:
+            try:
+                server.close()
+            except (smtplib.SMTPException, socket.error):
+                pass
+
+    def _sendmail(self, to_addr, message):
+        # Returns once message is sent, retrying transient failures.
+        attempt = 0
+        while True:
+            reused = self.server is not None
+            try:
+                if self.server is None:
+                    self.server = self._connect()
+                data_dict = self.server.sendmail(self.config['sender_address'], to_addr, message)
+                logging.debug("sendmail: %r", data_dict)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._drop()
+                if reused:
+                    # The server may have closed the idle session, retry at
+                    # once on a new session.
+                    continue
+                error = "disconnected"
+            # After a refusal smtplib resets the session, so it is kept.
+            except smtplib.SMTPResponseException as err:
+                if not 400 <= err.smtp_code < 500:
+                    raise
+                error = "%d %s" % (err.smtp_code, err.smtp_error)
+            except smtplib.SMTPRecipientsRefused as err:
+                if not all(400 <= code < 500 for (code, _) in err.recipients.values()):
+                    raise
+                error = "recipient refused %r" % err.recipients
+            except smtplib.SMTPException:
+                self._drop()
+                raise
+            except socket.error as err:
+                self._drop()
+                error = str(err)
+            if attempt >= self.retries:
+                raise smtplib.SMTPException("Failed to send to %s after %d attempts: %s" % (to_addr, attempt + 1, error))
+            delay = self.backoff * 2 ** attempt
+            logging.warning("Sending to %s failed, %s, retrying in %.1fs", to_addr, error, delay)
+            time.sleep(delay)
+            attempt += 1
+            self.retried += 1
+
+    def send(self, subject, body, to_addrs=None):
+        # Send a message with subject and body to each of to_addrs, by default
+        # the config's email_addresses, over the run's session.
+        config = self.config
+        if to_addrs is None:
+            to_addrs = config['email_addresses']
+        with self.lock:
+            for to_addr in to_addrs:
+                msg = MIMEText(body)
+                msg['From'] = config['sender_address']
+                msg['To'] = to_addr
+                msg['Subject'] = subject
+
+                start = time.time()
+                self._sendmail(to_addr, msg.as_string())
+                elapsed = time.time() - start
+                self.delivered += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+
+    def close(self):
+        with self.lock:
+            if self.server is None:
+                return
+            try:
+                (code, response) = self.server.quit()
+                logging.debug("quit: (%r) %r", code, response)
+            except (smtplib.SMTPException, socket.error):
+                pass
+            self.server = None
+
+    def delivery_summary(self):
+        with self.lock:
+            if not self.delivered:
+                return "0 messages"
+            return "%d messages, %d sessions, %d retries, total %.3fs, mean %.3fs, max %.3fs" % (
+                self.delivered, self.sessions, self.retried, self.total_seconds,
+                self.total_seconds / self.delivered, self.max_seconds)
+
+
+# Mailers are shared by everything in a run using the same SMTP server and login.
+mailers = {}
+mailers_lock = threading.Lock()
+
+
+def mailer_for_config(config):
+    # Config of format: {"smtp_host" : "smtp.gmail.com", "smtp_port" : 465, "smtp_username" : "foo",
+    # "smtp_password" : "bar", "smtp_ssl" : true, "sender_address" : ..., "email_addresses" : [...]},
+    # with optional "smtp_retries", "smtp_backoff" and "smtp_timeout".
+    key = (config['smtp_host'], config['smtp_port'], config.get('smtp_username'), config['sender_address'],
+           tuple(config['email_addresses']))
+    with mailers_lock:
+        mailer = mailers.get(key)
+        if mailer is None:
+            mailer = Mailer(config, config.get('smtp_retries', DEFAULT_RETRIES),
+                            config.get('smtp_backoff', DEFAULT_BACKOFF))
+            mailers[key] = mailer
+        return mailer
+
+
+def close_mailers():
+    # Close each run's session on exit, with --debug logging its deliveries.
+    with mailers_lock:
+        for mailer in mailers.values():
+            mailer.close()
+            logging.debug("SMTP %s: %s", mailer.config['smtp_host'], mailer.delivery_summary())
+
+
+atexit.register(close_mailers)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Fixed size history of numeric samples in a memory mapped file.
+#
+# The file holds a header and capacity records of doubles, a timestamp
+# followed by one value per field, written as a ring so the oldest record is
+# overwritten once the file is full. An append writes one record in place and
+# the records are in time order, so the records within a time window are found
+# by binary search rather than reading the whole history.
+
+import json
+import logging
+import mmap
+import os
+import struct
+
+MAGIC = b'LDMRING1'
+# Magic, capacity, field count, next slot, record count.
+HEADER = struct.Struct('<8sIIQQ')
+# The field names follow the header as JSON, records start after HEADER_SIZE.
+HEADER_SIZE = 4096
+DEFAULT_CAPACITY = 10080
+
+
+class RingHistory(object):
+    def __init__(self, path, fields, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.fields = list(fields)
+        self.capacity = capacity
+        self.record = struct.Struct('<%dd' % (len(self.fields) + 1))
+        size = HEADER_SIZE + capacity * self.record.size
+        if not self._compatible(size):
+            # A new history, or the fields or capacity have changed.
+            with open(path, 'wb') as f:
+                f.truncate(size)
+            self.file = open(path, 'r+b')
+            self.map = mmap.mmap(self.file.fileno(), size)
+            names = json.dumps(self.fields).encode('utf-8')
+            if HEADER.size + len(names) > HEADER_SIZE:
+                raise ValueError("Too many fields for a history: %d" % len(self.fields))
+            self.map[HEADER.size:HEADER.size + len(names)] = names
+            self._write_header(0, 0)
+        else:
+            self.file = open(path, 'r+b')
+            self.map = mmap.mmap(self.file.fileno(), size)
+        self.field_index = dict((field, index + 1) for index, field in enumerate(self.fields))
+
+    def _compatible(self, size):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) != size:
+            return False
+        with open(self.path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        magic, capacity, field_count, head, count = HEADER.unpack_from(header)
+        if magic == MAGIC and (capacity != self.capacity or field_count != len(self.fields)):
+            return False
+        try:
+            names = json.loads(header[HEADER.size:].rstrip(b'\0').decode('utf-8'))
+        except ValueError:
+            names = None
+        if magic != MAGIC or names is None or head >= capacity or count > capacity:
+            # Corrupt, for example torn by a crash, the history is started again.
+            logging.warning("History %s has an unreadable header, reinitialising it", self.path)
+            return False
+        return names == self.fields
+
+    def _write_header(self, head, count):
+        HEADER.pack_into(self.map, 0, MAGIC, self.capacity, len(self.fields), head, count)
+
+    def _header(self):
+        # Returns (next slot, record count).
+        return HEADER.unpack_from(self.map)[3:]
+
+    def __len__(self):
+        return self._header()[1]
+
+    def _get(self, i):
+        # The i'th oldest record.
+        head, count = self._header()
+        slot = (head - count + i) % self.capacity
+        return self.record.unpack_from(self.map, HEADER_SIZE + slot * self.record.size)
+
+    def append(self, timestamp, values):
+        # values maps field to value, a missing field is recorded as NaN.
+        head, count = self._header()
+        record = [float(timestamp)] + [float(values.get(field, float('nan'))) for field in self.fields]
+        self.record.pack_into(self.map, HEADER_SIZE + head * self.record.size, *record)
+        self._write_header((head + 1) % self.capacity, min(count + 1, self.capacity))
+
+    def latest(self):
+        count = len(self)
+        return self._get(count - 1) if count else None
+
+    def window(self, seconds, now=None):
+        # The records from the last seconds, oldest first. now defaults to the
+        # latest record's timestamp.
+        count = len(self)
+        if not count:
+            return []
+        if now is None:
+            now = self._get(count - 1)[0]
+        start = now - seconds
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._get(middle)[0] < start:
+                low = middle + 1
+            else:
+                high = middle
+        return [self._get(i) for i in range(low, count)]
+
+    def series(self, field, seconds, now=None):
+        # (timestamp, value) of field over the last seconds, NaN values skipped.
+        index = self.field_index[field]
+        return [(record[0], record[index]) for record in self.window(seconds, now)
+                if record[index] == record[index]]
+
+    def rate(self, field, seconds, now=None):
+        # Change in field per second over the window, None without two samples.
+        points = self.series(field, seconds, now)
+        if len(points) < 2 or points[-1][0] == points[0][0]:
+            return None
+        return (points[-1][1] - points[0][1]) / (points[-1][0] - points[0][0])
+
+    def moving_average(self, field, seconds, now=None):
+        points = self.series(field, seconds, now)
+        if not points:
+            return None
+        return sum(value for _, value in points) / len(points)
+
+    def slope(self, field, seconds, now=None):
+        # Least squares slope of field per second over the window.
+        return least_squares_slope(self.series(field, seconds, now))
+
+    def time_to_reach(self, field, limit, seconds, now=None):
+        # Seconds until field rises to limit at its slope over the window, None
+        # if it is not rising.
+        points = self.series(field, seconds, now)
+        slope = least_squares_slope(points)
+        if not slope or slope < 0:
+            return None
+        return max(0.0, (limit - points[-1][1]) / slope)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+def least_squares_slope(points):
+    # Slope of the line fitted to (x, y) points, None without two distinct x.
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
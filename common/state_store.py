@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Crash-safe store of a script's state between runs, such as the swp files.
+#
+# The state is a JSON object. The file holds a header line, with the format
+# and its version, followed by a snapshot of the state. Each update is
+# appended to a write ahead log beside it, path + '.wal', as a line of JSON,
+# so an update is one small append rather than a rewrite of the whole state.
+# Opening the store replays the log over the snapshot, cutting off a last
+# line torn by a crash. The log is compacted into a new snapshot, written to a
+# temporary file, synced and renamed over the old snapshot, once it holds
+# compact_every updates and when the store is closed, so a run ends with a
+# single sync of a single file. A file in an older format, such as a pickle,
+# is read by the legacy function and converted.
+
+import json
+import os
+import tempfile
+
+FORMAT = 'ldm-state'
+VERSION = 1
+# Default updates logged before the log is compacted.
+DEFAULT_COMPACT_EVERY = 1000
+
+
+def sync_directory(directory):
+    # Make a rename in directory durable, not possible on every platform.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class StateStore(object):
+    def __init__(self, path, defaults=None, legacy=None, compact_every=DEFAULT_COMPACT_EVERY):
+        self.path = path
+        self.wal_path = path + '.wal'
+        self.compact_every = compact_every
+        self.state = dict(defaults or {})
+        self.wal = None
+        # Updates in the log since the snapshot.
+        self.logged = 0
+        if os.path.exists(path) and not self._load():
+            if legacy is None:
+                raise ValueError("%s is not a %s file" % (path, FORMAT))
+            self.state.update(legacy(path))
+            self.compact()
+        self._replay()
+
+    def _load(self):
+        # Returns False if the file is not in this format.
+        with open(self.path, 'rb') as f:
+            try:
+                header = json.loads(f.readline().decode('utf-8'))
+            except ValueError:
+                return False
+            if not isinstance(header, dict) or header.get('format') != FORMAT:
+                return False
+            if header.get('version', 0) > VERSION:
+                raise ValueError("%s is version %s of %s, only up to version %d is supported" % (
+                    self.path, header.get('version'), FORMAT, VERSION))
+            self.state.update(json.loads(f.readline().decode('utf-8')))
+        return True
+
+    def _replay(self):
+        if not os.path.exists(self.wal_path):
+            return
+        # The end of the last whole line, a torn line after it is cut off so
+        # the next update is not appended to it.
+        good = 0
+        with open(self.wal_path, 'r+b') as f:
+            for line in iter(f.readline, b''):
+                if not line.endswith(b'\n'):
+                    # Torn by a crash part way through the append.
+                    break
+                try:
+                    self.state.update(json.loads(line.decode('utf-8')))
+                except ValueError:
+                    break
+                good += len(line)
+                self.logged += 1
+            if good < os.fstat(f.fileno()).st_size:
+                f.truncate(good)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def update(self, values=None, **kwargs):
+        # Apply values to the state and append them to the log. The append is
+        # written through to the operating system, sync makes it durable.
+        values = dict(values or {}, **kwargs)
+        self.state.update(values)
+        if self.wal is None:
+            self.wal = open(self.wal_path, 'ab')
+        self.wal.write(json.dumps(values, sort_keys=True, separators=(',', ':')).encode('utf-8') + b'\n')
+        self.wal.flush()
+        self.logged += 1
+        if self.logged >= self.compact_every:
+            self.compact()
+
+    def sync(self):
+        if self.wal is not None:
+            self.wal.flush()
+            os.fsync(self.wal.fileno())
+
+    def compact(self):
+        # Write the state as a new snapshot and start a new log.
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps({'format': FORMAT, 'version': VERSION}).encode('utf-8') + b'\n')
+                f.write(json.dumps(self.state, sort_keys=True, separators=(',', ':')).encode('utf-8') + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        sync_directory(directory)
+        # Replaying the old log over the new snapshot would change nothing, so
+        # a crash before it is removed is harmless.
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+        if os.path.exists(self.wal_path):
+            os.remove(self.wal_path)
+        self.logged = 0
+
+    def close(self):
+        if self.logged or not os.path.exists(self.path):
+            self.compact()
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright © Cirata 2024
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Convert a LiveData Migrator verification directory into partitioned Parquet.
+#
+# The verification-discrepancy.jsonl.gz file is converted once into a hive
+# partitioned Parquet dataset, partitioned by scanResult and the top level
+# directory of the path. ldm-delete and ldm-verification-delta read the
+# Parquet dataset in place of re-reading and decompressing the JSONL, and
+# filters on scanResult only touch the matching partition. A report without
+# discrepancies, from a clean verification, is converted to an empty
+# directory.
+#
+# Requires duckdb (pip install duckdb).
+
+from __future__ import print_function
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import time
+
+import duckdb
+
+DISCREPANCY_FILE = 'verification-discrepancy.jsonl.gz'
+PARQUET_DIRECTORY = 'verification-discrepancy.parquet'
+# Partition column added during conversion, holds the first path component.
+TOP_LEVEL_COLUMN = 'topLevelPath'
+MISSING_ON_SOURCE = 'MISSING_ON_SOURCE'
+
+
+def discrepancy_file(verification_directory):
+    return os.path.join(verification_directory, DISCREPANCY_FILE)
+
+
+def parquet_directory(verification_directory):
+    return os.path.join(verification_directory, PARQUET_DIRECTORY)
+
+
+def quote_literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def parquet_glob(verification_directory):
+    return quote_literal(os.path.join(parquet_directory(verification_directory), '**', '*.parquet'))
+
+
+def has_discrepancies(verification_directory):
+    # False if the report is empty or its records have no columns, only read
+    # up to the first discrepancy.
+    with gzip.open(discrepancy_file(verification_directory), 'rt') as f:
+        return any(json.loads(line) for line in f if line.strip())
+
+
+def is_empty_parquet(verification_directory):
+    return not os.listdir(parquet_directory(verification_directory))
+
+
+def has_parquet(verification_directory):
+    # The conversion is only usable if it is newer than the discrepancy file
+    # it was generated from, a re-run verification replaces the JSONL.
+    parquet = parquet_directory(verification_directory)
+    if not os.path.isdir(parquet):
+        return False
+    jsonl = discrepancy_file(verification_directory)
+    if os.path.exists(jsonl) and os.path.getmtime(jsonl) > os.path.getmtime(parquet):
+        return False
+    return True
+
+
+def convert(verification_directory, force=False):
+    # Returns the time taken in seconds, 0 if an up to date conversion exists.
+    if not force and has_parquet(verification_directory):
+        return 0
+
+    parquet = parquet_directory(verification_directory)
+    if os.path.isdir(parquet):
+        shutil.rmtree(parquet)
+
+    # Write into a temporary directory and rename so a failed conversion
+    # never leaves a partial dataset that looks complete.
+    tmp_parquet = parquet + '.tmp'
+    if os.path.isdir(tmp_parquet):
+        shutil.rmtree(tmp_parquet)
+
+    start = time.time()
+    if not has_discrepancies(verification_directory):
+        os.mkdir(tmp_parquet)
+        os.rename(tmp_parquet, parquet)
+        return time.time() - start
+    path = "coalesce(targetPath, sourcePath)"
+    duckdb.sql(
+        "COPY (SELECT *, coalesce(nullif(split_part(" + path + ", '/', 2), ''), '/') AS " + TOP_LEVEL_COLUMN +
+        " FROM read_ndjson_auto(" + quote_literal(discrepancy_file(verification_directory)) + "))" +
+        " TO " + quote_literal(tmp_parquet) +
+        " (FORMAT PARQUET, PARTITION_BY (scanResult, " + TOP_LEVEL_COLUMN + "))"
+    )
+    os.rename(tmp_parquet, parquet)
+    return time.time() - start
+
+
+def discrepancies(verification_directory):
+    # Relation over the converted discrepancies with the same columns as the
+    # JSONL report, the partition columns are restored from the directory names.
+    # Without an up to date conversion, for example as the directory could not
+    # be written to, the JSONL report is read instead, with scanResult moved
+    # last as in the conversion so the two can be compared. None if there are
+    # no discrepancies, there are no columns to read.
+    if not has_parquet(verification_directory):
+        if not has_discrepancies(verification_directory):
+            return None
+        return duckdb.sql(
+            "SELECT * EXCLUDE (scanResult), scanResult FROM read_ndjson_auto(" +
+            quote_literal(discrepancy_file(verification_directory)) + ")"
+        )
+    if is_empty_parquet(verification_directory):
+        return None
+    return duckdb.sql(
+        "SELECT * EXCLUDE (" + TOP_LEVEL_COLUMN + ") FROM read_parquet(" +
+        parquet_glob(verification_directory) + ", hive_partitioning = true)"
+    )
+
+
+def missing_on_source_paths(verification_directory):
+    # Only the scanResult=MISSING_ON_SOURCE partition is read.
+    if is_empty_parquet(verification_directory):
+        return []
+    rows = duckdb.sql(
+        "SELECT targetPath FROM read_parquet(" + parquet_glob(verification_directory) +
+        ", hive_partitioning = true) WHERE scanResult = " + quote_literal(MISSING_ON_SOURCE) +
+        " ORDER BY targetPath"
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert LiveData Migrator verification directories into partitioned Parquet."
+    )
+    parser.add_argument('--force', action='store_true', help='Convert even if an up to date conversion exists.')
+    parser.add_argument('directories', nargs='+', help='Verification directories to convert.')
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        if not os.path.isfile(discrepancy_file(directory)):
+            print("Verification discrepancy file %s does not exist." % (discrepancy_file(directory)))
+            return 1
+        try:
+            elapsed = convert(directory, args.force)
+        except (OSError, IOError, ValueError, duckdb.Error) as err:
+            print("Cannot convert %s: %s" % (directory, err))
+            return 1
+        if elapsed:
+            print("Converted %s in %.2fs" % (directory, elapsed))
+        else:
+            print("%s is up to date" % (parquet_directory(directory)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,20 +18,28 @@
 # limitations under the License.
 
 import argparse
-import base64
 import sys
 import json
 import datetime
+import functools
 import logging
 import os.path
+import sqlite3
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 
 if (2, 6) <= sys.version_info < (3, 0):
-    from httplib import HTTPConnection, HTTPSConnection
-    from urlparse import urlparse
-    from urllib import urlencode, quote
+    from httplib import HTTPConnection
+    from urllib import quote
 else:
-    from http.client import HTTPConnection, HTTPSConnection
-    from urllib.parse import urlparse, urlencode, quote
+    from http.client import HTTPConnection
+    from urllib.parse import quote
+
+# Shared LiveData Migrator modules live in ../common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import json_stream
+import ldm_client
 
 # A day in seconds.
 DAY = 24 * 60 * 60
@@ -42,6 +50,8 @@ DAY = 24 * 60 * 60
 NO_DAYS_TO_TRACK = 59
 # Default number of days to report
 DEFAULT_NO_DAYS_TO_REPORT = 29
+# Default number of migration stats to fetch at once.
+DEFAULT_CONCURRENCY = 8
 
 # Workaround for Python 2.7 not having datetime.timezone
 class UTC(datetime.tzinfo):
@@ -65,11 +75,9 @@ def urlencode_string(string):
 
 def yesterday_timestamp():
     # The first full day we can calculate usage for is yesterday, we work
-    # against epcoh time.
-    epoch = datetime.datetime(1970,1,1,tzinfo=utc)
-    today = datetime.date.today()
-    today_epoch = (datetime.datetime(today.year, today.month, today.day, tzinfo=utc)  - epoch).total_seconds()
-    return int(today_epoch) - DAY
+    # against epcoh time so the days are UTC days, whatever the local time zone.
+    today_epoch = int(time.time()) // DAY * DAY
+    return today_epoch - DAY
 
 
 def generate_days_epochs(args):
@@ -85,42 +93,40 @@ def timestamp_to_date(timestamp):
     return datetime.datetime.fromtimestamp(timestamp, utc).date()
 
 
-def get_stats_for_day(day, migration_stats):
-    # The list if migration_stats has the total amount of data migrated for a migration up to
-    # the timestamp. As we move through the series of migration_stats we are moving back in time.
-    # We move back through the stats until we find the first entry for the day we are interested in
-    # and use the total there as the value for data migrated up to that day. 
-    # Note some days will have no entry, this indicates no data was transferred for that day - so if
-    # we move past a day we use the next previous entry for that day.
-    day_end = day + DAY - 1;
-    for migration_stat in migration_stats:
-         timestamp = migration_stats_get_timestamp(migration_stat)
-         if timestamp > day_end:
-              # Have not found the day that matches this stats entry, continue to move back in time.
-              continue
-         if timestamp < day_end and timestamp >= day:
-              # Found the first stats entry in the list for the day - the last recorded
-              # value for that day.
-              # This can be used as the value for the day.
-              return migration_stats_get_bytes(migration_stat)
-         if timestamp < day:
-              # We have moved past the day we are interested in.
-              # No stats recoded for this day, no increase in the total migrated for this day
-              # over previous days. 
-              # We can use migration_stat value we have reached for this day, even though
-              # it is for a previous day - the total has not increased since then. 
-              # Essentially it is the latest entry before the day we are interested 
-              # in.
-              return migration_stats_get_bytes(migration_stat)  
-    return 0  
-
-def process_stats(days, migration_stats, args):
+def generate_day_labels(days):
+    # The date of each day as displayed, computed once and shared by all migrations.
+    return [str(timestamp_to_date(day)) for day in days]
+
+
+def process_stats(days, migration_stats, args, covered=None):
     # Generate a dict with which maps the day to the amount migrated up to that day.
     # The migration_stats are a serious of total amount of data transferred taken at
     # different times - this needs to be broken down into totals for days.
+    #
+    # The list of migration_stats has the total amount of data migrated for a migration up to
+    # the timestamp. As we move through the series of migration_stats we are moving back in time.
+    # For each day we use the first entry before the end of the day - the last recorded value
+    # for that day.
+    # Note some days will have no entry, this indicates no data was transferred for that day - so
+    # we use the latest entry before the day, the total has not increased since then.
+    # Days are visited moving back in time too, so migration_stats is only moved through
+    # once, all the daily totals are produced in a single pass.
+    # If covered is given the days with an entry in migration_stats are added to
+    # it, the others may be before the stats LiveData Migrator still holds.
     daily_totals = {}
-    for day in days:
-        daily_totals[day] = get_stats_for_day(day, migration_stats)
+    migration_stats = iter(migration_stats)
+    migration_stat = next(migration_stats, None)
+    for day in sorted(days, reverse=True):
+        day_end = day + DAY - 1
+        while migration_stat is not None and migration_stats_get_timestamp(migration_stat) >= day_end:
+            # Have not found the day that matches this stats entry, continue to move back in time.
+            migration_stat = next(migration_stats, None)
+        if migration_stat is not None:
+            daily_totals[day] = migration_stats_get_bytes(migration_stat)
+            if covered is not None:
+                covered.add(day)
+        else:
+            daily_totals[day] = 0
     return daily_totals
 
 
@@ -133,69 +139,148 @@ def migration_stats_get_bytes(migration_stats):
     return migration_stats['migrationStats']['successfulBytesMigrated']
 
 
-def get_http_connection(endpoint):
-    url = urlparse(endpoint)
-    if url.scheme == 'https':
-        return HTTPSConnection(url.netloc)
-    return HTTPConnection(url.netloc)
+def doHttp(verb, config, path, stream=False):
+    return ldm_client.client_for_config(config).request(verb, path, stream=stream)
 
 
-def build_auth_header(username, password):
-    credentials = ('%s:%s' % (username, password))
-    encoded_credentials = base64.b64encode(credentials.encode('ascii'))
-    return 'Basic %s' % encoded_credentials.decode("ascii")
+def get_migrations(config):
+    resp = doHttp("GET", config, "/migrations", stream=True)
+    if resp.status != 200:
+        raise ValueError(resp.status, resp.reason)
 
+    return json_stream.iter_items(resp)
 
-def doHttp(verb, config, path):
-    conn = get_http_connection(config['api_endpoint'])
-    headers = {}
-    if config['username']:
-        headers['Authorization'] = build_auth_header(config['username'], config['password'])
-    conn.request(verb, path, None, headers)
-    return conn.getresponse()
 
+class UsageLedger(object):
+    # Append only store of the finalised daily totals of each migration. A day's
+    # total never changes once the day is over, so it only has to be computed once.
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS daily_totals ("
+            "migration_id TEXT NOT NULL, day INTEGER NOT NULL, total INTEGER NOT NULL, "
+            "PRIMARY KEY (migration_id, day))")
+        self.connection.commit()
 
-def get_migrations(config):
-    resp = doHttp("GET", config, "/migrations")
-    if resp.status != 200:
-        raise ValueError(resp.status, resp.reason)
+    def totals(self, migration_id, first_day, last_day):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT day, total FROM daily_totals WHERE migration_id = ? AND day BETWEEN ? AND ?",
+                (migration_id, first_day, last_day)).fetchall()
+        return dict(rows)
+
+    def append(self, migration_id, daily_totals):
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO daily_totals (migration_id, day, total) VALUES (?, ?, ?)",
+                [(migration_id, day, total) for day, total in daily_totals.items()])
+            self.connection.commit()
 
-    return json.loads(resp.read())
+    def close(self):
+        self.connection.close()
 
 
 def daily_totals_to_usage(days, daily_totals, args):
     daily_usage = {}
     # To get the daily usage we subtract the total data migrated for previous day.
+    # Days beyond those LiveData Migrator tracks are only known if they are in the
+    # ledger, if not the usage is left blank.
     for day in range(0, args.days):
-        daily_usage[days[day]] = daily_totals[days[day]] - daily_totals[days[day + 1]]
+        if days[day] in daily_totals and days[day + 1] in daily_totals:
+            daily_usage[days[day]] = daily_totals[days[day]] - daily_totals[days[day + 1]]
+        else:
+            daily_usage[days[day]] = ''
     return daily_usage 
 
 
-def process_migration_stats(days, migration_id, migration_state, migration_stats, args):
-    daily_totals = process_stats(days, migration_stats, args)
+def process_migration_stats(days, labels, migration_id, migration_state, daily_totals, args):
     daily_usage = daily_totals_to_usage(days, daily_totals, args)
     stats_string = migration_id + ", " + migration_state + ", "
     if args.date:
-        for day in days:
-             if str(datetime.datetime.fromtimestamp(day, utc).date()) == args.date:
+        for day, label in zip(days, labels):
+             if label == args.date:
                  stats_string = stats_string + str(daily_usage[day])
                  break
         return stats_string 
 
-    for day in range(0, args.days):
-        stats_string = stats_string + str(daily_usage[days[day]]) + ", "
-    # Remove the last extra comma
-    return stats_string[:-2]
+    return stats_string + ", ".join([str(daily_usage[days[day]]) for day in range(0, args.days)])
     
 
 def get_migration_stats(days, migration_id, config):
     endpoint = "/stats/" + urlencode_string(migration_id)
-    resp = doHttp("GET", config, endpoint)
+    resp = doHttp("GET", config, endpoint, stream=True)
     if resp.status != 200:
         raise ValueError(resp.status, resp.reason)
-  
-    migration_stats_json = resp.read()
-    return json.loads(migration_stats_json)
+
+    # The stats are decoded as they are consumed.
+    try:
+        for migration_stat in json_stream.iter_items(resp):
+            yield migration_stat
+    finally:
+        # Read any stats not consumed so the connection can be reused.
+        resp.read()
+
+
+def ledger_totals(days, migration_id, ledger):
+    # Returns the daily totals already known and the days whose stats must be
+    # retrieved. LiveData Migrator only has stats for the last NO_DAYS_TO_TRACK + 1 days.
+    tracked_days = days[:NO_DAYS_TO_TRACK + 1]
+    if ledger is None:
+        return {}, tracked_days
+
+    # Only retrieve the stats if a day is not already in the ledger.
+    daily_totals = ledger.totals(migration_id, days[-1], days[0])
+    return daily_totals, [day for day in tracked_days if day not in daily_totals]
+
+
+def add_missing_totals(daily_totals, missing_days, migration_id, migration_stats, args, ledger):
+    covered = set()
+    missing_totals = process_stats(missing_days, migration_stats, args, covered)
+    if ledger is not None:
+        # Only the totals of days that are over and found in the stats are final.
+        now = time.time()
+        ledger.append(migration_id, dict((day, total) for day, total in missing_totals.items()
+                                         if day in covered and day + DAY <= now))
+    daily_totals.update(missing_totals)
+    return daily_totals
+
+
+def get_daily_totals(days, migration_id, config, args, ledger):
+    daily_totals, missing_days = ledger_totals(days, migration_id, ledger)
+    if missing_days:
+        migration_stats = get_migration_stats(days, migration_id, config)
+        add_missing_totals(daily_totals, missing_days, migration_id, migration_stats, args, ledger)
+    return daily_totals
+
+
+def migration_usage(days, labels, config, args, ledger, migration):
+    migration_id = migration['migrationId']
+    migration_state = migration['state']
+    daily_totals = get_daily_totals(days, migration_id, config, args, ledger)
+    return process_migration_stats(days, labels, migration_id, migration_state, daily_totals, args)
+
+
+def daily_usage_async(days, labels, config, args, ledger, migrations):
+    # The stats are fetched with asyncio, at most args.concurrency at once, and
+    # reduced to daily totals as each response arrives. Returns the rows in the
+    # order of the migrations.
+    import ldm_async_client
+    migrations = list(migrations)
+    known = [ledger_totals(days, migration['migrationId'], ledger) for migration in migrations]
+    fetched = [index for index, (daily_totals, missing_days) in enumerate(known) if missing_days]
+
+    def on_response(index, resp):
+        if resp.status != 200:
+            raise ValueError(resp.status, resp.reason)
+        migration_id = migrations[fetched[index]]['migrationId']
+        daily_totals, missing_days = known[fetched[index]]
+        add_missing_totals(daily_totals, missing_days, migration_id, json.loads(resp.read()), args, ledger)
+
+    requests = [("GET", "/stats/" + urlencode_string(migrations[index]['migrationId'])) for index in fetched]
+    ldm_async_client.request_all(config, requests, on_response, args.concurrency)
+    return [process_migration_stats(days, labels, migration['migrationId'], migration['state'], daily_totals, args)
+            for migration, (daily_totals, missing_days) in zip(migrations, known)]
 
 
 def daily_usage(config, args):
@@ -207,19 +292,37 @@ def daily_usage(config, args):
         migrations = filtered
   
     days = generate_days_epochs(args)
+    labels = generate_day_labels(days)
     # Create a header - we ignore the last day as we cannot create a usage for it, we only have the total
     # amount migrated up to that day.
-    header = "Migration, State, " + ", ".join([str(datetime.datetime.fromtimestamp(day, utc).date()) for day in days[:-1]])
+    header = "Migration, State, " + ", ".join(labels[:-1])
     if args.date:
         header = "Migration, State, " + args.date 
     print(header)
-    # For each migration retrieve its stats and print.
-    for migration in migrations:
-        migration_id = migration['migrationId']
-        migration_state = migration['state']
-        migration_stats = get_migration_stats(days, migration_id, config) 
-        stats_string = process_migration_stats(days, migration_id, migration_state, migration_stats, args)
-        print(stats_string)
+    # For each migration retrieve its stats and print. The stats are fetched
+    # concurrently over pooled connections, imap returns the rows in the order
+    # of the migrations.
+    ledger = None
+    if args.ledger:
+        ledger = UsageLedger(args.ledger)
+    if args.use_async:
+        try:
+            for stats_string in daily_usage_async(days, labels, config, args, ledger, migrations):
+                print(stats_string)
+        finally:
+            if ledger is not None:
+                ledger.close()
+        return
+    pool = ThreadPool(args.concurrency)
+    try:
+        fetch = functools.partial(migration_usage, days, labels, config, args, ledger)
+        for stats_string in pool.imap(fetch, migrations):
+            print(stats_string)
+    finally:
+        pool.close()
+        pool.join()
+        if ledger is not None:
+            ledger.close()
 
 
 def main():
@@ -230,8 +333,11 @@ def main():
     parser.add_argument('--config', action = 'store', required=True,  help='Configuration file of format: {"api_endpoint" : "http://localhost:18080", "username" : "foo", "password" : "bar"}')
     parser.add_argument('--migration', action = 'store',  help='Migration to retrieve daily usage for.')
     parser.add_argument('--debug', action='store_true', help='Enable HTTP Debug.')
-    parser.add_argument('--days', action='store', default=DEFAULT_NO_DAYS_TO_REPORT, type=int, help='Number of days to display, default is ' + str(DEFAULT_NO_DAYS_TO_REPORT) + '. Limited to ' + str(NO_DAYS_TO_TRACK), choices=range(1, NO_DAYS_TO_TRACK+1))
+    parser.add_argument('--days', action='store', default=DEFAULT_NO_DAYS_TO_REPORT, type=int, help='Number of days to display, default is ' + str(DEFAULT_NO_DAYS_TO_REPORT) + '. Limited to ' + str(NO_DAYS_TO_TRACK) + ' unless a ledger is used.')
     parser.add_argument('--date', action='store', help='Limit display to single date, must be in format 2021-11-24. If the date is not available then there will be a blank entry.')
+    parser.add_argument('--ledger', action='store', help='SQLite file to keep the daily totals in between runs. Days already in the ledger are not retrieved again and days older than ' + str(NO_DAYS_TO_TRACK) + ' can be displayed from it.')
+    parser.add_argument('--concurrency', action='store', default=DEFAULT_CONCURRENCY, type=int, help='Number of Migration stats to retrieve at once, default is ' + str(DEFAULT_CONCURRENCY) + '.')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Retrieve the Migration stats with asyncio rather than threads, python3 only.')
     args = parser.parse_args()
 
     if os.path.isfile(args.config):
@@ -246,6 +352,14 @@ def main():
         print("{0} does not exist.".format(args.config))
         sys.exit(1)
 
+    if args.days < 1 or (args.days > NO_DAYS_TO_TRACK and not args.ledger):
+        print("--days must be between 1 and {0}, or more if --ledger is used.".format(NO_DAYS_TO_TRACK))
+        sys.exit(1)
+
+    if args.concurrency < 1:
+        print("--concurrency must be at least 1.")
+        sys.exit(1)
+
     if args.debug:
         HTTPConnection.debuglevel = 1
         config['debug'] = True
@@ -30,46 +30,33 @@ import fnmatch
 
 
 if (2, 6) <= sys.version_info < (3, 0):
-    from httplib import HTTPConnection, HTTPSConnection
-    from urlparse import urlparse
+    from httplib import HTTPConnection
 else:
-    from http.client import HTTPConnection, HTTPSConnection
-    from urllib.parse import urlparse
+    from http.client import HTTPConnection
 
+# Shared LiveData Migrator modules live in ../common.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, "common")
+)
+import ldm_client
 
-# Logging format.
-LDM_DELETE_LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
-
+# Reading a Parquet converted verification report requires duckdb, fall
+# back to the JSONL report if it is not installed.
+try:
+    import verification_parquet
+except ImportError:
+    verification_parquet = None
 
-# Generata credentials for Authorization header.
-def build_auth_header(username, password):
-    credentials = "%s:%s" % (username, password)
-    encoded_credentials = base64.b64encode(credentials.encode("ascii"))
-    return "Basic %s" % encoded_credentials.decode("ascii")
 
-
-def get_http_connection(endpoint):
-    url = urlparse(endpoint)
-    if url.scheme == "https":
-        logging.debug("Making https connecting to %s" % url.netloc)
-        return HTTPSConnection(url.netloc)
-
-    logging.debug("Making http connecting to %s" % url.netloc)
-    return HTTPConnection(url.netloc)
+# Logging format.
+LDM_DELETE_LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
 
 
-def doHttp(verb, config, path):
-    conn = get_http_connection(config["api_endpoint"])
-    headers = {}
-    if config["username"]:
-        headers["Authorization"] = build_auth_header(
-            config["username"], config["password"]
-        )
+def doHttp(verb, config, path, body=None, headers=None):
     try:
-        conn.request(verb, path, None, headers)
+        return ldm_client.client_for_config(config).request(verb, path, body, headers)
     except:
         failedToConnect(config)
-    return conn.getresponse()
 
 
 def get_migration_info(config, migration_id):
@@ -172,6 +159,10 @@ def set_target_filesystem(path, config):
 
 def parse_verification(config):
     if config["args"].verification_directory is not None:
+        if verification_parquet is not None and verification_parquet.has_parquet(
+            config["args"].verification_directory
+        ):
+            return parse_verification_parquet(config["args"].verification_directory)
         file = (
             config["args"].verification_directory + "/verification-discrepancy.jsonl.gz"
         )
@@ -204,6 +195,18 @@ def parse_verification_report(file_path):
         return process_file(file)
 
 
+def parse_verification_parquet(directory):
+    logging.info(
+        "Using Parquet verification report %s"
+        % (verification_parquet.parquet_directory(directory))
+    )
+    missing_on_source_entries = verification_parquet.missing_on_source_paths(directory)
+    for path in missing_on_source_entries:
+        logging.debug("MISSING_ON_SOURCE %s" % (path))
+
+    return missing_on_source_entries
+
+
 def process_file(file):
     missing_on_source_entries = []
 
@@ -245,51 +248,69 @@ def quote_for_url(stuff):
         return urllib.parse.quote(stuff)
 
 
+def delete_url(path, config):
+    return (
+        "/fs/targets/"
+        + quote_for_url(config["args"].filesystem_name)
+        + "/deleteByPath?path="
+        + quote_for_url(path)
+    )
+
+
+def log_delete(status, count, total, path):
+    if status == 200:
+        logging.info("%d/%d, Deleted %s" % (count, total, path))
+    elif status == 404:
+        logging.info("%d/%d, Missing on Target %s" % (count, total, path))
+    else:
+        logging.error("%d/%d, Error deleting %s: %d" % (count, total, path, status))
+    return status
+
+
+def count_deletes(statuses):
+    deleted = statuses.count(200)
+    missing = statuses.count(404)
+    return deleted, missing, len(statuses) - deleted - missing
+
+
 def delete_missing_paths(filtered_paths, config):
     headers = {}
-    if config["username"]:
-        headers["Authorization"] = build_auth_header(
-            config["username"], config["password"]
-        )
     headers["Accept"] = "application/json"
     headers["Content-Type"] = "application/json"
     body = json.dumps({"recursive": "true"})
 
-    deleted = 0
-    missing = 0
-    failed = 0
+    if config["args"].use_async:
+        return delete_missing_paths_async(filtered_paths, config, body, headers)
+
+    statuses = []
     count = 0
     for path in filtered_paths:
-        conn = get_http_connection(config["api_endpoint"])
         count = count + 1
-        url = (
-            "/fs/targets/"
-            + quote_for_url(config["args"].filesystem_name)
-            + "/deleteByPath?path="
-            + quote_for_url(path)
+        status = doHttp("POST", config, delete_url(path, config), body, headers).status
+        statuses.append(log_delete(status, count, len(filtered_paths), path))
+
+    return count_deletes(statuses)
+
+
+def delete_missing_paths_async(filtered_paths, config, body, headers):
+    # The deletes are made with asyncio, at most --concurrency at once. Each
+    # path is logged with its position in filtered_paths as its delete completes.
+    import ldm_async_client
+
+    requests = [("POST", delete_url(path, config), body, headers) for path in filtered_paths]
+    try:
+        statuses = ldm_async_client.request_all(
+            config,
+            requests,
+            lambda index, resp: log_delete(
+                resp.status, index + 1, len(filtered_paths), filtered_paths[index]
+            ),
+            config["args"].concurrency,
         )
-        try:
-            conn.request("POST", url, body, headers)
-        except:
-            failedToConnect(config)
-
-        status = conn.getresponse().status
-        if status == 200:
-            logging.info("%d/%d, Deleted %s" % (count, len(filtered_paths), path))
-            deleted = deleted + 1
-        elif status == 404:
-            logging.info(
-                "%d/%d, Missing on Target %s" % (count, len(filtered_paths), path)
-            )
-            missing = missing + 1
-        else:
-            failed = failed + 1
-            logging.error(
-                "%d/%d, Error deleting %s: %d"
-                % (count, len(filtered_paths), path, status)
-            )
+    except (OSError, EOFError):
+        failedToConnect(config)
 
-    return deleted, missing, failed
+    return count_deletes(statuses)
 
 
 def args_check(args):
@@ -325,6 +346,10 @@ def args_check(args):
             )
             sys.exit(1)
 
+    if args.concurrency < 1:
+        logging.error("--concurrency must be at least 1.")
+        sys.exit(1)
+
     if args.exclusion_file is not None:
         if not os.path.isfile(args.exclusion_file):
             logging.error(
@@ -379,6 +404,19 @@ def main():
         action="store_true",
         help="List the paths that would be deleted on Target but do not delete them.",
     )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        default=False,
+        action="store_true",
+        help="Delete the paths concurrently with asyncio, python3 only.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Deletes in flight at once with --async, default 16.",
+    )
 
     args = parser.parse_args()
 
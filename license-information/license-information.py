@@ -18,53 +18,51 @@
 # limitations under the License.
 
 import argparse
-import base64
 import sys
 import json
 import datetime
+import functools
+import itertools
 import logging
 import os.path
+import sqlite3
+import threading
+import time
+
+from multiprocessing.pool import ThreadPool
 
 if (2, 6) <= sys.version_info < (3, 0):
-    from httplib import HTTPConnection, HTTPSConnection
-    from urlparse import urlparse
+    from httplib import HTTPConnection
 else:
-    from http.client import HTTPConnection, HTTPSConnection
-    from urllib.parse import urlparse
-
-
-def get_datetime_details_collected():
-    return datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    from http.client import HTTPConnection
 
+# Shared LiveData Migrator modules live in ../common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import ldm_client
 
-def get_http_connection(endpoint):
-    url = urlparse(endpoint)
-    if url.scheme == 'https':
-        return HTTPSConnection(url.netloc)
-    return HTTPConnection(url.netloc)
+# Default number of hosts queried at once.
+DEFAULT_CONCURRENCY = 8
+# Default seconds to wait on a host, so one unreachable host does not stall
+# the report.
+DEFAULT_TIMEOUT = 30
+# Default days of history the consumption rate is fitted over.
+DEFAULT_FORECAST_DAYS = 30
+SECONDS_PER_DAY = 86400
 
 
-def build_auth_header(username, password):
-    credentials = ('%s:%s' % (username, password))
-    encoded_credentials = base64.b64encode(credentials.encode('ascii'))
-    return 'Basic %s' % encoded_credentials.decode("ascii")
+def get_datetime_details_collected():
+    return datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
 
 
 def doHttp(verb, config, path):
-    conn = get_http_connection(config['api_endpoint'])
-    headers = {}
-    if config['username']:
-        headers['Authorization'] = build_auth_header(config['username'], config['password'])
     try:
-        conn.request(verb, path, None, headers)
-        response = conn.getresponse()
+        response = ldm_client.client_for_config(config).request(verb, path)
     except Exception as e:
         response = '{}'.format(e)
     return response
 
 
-def get_instance_uuid(host_config):
-    resp = doHttp("GET", host_config, "/info/nodeID")
+def instance_uuid(resp):
     if (not hasattr(resp, 'status')) or (resp.status != 200):
         response = 'Failed to get LM2 instance UUID'
     else:
@@ -73,8 +71,11 @@ def get_instance_uuid(host_config):
     return response
 
 
-def get_license_information(host_config):
-    resp = doHttp("GET", host_config, "/license")
+def get_instance_uuid(host_config):
+    return instance_uuid(doHttp("GET", host_config, "/info/nodeID"))
+
+
+def license_details(resp):
     if (not hasattr(resp, 'status')) or (resp.status != 200):
         response = {
             'components': [
@@ -86,6 +87,10 @@ def get_license_information(host_config):
     return response
 
 
+def get_license_information(host_config):
+    return license_details(doHttp("GET", host_config, "/license"))
+
+
 def create_output_header(args):
     header = ("Config Host ID,LM2 ID,License Type,Data Limit in Bytes,Data Used in Bytes,Data Remaining in Bytes,"
               "Expiry Date,Collection Time")
@@ -109,35 +114,135 @@ def create_row(node_uuid, ldm_license, component, collection_time):
 
 
 def write_output(args, header, rows):
-    print(header)
-    for row in rows:
-        print(row)
-    if args.filename:
-        with open(args.filename, 'w') as f:
-            f.write(header)
-            f.write('\n')
-            for row in rows:
-                f.write(row)
-                f.write('\n')
+    # Each row is written as it arrives, rows may be a generator.
+    out = open(args.filename, 'w') if args.filename else None
+    try:
+        for row in itertools.chain([header], rows):
+            print(row)
+            sys.stdout.flush()
+            if out:
+                out.write(row)
+                out.write('\n')
+    finally:
+        if out:
+            out.close()
 
 
-def license_information(config, args):
-    rows = []
-    header = create_output_header(args)
+class LicenseHistory(object):
+    # Append only store of the volume license usage of each host at each
+    # collection, from which the consumption rate of each host is forecast.
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS license_history ("
+            "host TEXT NOT NULL, license_type TEXT NOT NULL, collected INTEGER NOT NULL, "
+            "data_limit INTEGER NOT NULL, data_used INTEGER NOT NULL, data_remaining INTEGER NOT NULL, "
+            "expiry_date TEXT, PRIMARY KEY (host, license_type, collected))")
+        self.connection.commit()
 
-    for k, v in config.items():
-        host_config = v
-        node_uuid = get_instance_uuid(host_config)
-        collection_time = get_datetime_details_collected()
+    def append(self, host, ldm_license, collected):
+        # Only volume licenses have a limit to forecast.
+        samples = [(host, component['licenseType'], collected, component['migratedDataLimit'],
+                    component['migratedDataSize'], component['migratedDataRemaining'], ldm_license.get('expiryDate'))
+                   for component in ldm_license['components'] if 'migratedDataLimit' in component]
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO license_history "
+                "(host, license_type, collected, data_limit, data_used, data_remaining, expiry_date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", samples)
+            self.connection.commit()
+
+    def regressions(self, since):
+        # Least squares fit of data used against days since since, for every
+        # host and license type in one pass over the history. Returns rows of
+        # (host, license type, samples, sum x, sum y, sum x*x, sum x*y, latest
+        # collected, data remaining and expiry date at the latest collection).
+        with self.lock:
+            return self.connection.execute(
+                "SELECT host, license_type, COUNT(*), SUM(x), SUM(y), SUM(x * x), SUM(x * y), "
+                "MAX(collected), data_remaining, expiry_date FROM ("
+                "SELECT host, license_type, collected, data_remaining, expiry_date, "
+                "(collected - ?) / 86400.0 AS x, CAST(data_used AS REAL) AS y "
+                "FROM license_history WHERE collected >= ?) "
+                "GROUP BY host, license_type ORDER BY host, license_type", (since, since)).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+def create_forecast_header(args):
+    return ("Config Host ID,License Type,Samples,Bytes per Day,Data Remaining in Bytes,"
+            "Projected Exhaustion Date,Expiry Date")
+
+
+def forecast_rows(history, args):
+    # Consumption rate of each host over the last args.forecast_days days and
+    # when, at that rate, its remaining data runs out.
+    since = int(time.time()) - args.forecast_days * SECONDS_PER_DAY
+    for (host, license_type, n, sx, sy, sxx, sxy, latest, remaining, expiry_date) in history.regressions(since):
+        variance = n * sxx - sx * sx
+        rate = ''
+        exhaustion = ''
+        if n > 1 and variance > 0:
+            slope = (n * sxy - sx * sy) / variance
+            rate = int(slope)
+            if slope > 0:
+                exhausted = latest + remaining / slope * SECONDS_PER_DAY
+                exhaustion = datetime.datetime.fromtimestamp(exhausted).strftime("%Y-%m-%dT%H:%M:%S")
+        yield "{},{},{},{},{},{},{}".format(host, license_type, n, rate, remaining, exhaustion, expiry_date or '')
+
+
+def host_rows(args, history, host):
+    # The rows of a host, (alias, host config). Both requests are made over
+    # the same pooled connection, with the host's timeout, default
+    # args.timeout. The license is appended to history, if there is one.
+    (k, v) = host
+    host_config = dict(v)
+    host_config.setdefault('timeout', args.timeout)
+    resp = doHttp("GET", host_config, "/info/nodeID")
+    node_uuid = instance_uuid(resp)
+    collection_time = get_datetime_details_collected()
+    if hasattr(resp, 'status'):
         ldm_license = get_license_information(host_config)
-        for component in ldm_license['components']:
-            row_details = create_row(node_uuid, ldm_license, component, collection_time)
+    else:
+        # Unreachable, rather than wait out the timeout again on /license.
+        logging.warning("Failed to connect to %s: %s", k, resp)
+        ldm_license = license_details(resp)
+    if history is not None:
+        history.append(k, ldm_license, int(time.time()))
+    rows = []
+    for component in ldm_license['components']:
+        row_details = create_row(node_uuid, ldm_license, component, collection_time)
+
+        if row_details:
+            row_details = k + "," + row_details
+            rows.append(row_details)
+    return rows
 
-            if row_details:
-                row_details = k + "," + row_details
-                rows.append(row_details)
 
-    write_output(args, header, rows)
+def license_information(config, args):
+    # The hosts are queried concurrently, imap returns their rows in config
+    # order as soon as each host and those before it are done.
+    # With --forecast the hosts' licenses are appended to the history and the
+    # forecast from the history is output instead.
+    history = None
+    if args.history:
+        history = LicenseHistory(args.history)
+    pool = ThreadPool(max(1, min(args.concurrency, len(config))))
+    try:
+        rows = itertools.chain.from_iterable(pool.imap(functools.partial(host_rows, args, history), config.items()))
+        if args.forecast:
+            for _ in rows:
+                pass
+            write_output(args, create_forecast_header(args), forecast_rows(history, args))
+        else:
+            write_output(args, create_output_header(args), rows)
+    finally:
+        pool.close()
+        pool.join()
+        if history is not None:
+            history.close()
 
 
 def main():
@@ -148,8 +253,21 @@ def main():
     parser.add_argument('--config', action = 'store', required=True,  help='Configuration file of format: {"api_endpoint" : "http://localhost:18080", "username" : "foo", "password" : "bar"}')
     parser.add_argument('--filename', action='store', help='Output file name and location')
     parser.add_argument('--debug', action='store_true', help='Enable HTTP Debug.')
+    parser.add_argument('--concurrency', action='store', default=DEFAULT_CONCURRENCY, type=int, help='Number of hosts to query at once, default is ' + str(DEFAULT_CONCURRENCY) + '.')
+    parser.add_argument('--timeout', action='store', default=DEFAULT_TIMEOUT, type=float, help='Seconds to wait on a host that does not set its own timeout, default is ' + str(DEFAULT_TIMEOUT) + '.')
+    parser.add_argument('--history', action='store', help='File to append the volume license usage of each host to, a SQLite database created if it does not exist.')
+    parser.add_argument('--forecast', action='store_true', help='Output the consumption rate of each host and when its license runs out, from the history, rather than the license information.')
+    parser.add_argument('--forecast-days', action='store', default=DEFAULT_FORECAST_DAYS, type=int, help='Days of history to forecast from, default is ' + str(DEFAULT_FORECAST_DAYS) + '.')
     args = parser.parse_args()
 
+    if args.concurrency < 1:
+        print("--concurrency must be at least 1.")
+        sys.exit(1)
+
+    if args.forecast and not args.history:
+        print("--forecast needs a --history file.")
+        sys.exit(1)
+
     if os.path.isfile(args.config):
         with open(args.config, 'r') as f:
             try:
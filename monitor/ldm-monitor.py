@@ -18,34 +18,60 @@
 
 import argparse
 from datetime import datetime
-import base64
 import json
 import logging
 import os
 import re
 import pickle
+import signal
 import sys
-import smtplib
 import time
 
-from email.mime.text import MIMEText
+from multiprocessing.pool import ThreadPool
 
 if (2, 6) <= sys.version_info < (3, 0):
-    from httplib import HTTPConnection, HTTPSConnection
-    from urlparse import urlparse
-    from urllib import urlencode
+    from httplib import HTTPConnection
 else:
-    from http.client import HTTPConnection, HTTPSConnection
-    from urllib.parse import urlparse, urlencode
+    from http.client import HTTPConnection
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # python2 has it in the scandir package.
+        from scandir import scandir
+    except ImportError:
+        # Without the package, os.listdir and a stat of each entry.
+        class ListdirEntry(object):
+            def __init__(self, directory, name):
+                self.name = name
+                self.path = os.path.join(directory, name)
+
+            def is_dir(self):
+                return os.path.isdir(self.path)
+
+            def is_symlink(self):
+                return os.path.islink(self.path)
+
+        def scandir(path):
+            return [ListdirEntry(path, name) for name in os.listdir(path)]
+
+# Shared LiveData Migrator modules live in ../common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import ldm_client
+import ldm_mailer
+import ring_history
+import state_store
 
 class EmailInformer():
-    def __init__(self, config):
+    def __init__(self, config, store):
         self.config = config
+        self.store = store
 
     def send_message(self, warning_summary, diagnostic_summary, config, **kwargs):
         dt_string = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
         print("%s %s" % (dt_string, warning_summary))
-        store = MonitorStore(config['swp_file'])
+        store = self.store
         (_, _, last_email_timestamp) = store.get()
         epoch_time = int(time.time())
         if (epoch_time - last_email_timestamp) < config['periodBetweenEmail']:
@@ -53,53 +79,22 @@ class EmailInformer():
            return 
 
 
-        server = self._connect(config)
-
-        for to_addr in config['email_addresses']:
-            msg = MIMEText(diagnostic_summary)
-            msg['From'] = config['sender_address']
-            msg['To'] = to_addr
-            msg['Subject'] = warning_summary + ' ' + dt_string
-
-            data_dict = server.sendmail(config['sender_address'], to_addr, msg.as_string())
-            logging.debug("sendmail: %r", data_dict)
-
-        (code, response) = server.quit()
+        # With --daemon every email is sent over the same SMTP session.
+        ldm_mailer.mailer_for_config(config).send(warning_summary + ' ' + dt_string, diagnostic_summary)
         store.email_sent(int(time.time()))
-        logging.debug("quit: (%r) %r", code, response)
-
-    def _connect(self, config):
-        if config.get('smtp_ssl', False):
-            server = smtplib.SMTP_SSL(config['smtp_host'], config['smtp_port'])
-        else:
-            server = smtplib.SMTP(config['smtp_host'], config['smtp_port'])
-
-        if config.get('debug'):
-            server.set_debuglevel(1)
-
-        server.ehlo()
-
-        if config.get('smtp_starttls', False):
-            if server.has_extn('STARTTLS'):
-                server.starttls()
-                server.ehlo()
-            else:
-                logging.error("Start_TLS not supported:")
-                raise Exception("Start_TLS requested but not supported by server %r" % server)
-
-        if config.get('smtp_username', ''):
-            if server.has_extn('AUTH'):
-                logging.debug("authenticating to mailserver, user: %s, pass: XXXXXX ", config['smtp_username'])
-                server.login(config['smtp_username'], config['smtp_password'])
-            else:
-                logging.error("AUTH not supported:")
-
-        return server
                   
 class MonitorStore(object):
-    def __init__(self, path):
+    # With autosave every put is written to the swp file's log, otherwise only
+    # flush writes it. The log is compacted into the swp file on close.
+    def __init__(self, path, autosave=True):
         self.swp_file = path
-        (self.timestamp, self.diagnostic_summary, self.email_timestamp) = self._read()
+        self.autosave = autosave
+        self.dirty = False
+        self.state = state_store.StateStore(path, {'timestamp': 0, 'diagnostic_summary': None, 'email_timestamp': 0},
+                                            legacy=read_legacy_store)
+        self.timestamp = self.state.get('timestamp')
+        self.diagnostic_summary = self.state.get('diagnostic_summary')
+        self.email_timestamp = self.state.get('email_timestamp')
 
     def is_empty(self):
         return self.timestamp == 0
@@ -108,46 +103,36 @@ class MonitorStore(object):
         return (self.timestamp, self.diagnostic_summary, self.email_timestamp)
 
     def put(self, timestamp, diagnostic_summary):
-        with open(self.swp_file, "wb") as fp:   #Pickling
-            pickle.dump((timestamp, diagnostic_summary, self.email_timestamp), fp)
-
         self.timestamp = timestamp
         self.diagnostic_summary = diagnostic_summary
+        self.dirty = True
+        if self.autosave:
+            self.flush()
 
     def email_sent(self, email_timestamp):
+        # Always synced straight away so a restart does not send the email again.
         self.email_timestamp = email_timestamp
-        with open(self.swp_file, "wb") as fp:   #Pickling
-            pickle.dump((self.timestamp, self.diagnostic_summary, self.email_timestamp), fp)
-
+        self.flush()
+        self.state.sync()
 
-    def _read(self):
-        if os.path.exists(self.swp_file):
-            with open(self.swp_file, "rb") as fp:   # Unpickling
-                return pickle.load(fp)
-        else:
-            return (0, None, 0)
+    def flush(self):
+        self.state.update(timestamp=self.timestamp, diagnostic_summary=self.diagnostic_summary,
+                          email_timestamp=self.email_timestamp)
+        self.dirty = False
 
-def build_auth_header(username, password):
-    credentials = ('%s:%s' % (username, password))
-    encoded_credentials = base64.b64encode(credentials.encode('ascii'))
-    return 'Basic %s' % encoded_credentials.decode("ascii")
+    def close(self):
+        if self.dirty:
+            self.flush()
+        self.state.close()
 
-def get_http_connection(endpoint):
-    url = urlparse(endpoint)
-    if url.scheme == 'https':
-        print("making https connecting to %s" % url.netloc)
-        return HTTPSConnection(url.netloc)
-
-    print("making http connecting to %s" % url.netloc)
-    return HTTPConnection(url.netloc)
+def read_legacy_store(path):
+    # The state pickled by earlier versions.
+    with open(path, "rb") as fp:   # Unpickling
+        (timestamp, diagnostic_summary, email_timestamp) = pickle.load(fp)
+    return {'timestamp': timestamp, 'diagnostic_summary': diagnostic_summary, 'email_timestamp': email_timestamp}
 
 def doHttp(verb, config, path):
-    conn = get_http_connection(config['api_endpoint'])
-    headers = {}
-    if config['username']:
-        headers['Authorization'] = build_auth_header(config['username'], config['password'])
-    conn.request(verb, path, None, headers)
-    return conn.getresponse()
+    return ldm_client.client_for_config(config).request(verb, path)
 
 
 def get_diagnostic_summary(config):
@@ -168,6 +153,18 @@ def get_diagnostic_summary_txt(config):
     diagnostic_summary_txt = resp.read()
     return diagnostic_summary_txt.decode("utf-8") 
 
+def get_throughput_summary(config):
+    resp = doHttp("GET", config, "/stats/throughputSummary")
+    if resp.status != 200:
+        raise ValueError(resp.status, resp.reason)
+
+    return json.loads(resp.read())
+
+def throughput_rates(throughput_summary):
+    # Bytes and files migrated a second over the last minute.
+    bucket = throughput_summary['last60Secs']
+    return {'throughputBytes': bucket['totalBytes'] / 60.0, 'throughputFiles': bucket['totalFiles'] / 60.0}
+
 def get_disk_space_warnings(config):
     if not 'path_disk_space_check' in config:
        return []
@@ -189,87 +186,317 @@ def get_disk_space_warnings(config):
            warnings.append("High Disk Usage for [" + path + "], Usage: " + str(percentage_used) + "%. " + str(int(used/(2**30))) + "GiB/" + str(int(total/(2**30))) + "GiB")
     return warnings
 
-def check_for_tmp_log_files(config):
-    if not 'check_for_log_tmp_files' in config:
+# Default number of instances of a host map checked at once.
+DEFAULT_CONCURRENCY = 8
+# Default seconds to wait on an instance of a host map, so one unresponsive
+# instance does not hold up the email about the others.
+DEFAULT_INSTANCE_TIMEOUT = 30
+
+# Numeric /diagnostics/summary fields kept in the history.
+HISTORY_FIELDS = [
+    'actionStoreCurrent',
+    'actionStoreLargestMigration',
+    'pendingRegionCurrent',
+    'pendingRegionMaxMigration',
+    'retryCount',
+    'throughputBytes',
+    'throughputFiles',
+]
+# Default seconds of history a history alert is evaluated over.
+DEFAULT_HISTORY_WINDOW = 900
+# Default seconds ahead a predict_limit alert warns of reaching the limit.
+DEFAULT_PREDICTION_WITHIN = 1800
+
+# Defaults of the throughput_detector settings.
+THROUGHPUT_DETECTOR_DEFAULTS = {
+    # Weight of each new rate in the baseline.
+    'alpha': 0.1,
+    # Deviations below the baseline a rate must be to be a drop.
+    'threshold': 4,
+    # Fraction of the baseline a rate must also have dropped by.
+    'min_drop': 0.5,
+    # Checks to learn the baseline from before any drop is reported.
+    'warmup': 10,
+    # Consecutive dropped checks before warning.
+    'persistence': 3,
+    # Consecutive dropped checks after which the lower rate becomes the baseline.
+    'relearn': 60,
+}
+
+
+class DropDetector(object):
+    # Detects a sustained drop of a rate below its baseline. The baseline is
+    # an exponentially weighted moving average of the rate and its spread an
+    # exponentially weighted mean absolute deviation, a robust stand-in for the
+    # median absolute deviation that can be kept incrementally. Each update is
+    # constant time and the state is a few numbers.
+    def __init__(self, settings, state=None):
+        self.settings = settings
+        self.state = state or {'mean': 0.0, 'deviation': 0.0, 'count': 0, 'dropped': 0}
+
+    def update(self, rate):
+        # Returns True once rate has been a drop for persistence checks.
+        settings = self.settings
+        state = self.state
+        drop = (state['count'] >= settings['warmup'] and
+                rate < state['mean'] - settings['threshold'] * state['deviation'] and
+                rate < (1 - settings['min_drop']) * state['mean'])
+        if drop and state['dropped'] + 1 < settings['relearn']:
+            # A drop does not move the baseline, it would follow the drop down.
+            state['dropped'] += 1
+            return state['dropped'] >= settings['persistence']
+        if drop:
+            # The drop has lasted long enough to be the new normal.
+            state['mean'], state['deviation'], state['count'] = rate, 0.0, 0
+        state['dropped'] = 0
+        # The first rate is the baseline.
+        alpha = settings['alpha'] if state['count'] else 1.0
+        deviation = abs(rate - state['mean']) if state['count'] else 0.0
+        state['mean'] += alpha * (rate - state['mean'])
+        state['deviation'] += alpha * (deviation - state['deviation'])
+        state['count'] += 1
+        return False
+
+
+class ThroughputDetector(object):
+    # A DropDetector for each of the throughput rates, its state is kept in
+    # state_file between runs.
+    def __init__(self, config, state_file):
+        self.settings = dict(THROUGHPUT_DETECTOR_DEFAULTS)
+        self.settings.update(config['throughput_detector'])
+        self.state_file = state_file
+        state = {}
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                state = json.load(f)
+        self.detectors = dict((name, DropDetector(self.settings, state.get(name)))
+                              for name in ('throughputBytes', 'throughputFiles'))
+
+    def get_warnings(self, rates):
+        warnings = []
+        for name in sorted(self.detectors):
+            detector = self.detectors[name]
+            baseline = detector.state['mean']
+            if detector.update(rates[name]):
+                units = "MiB/s" if name == 'throughputBytes' else "files/s"
+                scale = 2 ** 20 if name == 'throughputBytes' else 1
+                warnings.append("Throughput Drop %s %.1f %s against a baseline of %.1f %s" % (
+                    name, rates[name] / scale, units, baseline / scale, units))
+        return warnings
+
+    def save(self):
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(dict((name, detector.state) for name, detector in self.detectors.items()), f)
+        os.rename(tmp_file, self.state_file)
+
+
+# File name checks made by the scan of the check_for_core_files and
+# check_for_log_tmp_files paths.
+TMP_LOG_FILE = re.compile('\.log[0-9]+\.tmp$')
+FILE_CHECKS = {
+    'core': lambda name: name.endswith(".hprof"),
+    'tmp_log': lambda name: TMP_LOG_FILE.search(name) is not None,
+}
+# A directory modified this many seconds before a scan may still change within
+# the resolution of its mtime, so its listing is not reused.
+MTIME_SETTLE_SECONDS = 2
+
+
+class FileScanner(object):
+    # Finds the files matching FILE_CHECKS under a set of paths in a single
+    # traversal. The listing of each directory is kept with its mtime, and in
+    # cache_file between runs, a directory whose mtime is unchanged has the
+    # same entries so is not listed again, only its subdirectories are checked.
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.directories = self._read()
+        self.dirty = False
+
+    def _read(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, "rb") as fp:   # Unpickling
+                checks, directories = pickle.load(fp)
+        except Exception as err:
+            print("Ignoring scan cache " + self.cache_file + ": " + str(err))
+            return {}
+        # The listings hold the matches of each check, so are only valid for the same checks.
+        return directories if checks == sorted(FILE_CHECKS) else {}
+
+    def save(self):
+        if not self.cache_file or not self.dirty:
+            return
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, "wb") as fp:   #Pickling
+            pickle.dump((sorted(FILE_CHECKS), self.directories), fp)
+        os.rename(tmp_file, self.cache_file)
+        self.dirty = False
+
+    def _list(self, path, mtime, scan_start):
+        try:
+            entries = list(scandir(path))
+        except OSError as err:
+            print("Error scanning " + path + ": " + str(err))
+            return None
+        subdirectories = []
+        matches = dict((check, []) for check in FILE_CHECKS)
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # As with os.walk, symbolic links to directories are not followed.
+                if not entry.is_symlink():
+                    subdirectories.append(entry.name)
+                continue
+            for check, match in FILE_CHECKS.items():
+                if match(entry.name):
+                    matches[check].append(entry.name)
+        if scan_start - mtime < MTIME_SETTLE_SECONDS:
+            mtime = None
+        return (mtime, subdirectories, matches)
+
+    def scan(self, paths):
+        # Returns a dict of check to the paths of the matching files, in the
+        # order os.walk would find them.
+        scan_start = time.time()
+        found = dict((check, []) for check in FILE_CHECKS)
+        directories = {}
+        listed = 0
+        # A path under another is covered by the scan of the outer path.
+        for root in sorted(set(os.path.normpath(path) for path in paths), key=len):
+            stack = [root]
+            while stack:
+                path = stack.pop()
+                if path in directories:
+                    continue
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                listing = self.directories.get(path)
+                if listing is None or listing[0] != mtime:
+                    listing = self._list(path, mtime, scan_start)
+                    if listing is None:
+                        continue
+                    listed += 1
+                    self.dirty = True
+                directories[path] = listing
+                for check, names in listing[2].items():
+                    found[check].extend(os.path.join(path, name) for name in names)
+                stack.extend(os.path.join(path, name) for name in reversed(listing[1]))
+        # Directories no longer found are forgotten.
+        if len(directories) != len(self.directories):
+            self.dirty = True
+        self.directories = directories
+        logging.debug("Scanned %d directories, listed %d, in %.3fs", len(directories), listed, time.time() - scan_start)
+        return found
+
+
+def files_under(files, path):
+    path = os.path.normpath(path)
+    prefix = path if path.endswith(os.sep) else path + os.sep
+    return [file for file in files if file.startswith(prefix)]
+
+
+def check_files(config, scanner):
+    # The check_for_core_files and check_for_log_tmp_files paths are scanned
+    # together, so a directory in both is only traversed once.
+    core_paths = config.get('check_for_core_files', [])
+    if not isinstance(core_paths, list):
+       core_paths = [core_paths]
+    tmp_log_paths = config.get('check_for_log_tmp_files', [])
+    if not core_paths and not tmp_log_paths:
        return []
 
-    
+    found = scanner.scan(core_paths + tmp_log_paths)
     warnings = []
-    for path in config['check_for_log_tmp_files']:
-       warnings.extend(check_for_log_tmp_files_under_path(path))
+    for path in core_paths:
+       hprof_files = files_under(found['core'], path)
+       if hprof_files:
+          warnings.append("Hprof files found under [" + path + "]: " + ','.join(hprof_files))
+    for path in tmp_log_paths:
+       tmp_log_files = files_under(found['tmp_log'], path)
+       if tmp_log_files:
+          warnings.append("tmp log files found under [" + path + "]: " + ','.join(tmp_log_files))
     return warnings
 
-def check_for_log_tmp_files_under_path(path):
-    tmp_log_files = []
-    warnings = []
-    reg_ex = re.compile('\.log[0-9]+\.tmp$')
-
-    try:
-       for root, dirs, files in os.walk(path):
-           for file in files:
-               m = reg_ex.search(file)
-               if m:
-                  tmp_log_files.append(os.path.join(root, file))
-    except Exception as err:
-       print("Error searching for tmp log files: " + str(err)) 
-       return warnings
-               
-    if tmp_log_files:
-       warnings.append("tmp log files found under [" + path + "]: " + ','.join(tmp_log_files))
-    return warnings
 
-def check_for_core_files(config):
-    if not 'check_for_core_files' in config:
-       return []
+def check_instance(config, state):
+    # The warnings from the LiveData Migrator of config, state is its InstanceState.
+    timeStamp = int(time.time())
+    diagnostic_summary = get_diagnostic_summary(config)
+    store = state.store
 
-    if not isinstance(config['check_for_core_files'], list):
-       return check_for_core_files_under_path(config['check_for_core_files'])
+    (old_time_stamp, old_diagnostic_summary, _) = store.get() 
+    store.put(timeStamp, diagnostic_summary)
+    samples = dict(diagnostic_summary)
+    rates = None
+    if state.throughput is not None:
+        rates = throughput_rates(get_throughput_summary(config))
+        samples.update(rates)
+    state.history.append(timeStamp, samples)
 
-    warnings = []
-    for path in config['check_for_core_files']:
-       warnings.extend(check_for_core_files_under_path(path))
+    warnings = get_warnings(config, diagnostic_summary, old_time_stamp, old_diagnostic_summary)
+    warnings.extend(get_history_warnings(config, state.history))
+    if rates is not None:
+        warnings.extend(state.throughput.get_warnings(rates))
     return warnings
 
-
-def check_for_core_files_under_path(path):
-    hprof_files = []
-    warnings = []
+def check_instances(config, state):
+    # Check every instance of the host map concurrently. Returns (name,
+    # warnings, summary text) for each instance in config order, the summary
+    # text only for an instance with warnings. An instance that cannot be
+    # checked is a warning rather than stopping the other checks.
+    def check(instance):
+        (name, instance_config, instance_state) = instance
+        try:
+            warnings = check_instance(instance_config, instance_state)
+            summary_txt = get_diagnostic_summary_txt(instance_config) if warnings else None
+        except Exception as err:
+            warnings = ["Check Failed: " + str(err)]
+            summary_txt = None
+        return (name, ["[" + name + "] " + warning for warning in warnings], summary_txt)
+
+    pool = ThreadPool(min(config.get('concurrency', DEFAULT_CONCURRENCY), max(1, len(state.instances))))
     try:
-       for root, dirs, files in os.walk(path):
-         for file in files:
-            if file.endswith(".hprof"): 
-               hprof_files.append(os.path.join(root, file))
-    except Exception as err:
-       print("Error searching for core files: " + str(err))
-       return warnings
-
-    if hprof_files:
-       warnings.append("Hprof files found under [" + path + "]: " + ','.join(hprof_files))
-    return warnings   
+        return pool.map(check, state.instances)
+    finally:
+        pool.close()
+        pool.join()
 
-
-def monitor(config):
-    timeStamp = int(time.time())
-    diagnostic_summary = get_diagnostic_summary(config)
-    
+def monitor(config, state):
     label = ""
     if 'e_mail_subject_label' in config:
         label = config['e_mail_subject_label'] + ' '
 
-    store = MonitorStore(config['swp_file'])
-    (old_time_stamp, old_diagnostic_summary, _) = store.get() 
-    store.put(timeStamp, diagnostic_summary)
-    email_action = EmailInformer(config)
-
-    warnings = get_warnings(config, diagnostic_summary, old_time_stamp, old_diagnostic_summary)
+    if 'instances' in config:
+        results = check_instances(config, state)
+        warnings = [warning for (_, instance_warnings, _) in results for warning in instance_warnings]
+    else:
+        (_, _, instance_state) = state.instances[0]
+        warnings = check_instance(config, instance_state)
     warnings.extend(get_disk_space_warnings(config))
-    warnings.extend(check_for_core_files(config))
-    warnings.extend(check_for_tmp_log_files(config))
+    warnings.extend(check_files(config, state.scanner))
     if len(warnings) > 0:
-        body = generate_message_text(config, warnings)
-        email_action.send_message(label + "WARN: " + warnings[0], body, config)
-
-def generate_message_text(config, warnings):
+        if 'instances' in config:
+            summaries = [(name, summary_txt) for (name, _, summary_txt) in results if summary_txt is not None]
+        else:
+            summaries = [(None, get_diagnostic_summary_txt(config))]
+        body = generate_message_text(warnings, summaries)
+        EmailInformer(config, state.store).send_message(label + "WARN: " + warnings[0], body, config)
+
+def generate_message_text(warnings, summaries):
+    # summaries are (instance name, summary text), the name is None without a
+    # host map.
+    sections = []
+    for (name, summary_txt) in summaries:
+        if name is not None:
+            summary_txt = "%s\n%s\n%s" % (name, "-" * len(name), summary_txt)
+        sections.append(summary_txt)
     return """
 Warnings
 =========
@@ -278,7 +505,7 @@ Warnings
 Summary
 ========
 %s
-""" % ("\n".join(warnings), get_diagnostic_summary_txt(config))
+""" % ("\n".join(warnings), "\n\n".join(sections))
 
 def get_warnings(config, diagnostic_summary, old_time_stamp, old_diagnostic_summary):
     warnings = []
@@ -306,6 +533,125 @@ def get_warnings(config, diagnostic_summary, old_time_stamp, old_diagnostic_summ
 
     return warnings
 
+# Per instance files, which default to the instance's swp_file rather than
+# being shared by every instance of a host map.
+INSTANCE_FILES = ('history_file', 'throughput_state_file')
+
+
+def instance_config(config, name):
+    # The config of an instance of the host map: the top level settings
+    # overridden by the instance's own, with the swp_file defaulting to the
+    # top level swp_file with .<name> appended.
+    instance = dict((key, value) for (key, value) in config.items()
+                    if key != 'instances' and key not in INSTANCE_FILES)
+    instance['swp_file'] = config['swp_file'] + '.' + name
+    instance.setdefault('timeout', DEFAULT_INSTANCE_TIMEOUT)
+    instance.update(config['instances'][name])
+    return instance
+
+class InstanceState(object):
+    # The state kept between checks of one LiveData Migrator: the last
+    # summary, the history of the summary and the throughput baseline.
+    def __init__(self, config, autosave=True):
+        self.store = MonitorStore(config['swp_file'], autosave)
+        self.history = ring_history.RingHistory(config.get('history_file', config['swp_file'] + '.history'),
+                                                HISTORY_FIELDS,
+                                                config.get('history_capacity', ring_history.DEFAULT_CAPACITY))
+        self.throughput = None
+        if 'throughput_detector' in config:
+            self.throughput = ThroughputDetector(config, config.get('throughput_state_file', config['swp_file'] + '.throughput'))
+
+    def persist(self):
+        if self.store.dirty:
+            self.store.flush()
+        if self.throughput is not None:
+            self.throughput.save()
+
+    def close(self):
+        self.persist()
+        self.store.close()
+        self.history.close()
+
+class MonitorState(object):
+    # The state kept between checks: the (name, config, InstanceState) of each
+    # instance, the directory listings of the file checks and the store holding
+    # when the last email was sent. Without a host map there is one instance,
+    # named None, whose store is also the email store.
+    def __init__(self, config, autosave=True):
+        self.scanner = FileScanner(config.get('scan_cache_file', config['swp_file'] + '.scan'))
+        if 'instances' in config:
+            self.instances = []
+            for name in config['instances']:
+                instance = instance_config(config, name)
+                self.instances.append((name, instance, InstanceState(instance, autosave)))
+            self.store = MonitorStore(config['swp_file'], autosave)
+        else:
+            self.instances = [(None, config, InstanceState(config, autosave))]
+            self.store = self.instances[0][2].store
+
+    def persist(self):
+        if self.store.dirty:
+            self.store.flush()
+        self.scanner.save()
+        for (_, _, instance_state) in self.instances:
+            instance_state.persist()
+
+    def close(self):
+        self.persist()
+        for (_, _, instance_state) in self.instances:
+            instance_state.close()
+        if self.store is not self.instances[0][2].store:
+            self.store.close()
+
+def run_daemon(config, args):
+    # Check every args.interval seconds, keeping the state in memory and the
+    # connection to LiveData Migrator open between checks. The state is only
+    # written to the swp file every args.persist_interval seconds and on exit.
+    state = MonitorState(config, autosave=False)
+    # Exit through the finally below on SIGTERM too.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    last_persist = time.time()
+    try:
+        while True:
+            start = time.time()
+            try:
+                monitor(config, state)
+            except Exception as err:
+                print("Monitor check failed: " + str(err))
+            logging.debug("Check took %.3fs", time.time() - start)
+            if time.time() - last_persist >= args.persist_interval:
+                state.persist()
+                last_persist = time.time()
+            time.sleep(max(0, args.interval - (time.time() - start)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state.close()
+
+def get_history_warnings(config, history):
+    # Alerts on the history of a summary field, each of the form
+    # {"field": "actionStoreCurrent", "window": 900, "rate_per_minute": 1000,
+    #  "average": 150000, "predict_limit": 200000, "within": 1800}
+    # with any of rate_per_minute, average and predict_limit.
+    warnings = []
+    for alert in config.get('history_alerts', []):
+        field = alert['field']
+        window = alert.get('window', DEFAULT_HISTORY_WINDOW)
+        if 'rate_per_minute' in alert:
+            rate = history.rate(field, window)
+            if rate is not None and alert['rate_per_minute'] <= rate * 60:
+                warnings.append("High %s Rate %.1f per minute over %d seconds" % (field, rate * 60, window))
+        if 'average' in alert:
+            average = history.moving_average(field, window)
+            if average is not None and alert['average'] <= average:
+                warnings.append("High %s Average %d over %d seconds" % (field, average, window))
+        if 'predict_limit' in alert:
+            # Already at the limit is left to the threshold checks.
+            remaining = history.time_to_reach(field, alert['predict_limit'], window)
+            if remaining and remaining <= alert.get('within', DEFAULT_PREDICTION_WITHIN):
+                warnings.append("%s Predicted To Reach %d In %d Minutes" % (field, alert['predict_limit'], remaining / 60))
+    return warnings
+
 def usage(text):
     print("usage: %s" % text)
     return sys.exit(1)
@@ -314,6 +660,9 @@ def main():
     parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument('--config', help='Configuration file for notifier.')
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--daemon', action='store_true', help='Keep running, checking every --interval seconds, rather than checking once.')
+    parser.add_argument('--interval', type=float, default=60, help='Seconds between checks with --daemon, default 60.')
+    parser.add_argument('--persist-interval', type=float, default=300, help='Seconds between writes of the swp file with --daemon, default 300.')
 
     args = parser.parse_args()
     print("ARGS", args)
@@ -330,7 +679,16 @@ def main():
         config['debug'] = True
         logging.basicConfig(level=logging.DEBUG)
 
-    return monitor(config)
+    if args.daemon:
+        if args.interval <= 0:
+            usage("--interval must be greater than 0")
+        return run_daemon(config, args)
+
+    state = MonitorState(config)
+    try:
+        return monitor(config, state)
+    finally:
+        state.close()
    
 if __name__ == "__main__":
     sys.exit(main())
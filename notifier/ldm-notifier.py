@@ -17,21 +17,30 @@
 # limitations under the License.
 
 import argparse
-import base64
+import collections
 import json
 import logging
 import os
 import pickle
-import smtplib
+import re
+import signal
 import sys
-from email.mime.text import MIMEText
+import threading
+import time
 
 if (2, 6) <= sys.version_info < (3, 0):
-    from httplib import HTTPConnection, HTTPSConnection
-    from urlparse import urlparse
+    from httplib import HTTPConnection
+    from Queue import Queue
 else:
-    from http.client import HTTPConnection, HTTPSConnection
-    from urllib.parse import urlparse
+    from http.client import HTTPConnection
+    from queue import Queue
+
+# Shared LiveData Migrator modules live in ../common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import json_stream
+import ldm_client
+import ldm_mailer
+import state_store
 
 
 class Notification(object):
@@ -58,53 +67,26 @@ class EmailInformer():
         self.config = config
 
     def send_message(self, body, subject, config, **kwargs):
-        server = self._connect(config)
-
-        for to_addr in config['email_addresses']:
-            msg = MIMEText(body)
-            msg['From'] = config['sender_address']
-            msg['To'] = to_addr
-            msg['Subject'] = subject
-
-            data_dict = server.sendmail(config['sender_address'], to_addr, msg.as_string())
-            logging.debug("sendmail: %r", data_dict)
-
-        (code, response) = server.quit()
-        logging.debug("quit: (%r) %r", code, response)
-
-    def _connect(self, config):
-        if config.get('smtp_ssl', False):
-            server = smtplib.SMTP_SSL(config['smtp_host'], config['smtp_port'])
-        else:
-            server = smtplib.SMTP(config['smtp_host'], config['smtp_port'])
-
-        if config.get('debug'):
-            server.set_debuglevel(1)
-
-        server.ehlo()
-
-        if config.get('smtp_starttls', False):
-            if server.has_extn('STARTTLS'):
-                server.starttls()
-                server.ehlo()
-            else:
-                logging.error("Start_TLS not supported:")
-                raise Exception("Start_TLS requested but not supported by server %r" % server)
-
-        if config.get('smtp_username', ''):
-            if server.has_extn('AUTH'):
-                logging.debug("authenticating to mailserver, user: %s, pass: XXXXXX ", config['smtp_username'])
-                server.login(config['smtp_username'], config['smtp_password'])
-            else:
-                logging.error("AUTH not supported:")
-
-        return server
+        # Every message of a run is sent over the same SMTP session.
+        ldm_mailer.mailer_for_config(config).send(subject, body)
 
 
 class NotifiedStore(object):
     def __init__(self, path):
         self.swp_file = path
-        (self.timestamp, self.etag, self.alive) = self._read()
+        # With --daemon the store is written by both the poll and the sender.
+        self.lock = threading.Lock()
+        # seen holds the ids of the Notifications sent with timestamp, so
+        # another Notification raised in the same millisecond is still sent.
+        # None if they are not known, from a swp file of an earlier version,
+        # then all the Notifications with timestamp were sent.
+        self.state = state_store.StateStore(path, {'timestamp': 0, 'etag': None, 'alive': None, 'seen': []},
+                                            legacy=read_legacy_store)
+        self.timestamp = self.state.get('timestamp')
+        self.etag = self.state.get('etag')
+        self.alive = self.state.get('alive')
+        seen = self.state.get('seen')
+        self.seen = frozenset(seen) if seen is not None else None
 
     def is_empty(self):
         return self.timestamp == 0
@@ -113,49 +95,63 @@ class NotifiedStore(object):
         return (self.timestamp, self.etag, self.alive)
 
     def down(self):
-        self._put(self.timestamp, self.etag, 'false')
-
-    def put(self, timestamp, etag):
-        self._put(timestamp, etag, 'true')
-
-    def _put(self, timestamp, etag, alive):
-        with open(self.swp_file, "wb") as fp:  # Pickling
-            pickle.dump((timestamp, etag, alive), fp)
+        with self.lock:
+            self._put(self.timestamp, self.etag, 'false', self.seen)
+
+    def up(self):
+        with self.lock:
+            self._put(self.timestamp, self.etag, 'true', self.seen)
+
+    def put(self, timestamp, etag, notification_id=None):
+        with self.lock:
+            seen = self.seen if timestamp == self.timestamp else frozenset()
+            if notification_id is not None and seen is not None:
+                seen = seen | frozenset([notification_id])
+            self._put(timestamp, etag, 'true', seen)
+
+    def put_all(self, notifications, etag):
+        # Record notifications, in time order, as sent with a single write.
+        timestamp = notifications[-1].timeStamp
+        with self.lock:
+            seen = self.seen if timestamp == self.timestamp else frozenset()
+            if seen is not None:
+                seen = seen | frozenset(n.id for n in notifications if n.timeStamp == timestamp)
+            self._put(timestamp, etag, 'true', seen)
+
+    def _put(self, timestamp, etag, alive, seen):
+        # Appended to the store's log, the run's updates are compacted into
+        # the swp file when it is closed.
+        self.state.update(timestamp=timestamp, etag=etag, alive=alive, seen=sorted(seen) if seen is not None else None)
 
         self.timestamp = timestamp
         self.etag = etag
         self.alive = alive
+        self.seen = seen
 
+    def close(self):
+        with self.lock:
+            self.state.close()
 
-    def _read(self):
-        if os.path.exists(self.swp_file):
-            with open(self.swp_file, "rb") as fp:  # Unpickling
-                stored = pickle.load(fp)
-                if len(stored) == 2:
-                    return (stored[0], stored[1], 'true')
-                return stored
-        else:
-            return (0, None, None)
-
-
-def build_auth_header(username, password):
-    credentials = ('%s:%s' % (username, password))
-    encoded_credentials = base64.b64encode(credentials.encode('ascii'))
-    return 'Basic %s' % encoded_credentials.decode("ascii")
 
+def read_legacy_store(path):
+    # The state pickled by earlier versions, with or without alive and seen.
+    # Without seen the ids sent are not known, only that the Notifications
+    # up to and including timestamp were sent.
+    with open(path, "rb") as fp:  # Unpickling
+        stored = pickle.load(fp)
+    if len(stored) == 2:
+        stored = stored + ('true',)
+    if len(stored) == 3:
+        stored = stored + (None,)
+    (timestamp, etag, alive, seen) = stored
+    return {'timestamp': timestamp, 'etag': etag, 'alive': alive, 'seen': sorted(seen) if seen is not None else None}
 
-def get_http_connection(endpoint):
-    url = urlparse(endpoint)
-    if url.scheme == 'https':
-        print("Making https connecting to %s" % url.netloc)
-        return HTTPSConnection(url.netloc)
 
-    print("Making http connecting to %s" % url.netloc)
-    return HTTPConnection(url.netloc)
+class ConnectionFailed(Exception):
+    pass
 
 
-def sendConnectionFailed(config):
-    store = NotifiedStore(config['swp_file'])
+def connectionFailed(config, store):
     (_, _, alive) = store.get()
     # If the system was down from previous call then skip
     # sending e-mail.
@@ -165,7 +161,194 @@ def sendConnectionFailed(config):
         msg_subject = 'WANDisco service unavailable, failed to connect to ' + config['api_endpoint']
         email_action = EmailInformer(config)
         email_action.send_message(msg_subject, msg_subject, config)
-        
+
+
+# Defaults of the suppression settings.
+SUPPRESSION_DEFAULTS = {
+    # More Notifications of a kind than this in a batch are sent as a summary.
+    'threshold': 1,
+    # Notifications of a kind included in full in a summary.
+    'exemplars': 3,
+    # Seconds after a summary of a kind during which the kind is only counted.
+    'window': 3600,
+    # Kinds remembered, the least recently seen is forgotten first.
+    'max_kinds': 1000,
+}
+
+LEVEL_PRIORITY = {'INFO': 0, 'WARN': 1, 'ERROR': 2}
+
+# The parts of a message that vary between Notifications of the same kind.
+MESSAGE_VARIABLES = [
+    (re.compile(r'\b[a-zA-Z][a-zA-Z0-9+.-]*://\S+'), '<uri>'),
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<id>'),
+    (re.compile(r'(?<![\w.])/[^\s,;\'"]*'), '<path>'),
+    (re.compile(r'\b\d+(\.\d+)?\b'), '<n>'),
+]
+
+
+def message_template(message):
+    for (pattern, placeholder) in MESSAGE_VARIABLES:
+        message = pattern.sub(placeholder, message)
+    return message
+
+
+class NotificationGroup(object):
+    # Notifications of the same type, level and message template. Only the
+    # count, the first few and the last are kept.
+    def __init__(self, template, exemplars):
+        self.template = template
+        self.count = 0
+        self.exemplars = []
+        self.max_exemplars = exemplars
+        self.last = None
+        # Notifications of the kind counted, not sent, since the last summary.
+        self.suppressed = 0
+
+    def add(self, notification):
+        self.count += 1
+        if len(self.exemplars) < self.max_exemplars:
+            self.exemplars.append(notification)
+        self.last = notification
+
+    def is_single(self):
+        return self.count == 1 and not self.suppressed
+
+    def is_trailing(self):
+        # Only a count of Notifications suppressed, after a flood has ended or
+        # the kind is forgotten.
+        return self.count == 0
+
+    def subject(self):
+        if self.is_single():
+            return self.last.level + ' ' + self.last.type + ' ' + self.last.dateCreated
+        if self.is_trailing():
+            return self.last.level + ' ' + self.last.type + ' x' + str(self.suppressed) + ' suppressed ' + self.last.dateCreated
+        return self.last.level + ' ' + self.last.type + ' x' + str(self.count) + ' ' + self.last.dateCreated
+
+    def body(self):
+        if self.is_single():
+            return self.last.as_json()
+        if self.is_trailing():
+            return "%d %s %s Notifications like:\n    %s\nwere suppressed since the last summary, the last %s\n\n%s\n" % (
+                self.suppressed, self.last.level, self.last.type, self.template, self.last.dateCreated, self.last.as_json())
+        first = self.exemplars[0]
+        body = "%d %s %s Notifications like:\n    %s\nfirst %s, last %s\n" % (
+            self.count, self.last.level, self.last.type, self.template, first.dateCreated, self.last.dateCreated)
+        if self.suppressed:
+            body += "%d more were suppressed since the last summary.\n" % self.suppressed
+        body += "\n" + "\n".join(n.as_json() for n in self.exemplars) + "\n"
+        if self.count > len(self.exemplars):
+            body += "... %d more\n" % (self.count - len(self.exemplars))
+        return body
+
+
+class Suppressor(object):
+    # Groups each batch of Notifications by type, level and message template,
+    # so a flood of near identical Notifications is sent as one summary with
+    # its count and a few exemplars. A kind that is summarised is then only
+    # counted for the suppression window, the count is reported in its next
+    # summary, or in a trailing summary once the window ends without one or
+    # the kind is forgotten. The kinds are kept in a bounded LRU, saved in
+    # state_file between runs.
+    def __init__(self, settings, state_file):
+        self.settings = dict(SUPPRESSION_DEFAULTS)
+        self.settings.update(settings)
+        self.state_file = state_file
+        # fingerprint -> [time of the last summary, count suppressed since,
+        # fields of the last Notification suppressed]
+        self.kinds = collections.OrderedDict()
+        # The kinds are saved whole, so each save is written as a snapshot.
+        self.state = state_store.StateStore(state_file, {'kinds': []}, legacy=read_legacy_kinds, compact_every=1)
+        for row in self.state.get('kinds'):
+            # Kinds saved by earlier versions have no last Notification.
+            (notification_type, level, template, last, suppressed) = row[:5]
+            self.kinds[(notification_type, level, template)] = [last, suppressed, row[5] if len(row) > 5 else None]
+
+    def _trailing(self, fingerprint, entry):
+        # A summary of the Notifications of a kind suppressed since its last
+        # summary.
+        (notification_type, level, template) = fingerprint
+        group = NotificationGroup(template, 0)
+        group.suppressed = entry[1]
+        if entry[2] is not None:
+            group.last = Notification(**entry[2])
+        else:
+            group.last = Notification(type=notification_type, level=level, message=template, dateCreated='')
+        return group
+
+    def expired(self, now):
+        # Trailing summaries of the kinds whose window has ended with
+        # Notifications suppressed, the kinds are forgotten so the next of
+        # each is sent straight away.
+        trailing = []
+        for (fingerprint, entry) in [item for item in self.kinds.items()]:
+            if entry[1] and now - entry[0] >= self.settings['window']:
+                del self.kinds[fingerprint]
+                trailing.append(self._trailing(fingerprint, entry))
+        return trailing
+
+    def group(self, notifications, now=None):
+        # Returns the groups of notifications to send, in the order of their
+        # first Notification, after the trailing summaries of kinds whose
+        # window has ended. Called with no notifications it only returns the
+        # trailing summaries.
+        if now is None:
+            now = time.time()
+        groups = collections.OrderedDict()
+        for notification in notifications:
+            template = message_template(notification.message or '')
+            fingerprint = (notification.type, notification.level, template)
+            group = groups.get(fingerprint)
+            if group is None:
+                group = groups[fingerprint] = NotificationGroup(template, self.settings['exemplars'])
+            group.add(notification)
+
+        to_send = self.expired(now)
+        for (fingerprint, group) in groups.items():
+            entry = self.kinds.pop(fingerprint, None)
+            if entry is not None and now - entry[0] < self.settings['window']:
+                entry[1] += group.count
+                entry[2] = dict(group.last.__dict__)
+            else:
+                group.suppressed = entry[1] if entry is not None else 0
+                to_send.append(group)
+                if group.count <= self.settings['threshold']:
+                    continue
+                # Flooding, only count the kind for the window.
+                entry = [now, 0, None]
+            self.kinds[fingerprint] = entry
+            while len(self.kinds) > self.settings['max_kinds']:
+                (forgotten, evicted) = self.kinds.popitem(last=False)
+                if evicted[1]:
+                    to_send.append(self._trailing(forgotten, evicted))
+        return to_send
+
+    def save(self):
+        self.state.update(kinds=[[notification_type, level, template, last, suppressed, notification]
+                                for ((notification_type, level, template), (last, suppressed, notification))
+                                in self.kinds.items()])
+
+
+def read_legacy_kinds(path):
+    # The kinds pickled by earlier versions.
+    with open(path, "rb") as fp:  # Unpickling
+        return {'kinds': [[notification_type, level, template, last, suppressed]
+                          for ((notification_type, level, template), (last, suppressed)) in pickle.load(fp)]}
+
+
+def suppressor_for_config(config):
+    # The Suppressor if the config has "suppression" settings, else None.
+    if 'suppression' not in config:
+        return None
+    return Suppressor(config['suppression'], config.get('suppression_file', config['swp_file'] + '.suppression'))
+
+
+def sendConnectionFailed(config):
+    store = NotifiedStore(config['swp_file'])
+    try:
+        connectionFailed(config, store)
+    finally:
+        store.close()
     sys.exit(1)
     
     
@@ -177,18 +360,17 @@ def failedToConnect(config):
     sendConnectionFailed(config)
 
 
-def doHttp(verb, config, path, etag):
-    conn = get_http_connection(config['api_endpoint'])
+def doHttp(verb, config, path, etag, stream=False):
     headers = {}
-    if config['username']:
-        headers['Authorization'] = build_auth_header(config['username'], config['password'])
     if etag is not None:
         headers['If-None-Match'] = etag
     try:
-        conn.request(verb, path, None, headers)
-    except:
+        return ldm_client.client_for_config(config).request(verb, path, None, headers, stream)
+    except Exception as err:
+        if config.get('daemon'):
+            # The daemon carries on polling.
+            raise ConnectionFailed(err)
         failedToConnect(config)
-    return conn.getresponse()
 
 
 def latest_notification(config):
@@ -200,20 +382,31 @@ def latest_notification(config):
     return Notification(**obj)
 
 
-def list_notifications(config, etag):
-    resp = doHttp("GET", config, "/notifications", etag)
+def list_notifications(config, etag, since=None, seen=frozenset()):
+    # The list is decoded as it arrives and only the Notifications after
+    # since, or at since but not in seen, become Notifications and are sorted.
+    # With seen None all the Notifications at since were sent.
+    # The list is in no particular order, so all of it is read.
+    resp = doHttp("GET", config, "/notifications", etag, stream=True)
     if resp.status == 304:
+        resp.read()
         return ([], etag)
     if resp.status != 200:
         raise ValueError(resp.status, resp.reason)
 
     etag = resp.getheader("Etag", None)
-    listJson = resp.read()
-    items = json.loads(listJson)
-
+    start = time.time()
+    decoded = 0
     notifications = []
-    for row in sorted(items, key=lambda x: x['timeStamp']):
+    for row in json_stream.iter_items(resp):
+        decoded += 1
+        if since is not None:
+            timestamp = int(row['timeStamp'])
+            if timestamp < int(since) or (timestamp == int(since) and (seen is None or row['id'] in seen)):
+                continue
         notifications.append(Notification(**row))
+    notifications.sort(key=lambda x: x.timeStamp)
+    logging.debug("Decoded %d notifications in %.3fs, %d new", decoded, time.time() - start, len(notifications))
 
     return (notifications, etag)
 
@@ -234,7 +427,7 @@ def notify_individual_email(store, etag, config, notifications_to_send):
     for notification in notifications_to_send:
         print("Notification: %s %s %s" % (notification.dateCreated, notification.level, notification.type))
         email_action.send_message(notification.as_json(), label + notification.level + ' ' + notification.type + ' ' + notification.dateCreated, config)
-        store.put(notification.timeStamp, etag)
+        store.put(notification.timeStamp, etag, notification.id)
 
 
 def notify_bulk_email(store, etag, config, notifications_to_send):
@@ -251,7 +444,7 @@ def notify_bulk_email(store, etag, config, notifications_to_send):
     for notification in notifications_to_send:
         print("Notification: %s %s %s" % (notification.dateCreated, notification.level, notification.type))
         message_body = message_body + notification.as_json()
-        store.put(notification.timeStamp, etag)
+        store.put(notification.timeStamp, etag, notification.id)
         if priority_notification.level == "INFO" and (notification.level == "WARN" or notification.level == "ERROR"):
            priority_notification = notification
         if priority_notification.level == "WARN" and notification.level == "ERROR":
@@ -262,24 +455,162 @@ def notify_bulk_email(store, etag, config, notifications_to_send):
 
 def notify(config):
     store = NotifiedStore(config['swp_file'])
-    if store.is_empty():
-        latest = latest_notification(config)
-        store.put(latest.timeStamp, None)
+    try:
+        if store.is_empty():
+            latest = latest_notification(config)
+            store.put(latest.timeStamp, None, latest.id)
+            return
+
+        (since, old_etag, _) = store.get()
+        (notifications, etag) = list_notifications(config, old_etag, since, store.seen)
+        notifications_to_send = filter_notifications(notifications, None, config)
+        send_notifications(store, etag, config, notifications_to_send, suppressor_for_config(config))
+    finally:
+        store.close()
+
+
+def notify_suppressed_email(store, etag, config, notifications_to_send, suppressor):
+    # Each group of near identical Notifications is sent as one e-mail, or
+    # with bulk all the groups are sent in one e-mail. Called with no
+    # notifications it sends the trailing summaries of floods that have ended.
+    groups = suppressor.group(notifications_to_send)
+    if not groups:
         return
 
-    (since, old_etag, _) = store.get()
-    (notifications, etag) = list_notifications(config, old_etag)
-    notifications_to_send = filter_notifications(notifications, since, config)
-    if 'bulk' in config and len(notifications_to_send) > 1:
+    label = ""
+    if 'e_mail_subject_label' in config:
+        label = config['e_mail_subject_label'] + ' '
+
+    email_action = EmailInformer(config)
+    for group in groups:
+        print("Notification: %s %s %s x%d" % (group.last.dateCreated, group.last.level, group.last.type,
+                                              group.count or group.suppressed))
+    if 'bulk' in config and len(groups) > 1:
+        priority_group = groups[0]
+        for group in groups:
+            if LEVEL_PRIORITY.get(group.last.level, 0) > LEVEL_PRIORITY.get(priority_group.last.level, 0):
+                priority_group = group
+        email_action.send_message("\n".join(group.body() for group in groups), label + priority_group.subject(), config)
+    else:
+        for group in groups:
+            email_action.send_message(group.body(), label + group.subject(), config)
+    if notifications_to_send:
+        store.put_all(notifications_to_send, etag)
+    suppressor.save()
+
+
+def send_notifications(store, etag, config, notifications_to_send, suppressor=None):
+    if suppressor is not None:
+       notify_suppressed_email(store, etag, config, notifications_to_send, suppressor)
+    elif 'bulk' in config and len(notifications_to_send) > 1:
        notify_bulk_email(store, etag, config, notifications_to_send)
     else:
        notify_individual_email(store, etag, config, notifications_to_send)
 
 
+class NotificationSender(object):
+    # Sends batches of notifications from a background thread, so a slow mail
+    # server does not hold up polling. The store is updated as each is sent.
+    def __init__(self, config, store):
+        self.config = config
+        self.store = store
+        self.suppressor = suppressor_for_config(config)
+        self.queue = Queue()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def send(self, etag, notifications):
+        self.queue.put((etag, notifications))
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            (etag, notifications) = batch
+            try:
+                send_notifications(self.store, etag, self.config, notifications, self.suppressor)
+            except Exception as err:
+                print("Failed to send notifications: " + str(err))
+
+    def close(self):
+        # Waits for the batches already queued to be sent.
+        self.queue.put(None)
+        self.thread.join()
+
+
+def run_daemon(config, args):
+    # Poll every args.interval seconds with the ETag of the previous poll, so
+    # an unchanged list costs a 304. New notifications are held for
+    # args.batch_window seconds from the first of them and sent together, from
+    # a background thread. The state is kept in memory, the swp file is only
+    # read at start up and its log compacted on exit.
+    config['daemon'] = True
+    store = NotifiedStore(config['swp_file'])
+    if store.is_empty():
+        latest = latest_notification(config)
+        store.put(latest.timeStamp, None, latest.id)
+    (since, etag, _) = store.get()
+    seen = store.seen
+    sender = NotificationSender(config, store)
+    # Exit through the finally below on SIGTERM too.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    pending = []
+    batch_start = None
+    next_poll = time.time()
+    next_expiry = next_poll
+    try:
+        while True:
+            if time.time() >= next_poll:
+                next_poll = time.time() + args.interval
+                try:
+                    (notifications, etag) = list_notifications(config, etag, since, seen)
+                    if store.alive != 'true':
+                        store.up()
+                except ConnectionFailed as err:
+                    print("Failed to connect to %s: %s" % (config['api_endpoint'], err))
+                    connectionFailed(config, store)
+                    notifications = []
+                except Exception as err:
+                    print("Poll failed: " + str(err))
+                    notifications = []
+                if notifications:
+                    latest = notifications[-1].timeStamp
+                    if latest != since:
+                        seen = frozenset()
+                    since = latest
+                    if seen is not None:
+                        seen = seen | frozenset(n.id for n in notifications if n.timeStamp == since)
+                    new = filter_notifications(notifications, None, config)
+                    if new and not pending:
+                        batch_start = time.time()
+                    pending.extend(new)
+            if pending and time.time() >= batch_start + args.batch_window:
+                sender.send(etag, pending)
+                pending = []
+            elif sender.suppressor is not None and not pending and time.time() >= next_expiry:
+                # Report the floods that have ended with nothing new.
+                next_expiry = time.time() + args.interval
+                sender.send(etag, [])
+            wake = next_poll
+            if pending:
+                wake = min(next_poll, batch_start + args.batch_window)
+            time.sleep(max(0, wake - time.time()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pending:
+            sender.send(etag, pending)
+        sender.close()
+        store.close()
+
+
 def filter_notifications(notifications, since, config):
+    # since is None if the Notifications are already those after since.
     filtered = []
     for notification in notifications:
-        if int(notification.timeStamp) <= int(since):
+        if since is not None and int(notification.timeStamp) <= int(since):
             continue
         if notification.type in config['filter_on_type']:
             continue
@@ -307,6 +638,9 @@ def main():
 
     # parser for the "notify" command                                                                     
     parser_notify = subparsers.add_parser('notify')
+    parser_notify.add_argument('--daemon', action='store_true', help='Keep running, polling every --interval seconds, rather than polling once.')
+    parser_notify.add_argument('--interval', type=float, default=60, help='Seconds between polls with --daemon, default 60.')
+    parser_notify.add_argument('--batch-window', type=float, default=0, help='Seconds to hold new Notifications with --daemon so they are sent together, default 0.')
 
     # parse the args and call whatever function was selected                                                      
     args = parser.parse_args()
@@ -332,6 +666,10 @@ def main():
         return list(config)
     elif args.command == 'notify':
         config['command'] = 'notify'
+        if args.daemon:
+            if args.interval <= 0:
+                usage("--interval must be greater than 0")
+            return run_daemon(config, args)
         return notify(config)
     else:
         usage("ldm-notifier [list | notify] [args ...]")
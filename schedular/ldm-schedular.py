@@ -17,24 +17,37 @@
 # limitations under the License.
 
 import argparse
-import base64
 import datetime
+import heapq
 import json
+import logging
+import os
+import signal
 import sys
+import time
 
 if (2, 6) <= sys.version_info < (3, 0):
-    from httplib import HTTPConnection, HTTPSConnection
-    from urlparse import urlparse
+    from httplib import HTTPConnection
 else:
-    from http.client import HTTPConnection, HTTPSConnection
-    from urllib.parse import urlparse
+    from http.client import HTTPConnection
+
+# Shared LiveData Migrator modules live in ../common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import http_cache
+import json_stream
+import ldm_client
 
 API_ENDPOINT = "http://localhost:18080"
 
-HEADERS = {}
+CLIENT = None
 QUEUED_STATE = 'NONSCHEDULED'
 RUNNING_STATES = ['RUNNING', 'SCHEDULED']
 COMPLETED_STATES = ['LIVE', 'COMPLETED']
+# Seconds a migration the daemon started is counted as running while
+# /migrations still shows it queued.
+START_GRACE = 300
+# Seconds of /stats/throughputSummary used as the current throughput.
+THROUGHPUT_BUCKET = ('last60Secs', 60.0)
 
 
 class Migration(object):
@@ -49,41 +62,29 @@ class Migration(object):
         return "Migration(" + str(self.__dict__) + ")"
 
 
-def build_auth_header(username, password):
-    credentials = ('%s:%s' % (username, password))
-    encoded_credentials = base64.b64encode(credentials.encode('ascii'))
-    return 'Basic %s' % encoded_credentials.decode("ascii")
-
-
-def get_http_connection(endpoint):
-    url = urlparse(endpoint)
-    if url.scheme == 'https':
-        print("making https connecting to %s" % url.netloc)
-        return HTTPSConnection(url.netloc)
+def doHttp(verb, path, stream=False, headers=None):
+    return CLIENT.request(verb, path, None, headers, stream)
 
-    print("making http connecting to %s" % url.netloc)
-    return HTTPConnection(url.netloc)
 
-
-def doHttp(verb, path):
-    conn = get_http_connection(API_ENDPOINT)
-    conn.request(verb, path, None, HEADERS)
-    return conn.getresponse()
+def list_migrations():
+    (migrations, _) = poll_migrations(None)
+    return migrations
 
 
-def list_migrations():
-    resp = doHttp("GET", "/migrations")
+def poll_migrations(etag):
+    # Returns (migrations, etag), migrations is None if the list is unchanged
+    # since etag.
+    headers = {'If-None-Match': etag} if etag else None
+    resp = doHttp("GET", "/migrations", stream=True, headers=headers)
+    if resp.status == 304:
+        resp.read()
+        return (None, etag)
     if resp.status != 200:
         raise ValueError(resp.status, resp.reason)
 
-    listJson = resp.read()
-    items = json.loads(listJson)
-
-    migrations = []
-    for row in sorted(items, key=lambda x: x['migrationStartTime']):
-        migrations.append(Migration(**row))
-
-    return migrations
+    # Decode the migrations one at a time rather than holding the whole response.
+    migrations = [Migration(**row) for row in json_stream.iter_items(resp)]
+    return (sorted(migrations, key=lambda x: x.migrationStartTime), resp.getheader("ETag", None))
 
 
 def start_migration(mig):
@@ -94,31 +95,156 @@ def start_migration(mig):
         raise ValueError(resp.status, resp.reason)
 
 
-def priority_for_path(path, priorities, fallback):
-    try:
-        return priorities.index(path)
-    except ValueError:
-        return fallback
+class PriorityIndex(object):
+    # The priority list compiled for lookup: a dict of the listed paths and a
+    # trie of their components. A path's priority is its line in the list,
+    # or that of its nearest listed ancestor, found in one walk down the trie
+    # of at most the path's depth. A path with no listed ancestor gets the
+    # fallback priority, after every listed path.
+    def __init__(self, paths):
+        self.paths = paths
+        self.fallback = len(paths) + 1
+        self.exact = {}
+        # Each node is a dict of component -> node, with the priority of the
+        # path ending at the node under the key None.
+        self.trie = {}
+        for priority, path in enumerate(paths):
+            if not path:
+                continue
+            # The first of a repeated path counts.
+            self.exact.setdefault(path, priority)
+            node = self.trie
+            for component in path_components(path):
+                node = node.setdefault(component, {})
+            node.setdefault(None, priority)
+
+    def priority(self, path):
+        priority = self.exact.get(path)
+        if priority is not None:
+            return priority
+        node = self.trie
+        priority = node.get(None, self.fallback)
+        for component in path_components(path or ''):
+            node = node.get(component)
+            if node is None:
+                break
+            priority = node.get(None, priority)
+        return priority
+
+
+def path_components(path):
+    return [component for component in path.split('/') if component]
+
+
+def sort_key_for_migration(mig, priorities):
+    # derive a sorting key based on the priority and then the
+    # migrationStartTime so we can process these in the desired
+    # order
+    priority = priorities.priority(mig.path)
+    # print("path %s has priority %d" % (mig.path, priority))
+    return (priority, mig.migrationStartTime)
+
+
+class SchedulingStats(object):
+    # What the size and bandwidth aware policies know of LiveData Migrator:
+    # the bytes left to migrate of each migration, by internalId, and the
+    # bytes per second migrated lately.
+    def __init__(self, remaining=None, throughput=None):
+        self.remaining = remaining or {}
+        self.throughput = throughput
+
+    def size(self, mig):
+        # None if LiveData Migrator does not know the size yet.
+        return self.remaining.get(mig.internalId)
+
+
+def get_scheduling_stats():
+    resp = doHttp("GET", "/stats/migrationSummary", stream=True)
+    if resp.status != 200:
+        raise ValueError(resp.status, resp.reason)
+    remaining = {}
+    # Decode member by member rather than holding the whole response.
+    for category, value in json_stream.iter_members(resp):
+        if not isinstance(value, dict):
+            continue
+        for row in value.get('migrations') or []:
+            progress = row.get('progress') or {}
+            if progress.get('totalBytes'):
+                remaining[row['internalId']] = max(0, progress['totalBytes'] - (progress.get('totalMigratedBytes') or 0))
+
+    resp = doHttp("GET", "/stats/throughputSummary")
+    if resp.status != 200:
+        raise ValueError(resp.status, resp.reason)
+    (bucket, seconds) = THROUGHPUT_BUCKET
+    throughput = json.loads(resp.read()).get(bucket, {}).get('totalBytes')
+    return SchedulingStats(remaining, throughput / seconds if throughput is not None else None)
+
+
+class CountPolicy(object):
+    # Keeps howmany migrations running, starting them in priority order and
+    # then by migrationStartTime.
+    name = 'count'
+    needs_stats = False
+
+    def __init__(self, args):
+        self.howmany = args.howmany
 
+    def sort_key(self, mig, priorities, stats):
+        return sort_key_for_migration(mig, priorities)
 
-def scheduler(require_n_running, priorities):
+    def slots(self, running, stats):
+        # The number of migrations to start with running running.
+        return max(0, self.howmany - running)
+
+
+class ShortestFirstPolicy(CountPolicy):
+    # Keeps howmany migrations running, starting the one with the fewest bytes
+    # left to migrate first within a priority, so a few large migrations do
+    # not hold up the small ones. Migrations of unknown size go last.
+    name = 'shortest'
+    needs_stats = True
+
+    def sort_key(self, mig, priorities, stats):
+        (priority, start_time) = sort_key_for_migration(mig, priorities)
+        size = stats.size(mig)
+        return (priority, size is None, size or 0, start_time)
+
+
+class BandwidthPolicy(ShortestFirstPolicy):
+    # Starts migrations shortest first and keeps at least howmany running.
+    # While the throughput is below target_bandwidth it starts more, up to
+    # max_running, each expected to add the throughput of an average running
+    # migration, so many small migrations do not leave the link idle.
+    name = 'bandwidth'
+
+    def __init__(self, args):
+        ShortestFirstPolicy.__init__(self, args)
+        self.target = args.target_bandwidth * 1000000
+        self.max_running = args.max_running or 4 * args.howmany
+
+    def slots(self, running, stats):
+        slots = max(0, self.howmany - running)
+        if not running or not stats.throughput:
+            return slots
+        per_migration = stats.throughput / running
+        wanted = int((self.target - stats.throughput) / per_migration)
+        return max(slots, min(wanted, self.max_running - running))
+
+
+POLICIES = dict((policy.name, policy) for policy in (CountPolicy, ShortestFirstPolicy, BandwidthPolicy))
+
+
+def scheduler(policy, priorities):
     running_count = 0
     completed_count = 0
     candidate_to_run = []
 
     migrations = list_migrations()
-    default_priority = len(priorities) + 1
+    stats = get_scheduling_stats() if policy.needs_stats else SchedulingStats()
 
     for mig in migrations:
         if mig.state == QUEUED_STATE:
-            priority = priority_for_path(mig.path, priorities, default_priority)
-            # print("path %s has priority %d" % (mig.path, priority))
-
-            # derive a sorting key based on the priority and then the
-            # migrationStartTime so we can process these in the desired
-            # order
-            sort_key = (priority, mig.migrationStartTime)
-            candidate_to_run.append((sort_key, mig))
+            candidate_to_run.append((policy.sort_key(mig, priorities, stats), mig))
         elif mig.state in RUNNING_STATES:
             running_count += 1
         elif mig.state in COMPLETED_STATES:
@@ -131,15 +257,14 @@ def scheduler(require_n_running, priorities):
     print(" running:    %d" % running_count)
     print(" completed:  %d" % completed_count)
     print(" queued:     %d" % len(candidate_to_run))
-    print(" priorities: %r" % priorities)
+    print(" priorities: %r" % priorities.paths)
+    print(" policy:     %s" % policy.name)
     print("==================================================")
 
-    will_start = []
-    if running_count < require_n_running:
-        n_to_start = min(require_n_running - running_count, len(candidate_to_run))
-        will_start = [m for _, m in sorted(candidate_to_run)[:n_to_start]]
+    n_to_start = min(policy.slots(running_count, stats), len(candidate_to_run))
+    will_start = [m for _, m in sorted(candidate_to_run, key=lambda candidate: candidate[0])[:n_to_start]]
 
-    print(" require_running: %d" % require_n_running)
+    print(" require_running: %d" % policy.howmany)
     print(" will_start: %d" % len(will_start))
 
     for mig in will_start:
@@ -149,6 +274,134 @@ def scheduler(require_n_running, priorities):
     return 0
 
 
+class SchedulerState(object):
+    # The migrations known to the daemon, kept in memory between polls, and a
+    # heap of the queued migrations in the order they are to be started. An
+    # entry in the heap is only checked when it is popped, so the heap is
+    # never rebuilt, an entry for a migration no longer queued is skipped. A
+    # migration's place is set by the policy when it is queued.
+    def __init__(self, priorities, policy):
+        self.priorities = priorities
+        self.policy = policy
+        self.stats = SchedulingStats()
+        # internalId -> Migration as of the last poll.
+        self.migrations = {}
+        self.etag = None
+        self.queue = []
+        # internalId -> time started, of the migrations the daemon started
+        # that the last poll still showed queued.
+        self.starting = {}
+        self.completed = 0
+        # Slot seconds used and available, for the utilisation.
+        self.busy = 0.0
+        self.available = 0.0
+        self.accounted = None
+
+    def update(self, migrations):
+        # Replace the migrations with those of a poll, queueing those that
+        # have become queued since the last.
+        known = self.migrations
+        self.migrations = {}
+        self.completed = 0
+        now = time.time()
+        for mig in migrations:
+            previous = known.get(mig.internalId)
+            if mig.state == QUEUED_STATE:
+                started = self.starting.get(mig.internalId)
+                if started is not None and now - started >= START_GRACE:
+                    # The start did not take, it is queued again.
+                    del self.starting[mig.internalId]
+                    previous = None
+                if previous is None or previous.state != QUEUED_STATE:
+                    heapq.heappush(self.queue, (self.policy.sort_key(mig, self.priorities, self.stats),
+                                                mig.internalId))
+            else:
+                self.starting.pop(mig.internalId, None)
+                if mig.state in COMPLETED_STATES:
+                    self.completed += 1
+            self.migrations[mig.internalId] = mig
+        for internal_id in [internal_id for internal_id in self.starting if internal_id not in self.migrations]:
+            del self.starting[internal_id]
+
+    def running_count(self):
+        running = len(self.starting)
+        for mig in self.migrations.values():
+            if mig.state in RUNNING_STATES:
+                running += 1
+        return running
+
+    def queued_count(self):
+        return sum(1 for mig in self.migrations.values()
+                   if mig.state == QUEUED_STATE and mig.internalId not in self.starting)
+
+    def fill(self):
+        # Start queued migrations, in the policy's order, for each of the
+        # policy's free slots. Returns the migrations started.
+        started = []
+        slots = self.policy.slots(self.running_count(), self.stats)
+        while len(started) < slots and self.queue:
+            (sort_key, internal_id) = heapq.heappop(self.queue)
+            mig = self.migrations.get(internal_id)
+            if mig is None or mig.state != QUEUED_STATE or internal_id in self.starting:
+                continue
+            print("######### starting", mig, "...")
+            try:
+                start_migration(mig)
+            except Exception:
+                # Tried again after the next poll.
+                heapq.heappush(self.queue, (sort_key, internal_id))
+                raise
+            self.starting[internal_id] = time.time()
+            started.append(mig)
+        return started
+
+    def account(self, require_n_running):
+        # Add the slot seconds since the last call, at the current running count.
+        now = time.time()
+        if self.accounted is not None:
+            self.busy += min(self.running_count(), require_n_running) * (now - self.accounted)
+            self.available += require_n_running * (now - self.accounted)
+        self.accounted = now
+
+    def utilisation(self):
+        return 100.0 * self.busy / self.available if self.available else 0.0
+
+
+def run_daemon(policy, priorities, interval):
+    # Poll /migrations every interval seconds, with the ETag of the previous
+    # poll so an unchanged list costs a 304, and start queued migrations as
+    # soon as a slot is free rather than on the next run from cron.
+    require_n_running = policy.howmany
+    state = SchedulerState(priorities, policy)
+    # Exit through the finally below on SIGTERM too.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while True:
+            start = time.time()
+            state.account(require_n_running)
+            try:
+                (migrations, state.etag) = poll_migrations(state.etag)
+                if policy.needs_stats:
+                    state.stats = get_scheduling_stats()
+                if migrations is not None:
+                    state.update(migrations)
+                started = state.fill()
+                if migrations is not None or started:
+                    print("%s running: %d/%d queued: %d completed: %d started: %d" % (
+                        datetime.datetime.now(), state.running_count(), require_n_running, state.queued_count(),
+                        state.completed, len(started)))
+            except Exception as err:
+                print("Poll failed: " + str(err))
+            logging.debug("Poll took %.3fs, slot utilisation %.1f%%", time.time() - start, state.utilisation())
+            time.sleep(max(0, interval - (time.time() - start)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state.account(require_n_running)
+        print("Slot utilisation: %.1f%%" % state.utilisation())
+    return 0
+
+
 def usage(text):
     print("usage: %s" % text)
     return sys.exit(1)
@@ -156,7 +409,7 @@ def usage(text):
 
 def main():
     global API_ENDPOINT
-    global HEADERS
+    global CLIENT
 
     parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
 
@@ -167,7 +420,8 @@ them to a max of HOWMANY.
     parser.add_argument('--priority-list', help='''Optional filename of paths which define a custom priority for migration
 run order.  The file ordering defines the priority.  If no priority list is
 supplied or if a particular path is missing from the file the priority will be
-dictated by the creation time
+dictated by the creation time. A path below a listed path, such as /src/a below
+/src, has the priority of the nearest listed path above it.
 
 The file format is one path per line. example:
 
@@ -183,26 +437,48 @@ EOF
 (default: %s)
 
 ''' % API_ENDPOINT)
+    parser.add_argument('--cache-directory', help='Directory to cache the /migrations response in, it is then only retrieved again if it has changed.')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='count', help='''How to choose the migrations to start (default: count)
+  count      keep HOWMANY running, in priority order
+  shortest   keep HOWMANY running, fewest bytes left first within a priority
+  bandwidth  as shortest, starting more, up to --max-running, while the
+             throughput is below --target-bandwidth''')
+    parser.add_argument('--target-bandwidth', type=float, help='Throughput in MB/s the bandwidth policy aims for')
+    parser.add_argument('--max-running', type=int, help='Most migrations the bandwidth policy runs at once (default: 4 x HOWMANY)')
+    parser.add_argument('--daemon', action='store_true', help='Keep running, polling every --interval seconds and starting queued migrations\nas soon as a slot is free, rather than running once.')
+    parser.add_argument('--interval', type=float, default=10, help='Seconds between polls with --daemon (default: 10)')
     parser.add_argument('--debug', action='store_true')
 
     # parse the args and call whatever function was selected                                                      
     args = parser.parse_args()
     # print("ARGS", args)
 
-    priorities = []
+    paths = []
     if args.priority_list:
         with open(args.priority_list, 'r') as f:
-            priorities = [line.rstrip() for line in f]
-
-    if args.username:
-        HEADERS['Authorization'] = build_auth_header(args.username, args.password)
+            paths = [line.rstrip() for line in f]
+    priorities = PriorityIndex(paths)
 
     if args.debug:
         HTTPConnection.debuglevel = 1
+        logging.basicConfig(level=logging.DEBUG)
 
     API_ENDPOINT = args.endpoint
+    cache = None
+    if args.cache_directory:
+        cache = http_cache.get_cache(args.cache_directory)
+    CLIENT = ldm_client.get_client(API_ENDPOINT, args.username, args.password, cache=cache)
+
+    if args.policy == 'bandwidth' and not args.target_bandwidth:
+        usage("--policy bandwidth requires --target-bandwidth")
+    policy = POLICIES[args.policy](args)
+
+    if args.daemon:
+        if args.interval <= 0:
+            usage("--interval must be greater than 0")
+        return run_daemon(policy, priorities, args.interval)
 
-    return scheduler(args.howmany, priorities)
+    return scheduler(policy, priorities)
 
 
 if __name__ == "__main__":
@@ -18,26 +18,31 @@
 
 
 import argparse
-import base64
 import datetime
 import json
 import logging
-import smtplib
+import os
 import sys
 import textwrap
-from email.mime.text import MIMEText
 
 if (2, 6) <= sys.version_info < (3, 0):
-    from httplib import HTTPConnection, HTTPSConnection
-    from urlparse import urlparse
+    from httplib import HTTPConnection
 else:
-    from http.client import HTTPConnection, HTTPSConnection
-    from urllib.parse import urlparse
+    from http.client import HTTPConnection
+
+# Shared LiveData Migrator modules live in ../common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import json_stream
+import ldm_client
+import ldm_mailer
 
 NETWORK_FORMATTER = "%-20s %-15s %-15s %-15s"
 MIGRATIONS_HEADER_FORMATTER = "%-40s %-44s %-14s %-15s"
 MIGRATIONS_FORMATTER = "%-10s %-29s %25s %12s %14s %15s"
 MIGRATIONS_FORMATTER_INLINE = "%-32s %-7s %19s %3s %10s %3s %14s %15s"
+# The categories of Migrations listed, and the fields of each shown.
+STATUS_CATEGORIES = ['live', 'running', 'stopped', 'ready']
+MIGRATION_FIELDS = ['id', 'path', 'internalId', 'progress']
 
 
 class ThroughputSummaryBucket(object):
@@ -176,52 +181,13 @@ class EmailInformer():
         self.config = config
 
     def send_message(self, status, config, **kwargs):
-        server = self._connect(config)
         label = ""
         if 'e_mail_subject_label' in config:
               label = config['e_mail_subject_label'] + ' '
 
-        for to_addr in config['email_addresses']:
-            # Set MIME type.
-            msg = MIMEText(status)
-            msg['From'] = config['sender_address']
-            msg['To'] = to_addr
-            # E-mail Subject Line.
-            msg['Subject'] = label + 'WANDisco LiveData Migrator Status ' + str(datetime.datetime.now())
-
-            data_dict = server.sendmail(config['sender_address'], to_addr, msg.as_string())
-            logging.debug("sendmail: %r", data_dict)
-
-        (code, response) = server.quit()
-        logging.debug("quit: (%r) %r", code, response)
-
-    def _connect(self, config):
-        if config.get('smtp_ssl', False):
-            server = smtplib.SMTP_SSL(config['smtp_host'], config['smtp_port'])
-        else:
-            server = smtplib.SMTP(config['smtp_host'], config['smtp_port'])
-
-        if config.get('debug'):
-            server.set_debuglevel(1)
-
-        server.ehlo()
-
-        if config.get('smtp_starttls', False):
-            if server.has_extn('STARTTLS'):
-                server.starttls()
-                server.ehlo()
-            else:
-                logging.error("Start_TLS not supported:")
-                raise Exception("Start_TLS requested but not supported by server %r" % server)
-
-        if config.get('smtp_username', ''):
-            if server.has_extn('AUTH'):
-                logging.debug("authenticating to mailserver, user: %s, pass: XXXXXX ", config['smtp_username'])
-                server.login(config['smtp_username'], config['smtp_password'])
-            else:
-                logging.error("AUTH not supported:")
-
-        return server
+        # E-mail Subject Line.
+        subject = label + 'WANDisco LiveData Migrator Status ' + str(datetime.datetime.now())
+        ldm_mailer.mailer_for_config(config).send(subject, status)
 
 
 def padBytesUnit(val):
@@ -235,35 +201,28 @@ def formatTimeFromSeconds(seconds):
                                (elapsed.seconds // 60) % 60)
 
 
-def build_auth_header(username, password):
-    credentials = ('%s:%s' % (username, password))
-    encoded_credentials = base64.b64encode(credentials.encode('ascii'))
-    return 'Basic %s' % encoded_credentials.decode("ascii")
-
-
-def get_http_connection(endpoint):
-    url = urlparse(endpoint)
-    if url.scheme == 'https':
-        return HTTPSConnection(url.netloc)
-
-    return HTTPConnection(url.netloc)
-
-
-def doHttp(verb, config, path):
-    conn = get_http_connection(config['api_endpoint'])
-    headers = {}
-    if config['username']:
-        headers['Authorization'] = build_auth_header(config['username'], config['password'])
-    conn.request(verb, path, None, headers)
-    return conn.getresponse()
+def doHttp(verb, config, path, stream=False):
+    return ldm_client.client_for_config(config).request(verb, path, stream=stream)
 
 
 def migration_summary(config):
-    resp = doHttp("GET", config, "/stats/migrationSummary")
-    if resp.status == 200:
-        return json.loads(resp.read())
-    else:
+    resp = doHttp("GET", config, "/stats/migrationSummary", stream=True)
+    if resp.status != 200:
         raise ValueError(resp.status, resp.reason)
+    # Decode a Migration at a time, keeping only the overall count and the
+    # fields shown of the Migrations in the categories listed, rather than
+    # the whole response.
+    stream = json_stream.JsonStream(resp)
+    summary = {}
+    for key in stream.keys():
+        if key in STATUS_CATEGORIES:
+            summary[key] = {'migrations': [dict((field, migration.get(field)) for field in MIGRATION_FIELDS)
+                                           for migration in stream.items('migrations')]}
+        elif key == 'overallCount':
+            summary[key] = stream.value()
+        else:
+            stream.value()
+    return summary
 
 
 def throughput_summary(config):
@@ -19,80 +19,139 @@
 
 from __future__ import print_function
 import argparse
-import base64
+import collections
 import sys
 import re
 import json
 import datetime
 import logging
+import os
+import time
+from multiprocessing.pool import ThreadPool
 
 if (2, 6) <= sys.version_info < (3, 0):
-    from httplib import HTTPConnection, HTTPSConnection
-    from urlparse import urlparse
-    from urllib import urlencode, quote_plus
+    from httplib import HTTPConnection
+    from urllib import quote_plus
 else:
-    from http.client import HTTPConnection, HTTPSConnection
-    from urllib.parse import urlparse, urlencode, quote_plus
+    from http.client import HTTPConnection
+    from urllib.parse import quote_plus
+
+# Shared LiveData Migrator modules live in ../common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import json_stream
+import ldm_client
 
 
 def urlencode_string(string):
     return quote_plus(string)
 
 
-def get_http_connection(endpoint):
-    url = urlparse(endpoint)
-    if url.scheme == 'https':
-        return HTTPSConnection(url.netloc)
-    return HTTPConnection(url.netloc)
-
-
-def build_auth_header(username, password):
-    credentials = ('%s:%s' % (username, password))
-    encoded_credentials = base64.b64encode(credentials.encode('ascii'))
-    return 'Basic %s' % encoded_credentials.decode("ascii")
-
-
-def doHttp(verb, config, path):
-    conn = get_http_connection(config['api_endpoint'])
-    headers = {}
-    if config['username']:
-        headers['Authorization'] = build_auth_header(config['username'], config['password'])
-    conn.request(verb, path, None, headers)
-    return conn.getresponse()
+def doHttp(verb, config, path, stream=False):
+    return ldm_client.client_for_config(config).request(verb, path, stream=stream)
 
 
 def get_migrations(config):
-    resp = doHttp("GET", config, "/migrations")
+    resp = doHttp("GET", config, "/migrations", stream=True)
     if resp.status != 200:
         raise ValueError(resp.status, resp.reason)
 
-    return json.loads(resp.read())
+    # Migrations are decoded one at a time as they are consumed.
+    return json_stream.iter_items(resp)
+
+
+# Past tense of each migration action, for the result messages.
+ACTIONED = {'start': 'started', 'stop': 'stopped'}
+# Results held back per request in flight, waiting for an earlier one to print.
+PENDING_PER_REQUEST = 4
 
 
-def stop_migration(migration, config):
-    encode_migration_id = urlencode_string(migration['migrationId'])
-    resp = doHttp("POST", config, "/migrations/" + encode_migration_id + "/stop")
+def action_message(migration, action, resp):
     if resp.status == 200:
-        print("Migration [" + migration['migrationId'] + "][" + migration['path'] +"] stopped")
-    else:
-        error = json.loads(resp.read())
-        print("Migration [" + migration['migrationId'] + "][" + migration['path'] +"] not stopped. " ,resp.status, error['message'])
-    return 
+        return "Migration [" + migration['migrationId'] + "][" + migration['path'] +"] " + ACTIONED[action]
+    error = json.loads(resp.read())
+    return "%s %s %s" % ("Migration [" + migration['migrationId'] + "][" + migration['path'] +"] not " + ACTIONED[action] + ". ", resp.status, error['message'])
+
+
+def action_path(migration, action):
+    return "/migrations/" + urlencode_string(migration['migrationId']) + "/" + action
+
+
+def action_migrations_async(config, args, action, plan):
+    # plan holds (message, migration) in migration order, migrations to action
+    # have no message. The requests are made concurrently and the messages
+    # printed in the same order as the blocking loop would.
+    import ldm_async_client
+    migrations = [migration for message, migration in plan if message is None]
+    requests = [("POST", action_path(migration, action)) for migration in migrations]
+    results = iter(ldm_async_client.request_all(
+        config, requests, lambda index, resp: action_message(migrations[index], action, resp), args.concurrency))
+    for message, migration in plan:
+        print(message if message is not None else next(results))
+    return
 
 
-def stop_migration_by_pattern(config, args):
+def latency_summary(latencies):
+    if not latencies:
+        return "0 requests"
+    ordered = sorted(latencies)
+    return "%d requests, mean %.3fs, p50 %.3fs, p95 %.3fs, max %.3fs" % (
+        len(ordered), sum(ordered) / len(ordered), ordered[(len(ordered) - 1) // 2],
+        ordered[int(0.95 * (len(ordered) - 1))], ordered[-1])
+
+
+def action_migrations(config, args, action, plan):
+    # plan holds (message, migration) in migration order, migrations to action
+    # have no message. Up to args.concurrency requests are made at once over
+    # the pooled client while the plan is still being read, and the messages
+    # are printed in migration order as soon as each is known. With --debug
+    # the latency of the requests is logged.
+    def request(migration):
+        start = time.time()
+        resp = doHttp("POST", config, action_path(migration, action))
+        return action_message(migration, action, resp), time.time() - start
+
+    latencies = []
+
+    def report(message, result):
+        if result is not None:
+            (message, latency) = result.get()
+            latencies.append(latency)
+        print(message)
+
+    start = time.time()
+    pool = ThreadPool(args.concurrency)
+    try:
+        pending = collections.deque()
+        for message, migration in plan:
+            pending.append((message, pool.apply_async(request, (migration,)) if message is None else None))
+            while len(pending) > PENDING_PER_REQUEST * args.concurrency:
+                report(*pending.popleft())
+        while pending:
+            report(*pending.popleft())
+    finally:
+        pool.terminate()
+    logging.debug("%s took %.3fs: %s", action, time.time() - start, latency_summary(latencies))
+    return
+
+
+def stop_plan(config, args):
     migrations = get_migrations(config)
     for migration in migrations:
       migration_id = migration['migrationId']
-      if args.pattern and not re.search(args.pattern, migration_id):
-           print("Skipping migration [" + migration['migrationId'] + "], does not match " + args.pattern)
+      if args.compiled_pattern and not args.compiled_pattern.search(migration_id):
+           yield "Skipping migration [" + migration['migrationId'] + "], does not match " + args.pattern, migration
            continue
       if migration['state'] == 'RUNNING' or migration['state'] == 'LIVE':
-         stop_migration(migration, config)
+         yield None, migration
       else:
-         print("Not stopping Migration [" + migration['migrationId'] + "][" + migration['path'] +"] as current state is [" + migration['state']  + "]")
+         yield "Not stopping Migration [" + migration['migrationId'] + "][" + migration['path'] +"] as current state is [" + migration['state']  + "]", migration
 
-    return
+
+def stop_migration_by_pattern(config, args):
+    if args.use_async:
+        return action_migrations_async(config, args, 'stop', list(stop_plan(config, args)))
+
+    return action_migrations(config, args, 'stop', stop_plan(config, args))
 
 def stop_migrations(config, args):
     if args.pattern:
@@ -108,30 +167,25 @@ def stop_migrations(config, args):
     return
 
 
-def start_migration(migration, config):
-    encode_migration_id = urlencode_string(migration['migrationId'])
-    resp = doHttp("POST", config, "/migrations/" + encode_migration_id + "/start")
-    if resp.status == 200:
-        print("Migration [" + migration['migrationId'] + "][" + migration['path'] +"] started")
-    else:
-        error = json.loads(resp.read())
-        print("Migration [" + migration['migrationId'] + "][" + migration['path'] +"] not started. " ,resp.status, error['message'])
-    return 
-
-
-def start_migrations(config, args):
+def start_plan(config, args):
     migrations = get_migrations(config)
     for migration in migrations:
       migration_id = migration['migrationId']
-      if args.pattern and not re.search(args.pattern, migration_id):
-        print("Skipping migration " + migration['migrationId'] + ", does not match " + args.pattern)
+      if args.compiled_pattern and not args.compiled_pattern.search(migration_id):
+        yield "Skipping migration " + migration['migrationId'] + ", does not match " + args.pattern, migration
         continue
 
       if migration['state'] != 'STOPPED':
-        print("Not starting Migration [" + migration['migrationId'] + "][" + migration['path'] +"] as current state is [" + migration['state']  + "]")
+        yield "Not starting Migration [" + migration['migrationId'] + "][" + migration['path'] +"] as current state is [" + migration['state']  + "]", migration
       else:
-        start_migration(migration, config)
-    return
+        yield None, migration
+
+
+def start_migrations(config, args):
+    if args.use_async:
+        return action_migrations_async(config, args, 'start', list(start_plan(config, args)))
+
+    return action_migrations(config, args, 'start', start_plan(config, args))
 
 
 def main():
@@ -148,15 +202,22 @@ def main():
     parser.add_argument('--config', action = 'store', required=True,  help='Configuration file of format: {"api_endpoint" : "http://localhost:18080", "username" : "foo", "password" : "bar"}')
     parser.add_argument('--pattern', action = 'store', required=False,  help='Pattern to filter and match Migrations.')
     parser.add_argument('--debug', action='store_true', help='Enable HTTP Debug.')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Start or stop the migrations concurrently with asyncio, python3 only.')
+    parser.add_argument('--concurrency', type=int, default=16, help='Migrations started or stopped at once, default 16.')
     args = parser.parse_args()
 
     with open(args.config, 'r') as f:
         config = json.load(f)
 
-    # Test compile the pattern, will throw exception
+    if args.concurrency < 1:
+        print('--concurrency must be at least 1.')
+        exit(1)
+
+    # Compile the pattern once, for every migration, will throw exception
+    args.compiled_pattern = None
     if args.pattern:
         try:
-           re.compile(args.pattern)
+           args.compiled_pattern = re.compile(args.pattern)
         except Exception as e:
            print('Bad pattern "' + args.pattern  +'": ', e)
            exit(1)
@@ -22,9 +22,24 @@ import json
 import os
 import sys
 
+# Shared LiveData Migrator modules live in ../common.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+import verification_parquet
+
 def process_state(args, state):
-    relation1 = duckdb.sql("SELECT * EXCLUDE (timestamp) FROM read_ndjson_auto('" + state['first_discrepancy'] + "')").set_alias("relation1")
-    relation2 = duckdb.sql("SELECT * EXCLUDE (timestamp) FROM read_ndjson_auto('" + state['second_discrepancy'] + "')").set_alias("relation2")
+    relation1 = verification_parquet.discrepancies(state['first'])
+    relation2 = verification_parquet.discrepancies(state['second'])
+    if relation1 is None and relation2 is None:
+        print("No Discrepancies in either verification report.")
+        return
+    # A clean verification has no discrepancies, and no columns, compare the
+    # other report with none of its own.
+    if relation1 is None:
+        relation1 = relation2.filter("false")
+    if relation2 is None:
+        relation2 = relation1.filter("false")
+    relation1 = relation1.project("* EXCLUDE (timestamp)").set_alias("relation1")
+    relation2 = relation2.project("* EXCLUDE (timestamp)").set_alias("relation2")
     print("First Set of Discrepancies: %s" % (relation1.aggregate('count()').fetchone()))
     if args.debug:
        print("%s" % (relation1.order('sourcePath').sql_query()))
@@ -68,11 +83,22 @@ def do_delta(args):
     summary = os.path.join(args.first, 'summary.json')
     with open(summary, 'r') as file:
        state['first_summary'] = json.load(file)
-    state['first_discrepancy'] = os.path.join(args.first, 'verification-discrepancy.jsonl.gz') 
+    state['first'] = args.first
     summary = os.path.join(args.second, 'summary.json')
     with open(summary, 'r') as file:
        state['second_summary'] = json.load(file)
-    state['second_discrepancy'] = os.path.join(args.second, 'verification-discrepancy.jsonl.gz') 
+    state['second'] = args.second
+    # Convert each report to Parquet once, later runs against the same
+    # verification directory reuse the conversion. A directory that cannot
+    # be written to has its JSONL report read instead.
+    for path in (args.first, args.second):
+       try:
+          elapsed = verification_parquet.convert(path)
+       except (OSError, IOError, duckdb.Error) as err:
+          print("Cannot convert %s to Parquet, reading the JSONL report: %s" % (path, err))
+          continue
+       if args.debug and elapsed:
+          print("Converted %s to Parquet in %.2fs" % (path, elapsed))
     process_state(args, state)
 
 def check_is_verification(path):
@@ -81,7 +107,7 @@ def check_is_verification(path):
     summary = os.path.join(path, 'summary.json')
     if not os.path.isfile(summary):
        raise Exception("Verification summary file %s does not exist." % (summary))
-    discrepancy = os.path.join(path, 'verification-discrepancy.jsonl.gz')
+    discrepancy = verification_parquet.discrepancy_file(path)
     if not os.path.isfile(discrepancy):
        raise Exception("Verification discrepancy file %s does not exist." % (discrepancy))
 